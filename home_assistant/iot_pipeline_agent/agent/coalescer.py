@@ -0,0 +1,145 @@
+import asyncio, time
+
+# Per-domain coalescing rules. Each rule has a "mode":
+#   "latest"   - forward only the newest state per entity once per `window` seconds
+#   "deadband" - forward numeric states only when they move by at least `deadband`
+#   "summary"  - forward the last state per `window` with min/max/count attached
+# Identical consecutive states (same state and attributes) are always dropped.
+MODES = ("latest", "deadband", "summary")
+DEFAULT_WINDOW = 1.0
+
+
+class _Entity:
+    __slots__ = ("rule", "state", "attributes", "value", "pending", "opened_at", "count", "min", "max")
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.state = None
+        self.attributes = None
+        self.value = None
+        self.pending = None
+        self.opened_at = 0.0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+
+def _to_float(state):
+    try:
+        return float(state)
+    except (TypeError, ValueError):
+        return None
+
+
+class EventCoalescer:
+    def __init__(self, on_event, rules=None):
+        self.on_event = on_event
+        self.rules = {}
+        for domain, rule in (rules or {}).items():
+            mode = rule.get("mode", "latest")
+            if mode not in MODES:
+                raise ValueError(f"Unknown coalescing mode for {domain}: {mode}")
+            self.rules[domain] = {
+                "mode": mode,
+                "window": float(rule.get("window", DEFAULT_WINDOW)),
+                "deadband": float(rule.get("deadband", 0)),
+            }
+        self.entities = {}
+        self.received = 0
+        self.forwarded = 0
+        self.suppressed = {"identical": 0, "deadband": 0, "window": 0}
+
+    def submit(self, evt):
+        self.received += 1
+        data = evt.get("data") or {}
+        entity_id = data.get("entity_id")
+        new_state = data.get("new_state")
+        if evt.get("event_type") != "state_changed" or not entity_id or not new_state:
+            self._forward(evt)
+            return
+
+        # Events tagged by the multi-instance fan-in are keyed per source instance
+        instance = evt.get("instance")
+        key = f"{instance}/{entity_id}" if instance else entity_id
+        entity = self.entities.get(key)
+        if entity is None:
+            rule = self.rules.get(entity_id.partition(".")[0]) or self.rules.get("default")
+            entity = self.entities[key] = _Entity(rule)
+
+        state = new_state.get("state")
+        attributes = new_state.get("attributes")
+        if state == entity.state and attributes == entity.attributes:
+            self.suppressed["identical"] += 1
+            return
+
+        rule = entity.rule
+        value = _to_float(state)
+
+        if rule is None:
+            self._remember(entity, state, attributes, value)
+            self._forward(evt)
+        elif rule["mode"] == "deadband":
+            if (
+                value is not None
+                and entity.value is not None
+                and attributes == entity.attributes
+                and abs(value - entity.value) < rule["deadband"]
+            ):
+                self.suppressed["deadband"] += 1
+                return
+            self._remember(entity, state, attributes, value)
+            self._forward(evt)
+        else:
+            if entity.pending is None:
+                entity.opened_at = time.monotonic()
+                entity.count = 0
+                entity.min = entity.max = None
+            else:
+                self.suppressed["window"] += 1
+            entity.pending = evt
+            entity.count += 1
+            if value is not None:
+                entity.min = value if entity.min is None else min(entity.min, value)
+                entity.max = value if entity.max is None else max(entity.max, value)
+            self._remember(entity, state, attributes, value)
+
+    async def run_flush_loop(self):
+        windows = [r["window"] for r in self.rules.values() if r["mode"] != "deadband"]
+        if not windows:
+            return
+        tick = max(min(windows) / 4, 0.05)
+        while True:
+            await asyncio.sleep(tick)
+            self.flush()
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        for entity in self.entities.values():
+            if entity.pending is None:
+                continue
+            rule = entity.rule
+            if not force and now - entity.opened_at < rule["window"]:
+                continue
+            evt = entity.pending
+            entity.pending = None
+            if rule["mode"] == "summary":
+                evt["data"]["coalesced"] = {"count": entity.count, "min": entity.min, "max": entity.max}
+            self._forward(evt)
+
+    def metric_values(self):
+        values = [
+            ("coalescer_entities", "gauge", {}, len(self.entities)),
+            ("coalescer_forwarded_total", "counter", {}, self.forwarded),
+        ]
+        for reason, count in self.suppressed.items():
+            values.append(("coalescer_suppressed_total", "counter", {"reason": reason}, count))
+        return values
+
+    def _remember(self, entity, state, attributes, value):
+        entity.state = state
+        entity.attributes = attributes
+        entity.value = value
+
+    def _forward(self, evt):
+        self.forwarded += 1
+        self.on_event(evt)
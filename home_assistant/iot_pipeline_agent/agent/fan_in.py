@@ -0,0 +1,77 @@
+import asyncio
+from collections import deque
+
+
+class _Source:
+    __slots__ = ("name", "queue", "dropped")
+
+    def __init__(self, name):
+        self.name = name
+        self.queue = deque()
+        self.dropped = 0
+
+
+class FanIn:
+    # Merges events from several Home Assistant instances into one downstream
+    # consumer. Each instance gets its own bounded queue that drops its oldest
+    # events when full, and queues are drained round-robin only while the
+    # downstream has capacity, so one noisy instance cannot starve the others.
+    def __init__(self, on_event, has_capacity=lambda: True, max_queue=20000, quantum=100, idle_interval=0.05):
+        self.on_event = on_event
+        self.has_capacity = has_capacity
+        self.max_queue = max_queue
+        self.quantum = quantum
+        self.idle_interval = idle_interval
+        self.sources = []
+        self._ready = asyncio.Event()
+        self._next = 0
+
+    def add_source(self, name):
+        source = _Source(name)
+        self.sources.append(source)
+        queue = source.queue
+        max_queue = self.max_queue
+        ready = self._ready
+
+        def on_event(evt):
+            evt["instance"] = name
+            if len(queue) >= max_queue:
+                queue.popleft()
+                source.dropped += 1
+            queue.append(evt)
+            ready.set()
+
+        return on_event
+
+    async def run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while any(source.queue for source in self.sources):
+                if not self.has_capacity():
+                    await asyncio.sleep(self.idle_interval)
+                    continue
+                self._drain_round()
+                await asyncio.sleep(0)
+
+    def _drain_round(self):
+        # Capacity is checked per event so the downstream queue is never pushed
+        # past its limit; a round cut short resumes at the source it stopped on.
+        count = len(self.sources)
+        for offset in range(count):
+            index = (self._next + offset) % count
+            queue = self.sources[index].queue
+            for _ in range(min(self.quantum, len(queue))):
+                if not self.has_capacity():
+                    self._next = index
+                    return
+                self.on_event(queue.popleft())
+        self._next = 0
+
+    def metric_values(self):
+        values = []
+        for source in self.sources:
+            labels = {"instance": source.name}
+            values.append(("fanin_queue_depth", "gauge", labels, len(source.queue)))
+            values.append(("fanin_dropped_total", "counter", labels, source.dropped))
+        return values
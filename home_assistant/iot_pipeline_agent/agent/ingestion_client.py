@@ -1,25 +1,87 @@
-import asyncio, aiohttp, json, time
+import asyncio, aiohttp, math, time
+import runtime
 from collections import deque
+from metrics import AgentMetrics
+
+WIRE_FORMATS = ("json", "ndjson")
+
+
+def _encode_batch(batch, wire_format):
+    # ndjson sends one event per line, so retry and line_errors indices are batch positions
+    if wire_format == "ndjson":
+        return b"".join(runtime.dumps(evt) + b"\n" for evt in batch), "application/x-ndjson"
+    return runtime.dumps({"events": batch}), "application/json"
+
+
+def _parse_result(body):
+    # The events were accepted either way; an unreadable body only loses the retry list
+    try:
+        result = runtime.loads(body)
+    except ValueError:
+        return {}
+    return result if isinstance(result, dict) else {}
 
 
 class IngestionClient:
-    def __init__(self, backend_url, api_key, max_batch=1000, flush_interval=0.3):
+    def __init__(
+        self,
+        backend_url,
+        api_key,
+        max_batch=1000,
+        flush_interval=0.3,
+        max_queue=200000,
+        metrics=None,
+        wire_format="json",
+        drop_when_full=False,
+    ):
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"Unknown wire format {wire_format!r}, expected one of {WIRE_FORMATS}")
         self.backend_url = backend_url
         self.api_key = api_key
         self.queue = deque()
         self.max_batch = max_batch
         self.flush_interval = flush_interval
+        # max_queue is the backpressure point for has_capacity; events are only
+        # discarded past it when drop_when_full is set
+        self.max_queue = max_queue
+        self.drop_when_full = drop_when_full
         self.backoff = 0
+        self.session = None
+        self.metrics = metrics or AgentMetrics()
+        self.metrics.ingestion = self
+        self.wire_format = wire_format
 
     def enqueue_event(self, evt):
         evt["received_at"] = time.time()
+        if self.drop_when_full and len(self.queue) >= self.max_queue:
+            self.queue.popleft()
+            self.metrics.events_dropped += 1
         self.queue.append(evt)
+        self.metrics.events_enqueued += 1
+
+    def has_capacity(self):
+        return len(self.queue) < self.max_queue
 
     async def run_flush_loop(self):
         while True:
-            await asyncio.sleep(self.flush_interval)
+            # Keep draining full batches back-to-back; only idle when the queue is short
+            if len(self.queue) < self.max_batch or self.backoff > 0:
+                await asyncio.sleep(self.flush_interval)
             await self.flush()
 
+    async def drain(self, timeout):
+        # Shutdown: keep flushing until the queue is sent or the time runs out
+        deadline = time.monotonic() + timeout
+        while self.queue and time.monotonic() < deadline:
+            if self.backoff > 0:
+                self.backoff = 0
+                await asyncio.sleep(self.flush_interval)
+            await self.flush()
+        if self.queue:
+            print(f"Shutting down with {len(self.queue)} events unsent")
+        if self.session is not None:
+            await self.session.close()
+
     async def flush(self):
         if not self.queue or self.backoff > 0:
             if self.backoff > 0:
@@ -30,21 +92,48 @@ class IngestionClient:
         while self.queue and len(batch) < self.max_batch:
             batch.append(self.queue.popleft())
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    self.backend_url,
-                    data=json.dumps({"events": batch}),
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    timeout=5,
-                ) as resp:
-                    if resp.status != 200:
-                        raise Exception(f"HTTP {resp.status}")
-            except Exception as e:
-                print("Flush failed:", e)
-                self.backoff = min(int(self.backoff * 2) + 1, 20)
-                for evt in reversed(batch):
-                    self.queue.appendleft(evt)
+        self.metrics.batch_size.observe(len(batch))
+        flush_start = time.perf_counter()
+
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+
+        body, content_type = _encode_batch(batch, self.wire_format)
+
+        try:
+            async with self.session.post(
+                self.backend_url,
+                data=body,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": content_type,
+                },
+                timeout=5,
+            ) as resp:
+                if resp.status != 200:
+                    raise Exception(f"HTTP {resp.status}")
+                result = _parse_result(await resp.read())
+            retry = result.get("retry") or []
+            self.metrics.events_sent += len(batch) - len(retry)
+            if result.get("malformed_lines"):
+                self.metrics.events_rejected += result["malformed_lines"]
+                print("Backend rejected lines:", result.get("line_errors"))
+            if retry:
+                # The backend ran out of Kinesis capacity: resend those events first
+                self.metrics.events_retried += len(retry)
+                for index in reversed(retry):
+                    self.queue.appendleft(batch[index])
+                self.backoff = math.ceil(result.get("retry_after", 0) / self.flush_interval)
+        except asyncio.CancelledError:
+            # Stopped mid-upload: keep the batch for the shutdown drain
+            for evt in reversed(batch):
+                self.queue.appendleft(evt)
+            raise
+        except Exception as e:
+            print("Flush failed:", e)
+            self.metrics.flush_failures += 1
+            self.backoff = min(int(self.backoff * 2) + 1, 20)
+            for evt in reversed(batch):
+                self.queue.appendleft(evt)
+        finally:
+            self.metrics.flush_latency.observe(time.perf_counter() - flush_start)
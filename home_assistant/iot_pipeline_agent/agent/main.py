@@ -1,24 +1,98 @@
-import asyncio, os
+import asyncio, json, os, signal
+import runtime
 from websocket_client import HAWebSocketClient
 from ingestion_client import IngestionClient
+from coalescer import EventCoalescer
+from fan_in import FanIn
+from metrics import AgentMetrics
+
+DEFAULT_HA_URL = "ws://homeassistant.local:8123/api/websocket"
+# How long a stop may spend uploading what is still queued
+SHUTDOWN_DRAIN_SECONDS = 10.0
+
+
+def load_instances():
+    # INSTANCES_FILE points at a JSON list of {"name", "url", "token"} objects;
+    # without it the agent streams the single local instance as before.
+    path = os.environ.get("INSTANCES_FILE", "").strip()
+    if not path:
+        return [
+            {
+                "name": "default",
+                "url": os.environ.get("HA_URL") or DEFAULT_HA_URL,
+                "token": os.environ["HA_TOKEN"],
+            }
+        ]
+
+    with open(path) as f:
+        instances = json.load(f)
+
+    names = [inst["name"] for inst in instances]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate instance names in {path}: {names}")
+    return instances
 
 
 async def main():
+    print("Runtime profile:", runtime.describe())
+    metrics = AgentMetrics()
+
     ingestion = IngestionClient(
         backend_url=os.environ["BACKEND_URL"],
         api_key=os.environ["API_KEY"],
         max_batch=1000,
         flush_interval=0.3,
+        metrics=metrics,
+        wire_format=os.environ.get("WIRE_FORMAT", "").strip() or "json",
+        drop_when_full=os.environ.get("DROP_WHEN_FULL", "").strip().lower() == "true",
     )
 
-    ha_ws = HAWebSocketClient(
-        url="ws://homeassistant.local:8123/api/websocket",
-        token=os.environ["HA_TOKEN"],
-        on_event=ingestion.enqueue_event,
-    )
+    on_event = ingestion.enqueue_event
+    tasks = [ingestion.run_flush_loop()]
+
+    coalescer = None
+    coalesce_rules = os.environ.get("COALESCE_RULES", "").strip()
+    if coalesce_rules:
+        coalescer = EventCoalescer(on_event=on_event, rules=json.loads(coalesce_rules))
+        on_event = coalescer.submit
+        tasks.append(coalescer.run_flush_loop())
+        metrics.extra.append(coalescer.metric_values)
+
+    instances = load_instances()
+    # Events from an instances file are always tagged with their instance, even with one
+    if os.environ.get("INSTANCES_FILE", "").strip():
+        fan_in = FanIn(on_event=on_event, has_capacity=ingestion.has_capacity)
+        tasks.append(fan_in.run())
+        metrics.extra.append(fan_in.metric_values)
+        sources = [(inst, fan_in.add_source(inst["name"])) for inst in instances]
+    else:
+        sources = [(inst, on_event) for inst in instances]
+
+    metrics_port = os.environ.get("METRICS_PORT", "").strip()
+    if metrics_port:
+        await metrics.serve(int(metrics_port))
+
+    for inst, source_on_event in sources:
+        ha_ws = HAWebSocketClient(
+            url=inst["url"],
+            token=inst["token"],
+            on_event=source_on_event,
+            metrics=metrics,
+        )
+        tasks.append(ha_ws.run_forever())
 
-    await asyncio.gather(ha_ws.run_forever(), ingestion.run_flush_loop())
+    # The Supervisor stops the add-on with SIGTERM
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        print("Shutting down")
+    finally:
+        # Forward what the coalescer still holds, then upload the queue
+        if coalescer is not None:
+            coalescer.flush(force=True)
+        await ingestion.drain(SHUTDOWN_DRAIN_SECONDS)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    runtime.run(main())
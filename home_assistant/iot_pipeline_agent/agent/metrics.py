@@ -0,0 +1,125 @@
+import bisect, json, time
+from aiohttp import web
+
+FLUSH_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, help_text):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+class AgentMetrics:
+    # Counters are plain attributes bumped inline by the clients, so the hot path
+    # costs one attribute increment per event. Queue gauges are read lazily from
+    # the registered ingestion client at scrape time.
+    COUNTERS = {
+        "events_received": "Events received from Home Assistant",
+        "events_enqueued": "Events accepted into the upload queue",
+        "events_sent": "Events acknowledged by the backend",
+        "events_dropped": "Events dropped because the upload queue was full",
+        "events_retried": "Events the backend handed back to resend",
+        "events_rejected": "Events the backend could not parse",
+        "flush_failures": "Failed backend uploads",
+        "ws_frames": "Websocket frames received",
+        "ws_reconnects": "Websocket reconnect attempts",
+        "ws_resync_events": "State events replayed from the get_states snapshot after a reconnect",
+    }
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.flush_latency = Histogram(FLUSH_LATENCY_BUCKETS)
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.started_at = time.time()
+        self.ingestion = None
+        # Callables returning (name, type, labels, value) samples, e.g.
+        # ("fanin_dropped_total", "counter", {"instance": "site-a"}, 3)
+        self.extra = []
+
+    def snapshot(self):
+        snap = {name: getattr(self, name) for name in self.COUNTERS}
+        queue_depth, oldest_age = 0, 0.0
+        if self.ingestion is not None:
+            queue = self.ingestion.queue
+            queue_depth = len(queue)
+            if queue:
+                oldest_age = time.time() - queue[0].get("received_at", time.time())
+        snap["queue_depth"] = queue_depth
+        snap["queue_oldest_age_seconds"] = oldest_age
+        snap["uptime_seconds"] = time.time() - self.started_at
+        snap["flush_latency_seconds"] = {"count": self.flush_latency.count, "sum": self.flush_latency.sum}
+        snap["batch_size"] = {"count": self.batch_size.count, "sum": self.batch_size.sum}
+        # Labelled samples nest under their name, keyed by their label values
+        for source in self.extra:
+            for name, _, labels, value in source():
+                if labels:
+                    snap.setdefault(name, {})[",".join(str(v) for v in labels.values())] = value
+                else:
+                    snap[name] = value
+        return snap
+
+    def render_prometheus(self):
+        snap = self.snapshot()
+        lines = []
+        for name, help_text in self.COUNTERS.items():
+            lines += [f"# HELP agent_{name}_total {help_text}", f"# TYPE agent_{name}_total counter"]
+            lines.append(f"agent_{name}_total {snap[name]}")
+        for name in ("queue_depth", "queue_oldest_age_seconds", "uptime_seconds"):
+            lines += [f"# TYPE agent_{name} gauge", f"agent_{name} {snap[name]}"]
+        families = {}
+        for source in self.extra:
+            for name, kind, labels, value in source():
+                families.setdefault(name, (kind, []))[1].append(f"agent_{name}{_label_text(labels)} {value}")
+        for name, (kind, samples) in families.items():
+            lines.append(f"# TYPE agent_{name} {kind}")
+            lines += samples
+        lines += self.flush_latency.render("agent_flush_latency_seconds", "Backend upload latency")
+        lines += self.batch_size.render("agent_batch_size", "Events per backend upload")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, port, host="0.0.0.0"):
+        async def prometheus(request):
+            return web.Response(text=self.render_prometheus(), content_type="text/plain")
+
+        async def snapshot(request):
+            return web.Response(text=json.dumps(self.snapshot()), content_type="application/json")
+
+        app = web.Application()
+        app.router.add_get("/metrics", prometheus)
+        app.router.add_get("/metrics.json", snapshot)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
@@ -0,0 +1,46 @@
+import asyncio, json, os
+
+# PERFORMANCE_MODE=auto (default) picks up uvloop and orjson/msgspec when they are
+# installed; PERFORMANCE_MODE=off forces the stock asyncio loop and stdlib json.
+PERFORMANCE_MODE = os.environ.get("PERFORMANCE_MODE", "auto").strip().lower() or "auto"
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj).encode()
+
+
+def _load_codec():
+    if PERFORMANCE_MODE != "off":
+        try:
+            import orjson
+
+            return "orjson", orjson.dumps, orjson.loads
+        except ImportError:
+            pass
+        try:
+            import msgspec
+
+            return "msgspec", msgspec.json.Encoder().encode, msgspec.json.Decoder().decode
+        except ImportError:
+            pass
+    return "json", _stdlib_dumps, json.loads
+
+
+def _load_loop():
+    if PERFORMANCE_MODE != "off":
+        try:
+            import uvloop
+
+            return "uvloop", uvloop.run
+        except (ImportError, AttributeError):
+            pass
+    return "asyncio", asyncio.run
+
+
+# dumps always returns bytes; loads accepts str or bytes.
+JSON_CODEC, dumps, loads = _load_codec()
+EVENT_LOOP, run = _load_loop()
+
+
+def describe():
+    return {"mode": PERFORMANCE_MODE, "json": JSON_CODEC, "loop": EVENT_LOOP}
@@ -1,36 +1,101 @@
-import asyncio, json, websockets
+import asyncio, json, random, websockets
+import runtime
+from metrics import AgentMetrics
+
+BACKOFF_INITIAL = 0.25
+BACKOFF_MAX = 30.0
 
 
 class HAWebSocketClient:
-    def __init__(self, url, token, on_event):
+    def __init__(self, url, token, on_event, metrics=None):
         self.url = url
         self.token = token
         self.on_event = on_event
         self.msg_id = 1
+        self.metrics = metrics or AgentMetrics()
+        # entity_id -> last_changed of the newest state seen, used to resync after a reconnect
+        self.last_changed = {}
+        self.states_msg_id = None
+        self.synced = False
 
     async def run_forever(self):
+        attempt = 0
         while True:
             try:
                 async with websockets.connect(self.url) as ws:
                     await self.authenticate(ws)
                     await self.subscribe_all(ws)
+                    await self.request_states(ws)
+                    attempt = 0
                     await self.listen(ws)
             except Exception as e:
                 print("WebSocket error:", e)
-                await asyncio.sleep(5)
+            self.metrics.ws_reconnects += 1
+            delay = min(BACKOFF_MAX, BACKOFF_INITIAL * 2**attempt)
+            attempt += 1
+            await asyncio.sleep(random.uniform(delay / 2, delay))
 
     async def authenticate(self, ws):
         await ws.recv()
         await ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+        msg = json.loads(await ws.recv())
+        if msg.get("type") != "auth_ok":
+            raise Exception(f"Authentication failed: {msg.get('message', msg.get('type'))}")
 
     async def subscribe_all(self, ws):
         await ws.send(json.dumps({"id": self.msg_id, "type": "subscribe_events"}))
         self.msg_id += 1
 
+    async def request_states(self, ws):
+        self.states_msg_id = self.msg_id
+        await ws.send(json.dumps({"id": self.msg_id, "type": "get_states"}))
+        self.msg_id += 1
+
     async def listen(self, ws):
+        metrics = self.metrics
+        last_changed = self.last_changed
+        loads = runtime.loads
         async for raw in ws:
-            msg = json.loads(raw)
-            if msg.get("type") == "event":
+            metrics.ws_frames += 1
+            msg = loads(raw)
+            msg_type = msg.get("type")
+            if msg_type == "event":
                 evt = msg.get("event")
                 if evt:
+                    new_state = evt.get("data", {}).get("new_state")
+                    if new_state:
+                        last_changed[new_state.get("entity_id")] = new_state.get("last_changed")
+                    metrics.events_received += 1
                     self.on_event(evt)
+            elif msg_type == "result" and msg.get("id") == self.states_msg_id:
+                self.states_msg_id = None
+                if msg.get("success"):
+                    self.resync(msg.get("result") or [])
+
+    def resync(self, states):
+        # The first snapshot only seeds the table; after a reconnect, entities whose
+        # last_changed moved while we were disconnected are replayed as state_changed.
+        replay = self.synced
+        self.synced = True
+        last_changed = self.last_changed
+        for state in states:
+            entity_id = state.get("entity_id")
+            changed = state.get("last_changed")
+            known = last_changed.get(entity_id)
+            if known is not None and (changed is None or changed <= known):
+                continue
+            last_changed[entity_id] = changed
+            if not replay:
+                continue
+            self.metrics.ws_resync_events += 1
+            self.metrics.events_received += 1
+            self.on_event(
+                {
+                    "event_type": "state_changed",
+                    "data": {"entity_id": entity_id, "old_state": None, "new_state": state},
+                    "origin": "LOCAL",
+                    "time_fired": state.get("last_updated") or changed,
+                    "context": state.get("context"),
+                    "resync": True,
+                }
+            )
@@ -0,0 +1,198 @@
+"""
+Agent load benchmark.
+
+Runs a fake Home Assistant websocket server that pushes state_changed events at a
+fixed rate and a stub ingestion backend that counts delivered events, then starts
+the real agent (agent/main.py) against them in a subprocess once per runtime
+profile and offered rate.
+
+For each profile it reports the highest offered rate the agent delivered in full
+(within --grace seconds of the end of the run) and the agent's CPU time per event.
+
+Usage:
+    python bench/load_bench.py --rates 1000,2500,5000,10000 --duration 10
+    python bench/load_bench.py --profiles off --rates 2000 --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import websockets
+from aiohttp import web
+
+AGENT_MAIN = os.path.join(os.path.dirname(__file__), "..", "agent", "main.py")
+TICK = 0.01
+
+
+def make_event_frame(seq):
+    entity = f"input_number.temp_{seq % 100 + 1:03d}"
+    value = f"{70 + (seq % 97) / 10:.1f}"
+    now = "2026-01-01T00:00:00.000000+00:00"
+    return json.dumps(
+        {
+            "id": 1,
+            "type": "event",
+            "event": {
+                "event_type": "state_changed",
+                "data": {
+                    "entity_id": entity,
+                    "old_state": None,
+                    "new_state": {
+                        "entity_id": entity,
+                        "state": value,
+                        "attributes": {"unit_of_measurement": "°F", "friendly_name": entity},
+                        "last_changed": now,
+                        "last_updated": now,
+                    },
+                },
+                "origin": "LOCAL",
+                "time_fired": now,
+                "context": {"id": f"{seq:026d}", "parent_id": None, "user_id": None},
+            },
+        }
+    )
+
+
+class FakeHomeAssistant:
+    def __init__(self, rate, duration):
+        self.rate = rate
+        self.duration = duration
+        self.sent = 0
+        self.done = asyncio.Event()
+        # Pre-render a pool of frames so the generator is not the bottleneck
+        self.frames = [make_event_frame(i) for i in range(1000)]
+
+    async def handler(self, ws):
+        await ws.send(json.dumps({"type": "auth_required"}))
+        await ws.recv()
+        await ws.send(json.dumps({"type": "auth_ok"}))
+        pusher = None
+        async for raw in ws:
+            msg = json.loads(raw)
+            await ws.send(json.dumps({"id": msg["id"], "type": "result", "success": True, "result": []}))
+            if msg["type"] == "subscribe_events" and pusher is None:
+                pusher = asyncio.create_task(self.push(ws))
+
+    async def push(self, ws):
+        start = time.perf_counter()
+        frames = self.frames
+        while True:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.duration:
+                break
+            due = int(elapsed * self.rate) - self.sent
+            for _ in range(due):
+                await ws.send(frames[self.sent % len(frames)])
+                self.sent += 1
+            await asyncio.sleep(TICK)
+        self.done.set()
+
+
+class StubBackend:
+    def __init__(self):
+        self.received = 0
+        self.requests = 0
+
+    async def handle(self, request):
+        body = await request.read()
+        self.received += len(json.loads(body)["events"])
+        self.requests += 1
+        return web.json_response({"events_ingested": 0})
+
+
+async def run_once(profile, rate, args):
+    ha = FakeHomeAssistant(rate, args.duration)
+    backend = StubBackend()
+
+    app = web.Application()
+    app.router.add_post("/events", backend.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.backend_port).start()
+
+    async with websockets.serve(ha.handler, "127.0.0.1", args.ha_port, max_queue=None):
+        env = dict(
+            os.environ,
+            PERFORMANCE_MODE=profile,
+            HA_URL=f"ws://127.0.0.1:{args.ha_port}/api/websocket",
+            HA_TOKEN="bench",
+            BACKEND_URL=f"http://127.0.0.1:{args.backend_port}/events",
+            API_KEY="bench",
+            METRICS_PORT="",
+            INSTANCES_FILE="",
+        )
+        agent = subprocess.Popen([sys.executable, "-u", AGENT_MAIN], env=env, stdout=subprocess.PIPE, text=True)
+        runtime_line = (await asyncio.to_thread(agent.stdout.readline)).strip()
+        # Keep reading so "Flush failed" prints cannot fill the pipe and stall the agent
+        drain = asyncio.create_task(asyncio.to_thread(agent.stdout.read))
+
+        await asyncio.wait_for(ha.done.wait(), timeout=args.duration + 30)
+        deadline = time.perf_counter() + args.grace
+        while backend.received < ha.sent and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+        agent.send_signal(signal.SIGTERM)
+        _, _, usage = await asyncio.to_thread(os.wait4, agent.pid, 0)
+        agent.returncode = 0
+        await drain
+        agent.stdout.close()
+
+    await runner.cleanup()
+
+    cpu = usage.ru_utime + usage.ru_stime
+    return {
+        "profile": profile,
+        "runtime": runtime_line,
+        "offered_rate": rate,
+        "sent": ha.sent,
+        "delivered": backend.received,
+        "backend_requests": backend.requests,
+        "sustained": backend.received >= ha.sent * args.min_delivery,
+        "cpu_seconds": cpu,
+        "cpu_us_per_event": cpu / backend.received * 1e6 if backend.received else None,
+        "max_rss_kb": usage.ru_maxrss,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="off,auto", help="comma separated PERFORMANCE_MODE values")
+    parser.add_argument("--rates", default="1000,2500,5000,10000", help="comma separated events/s to offer")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per run")
+    parser.add_argument("--grace", type=float, default=2.0, help="seconds allowed to drain after load stops")
+    parser.add_argument("--min-delivery", type=float, default=0.99, help="delivered/sent ratio counted as sustained")
+    parser.add_argument("--ha-port", type=int, default=18123)
+    parser.add_argument("--backend-port", type=int, default=18080)
+    parser.add_argument("--json", help="write raw results to this file")
+    args = parser.parse_args()
+
+    rates = [int(r) for r in args.rates.split(",")]
+    results = []
+    for profile in args.profiles.split(","):
+        for rate in rates:
+            result = await run_once(profile, rate, args)
+            results.append(result)
+            print(json.dumps(result))
+
+    print("\nprofile   max sustained events/s   cpu us/event at that rate")
+    for profile in args.profiles.split(","):
+        sustained = [r for r in results if r["profile"] == profile and r["sustained"]]
+        best = max(sustained, key=lambda r: r["offered_rate"]) if sustained else None
+        if best:
+            print(f"{profile:<9} {best['offered_rate']:>22} {best['cpu_us_per_event']:>27.1f}")
+        else:
+            print(f"{profile:<9} {'none':>22} {'-':>27}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
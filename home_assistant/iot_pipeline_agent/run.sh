@@ -3,7 +3,14 @@
 HA_TOKEN=$(bashio::config 'ha_token')
 BACKEND_URL=$(bashio::config 'backend_url')
 API_KEY=$(bashio::config 'api_key')
-
 export HA_TOKEN BACKEND_URL API_KEY
 
+# bashio::config prints "null" for unset options, so optional ones are only
+# exported when they have a value
+for option in coalesce_rules metrics_port instances_file wire_format drop_when_full; do
+    if bashio::config.has_value "${option}"; then
+        export "${option^^}=$(bashio::config "${option}")"
+    fi
+done
+
 exec python3 /usr/src/agent/main.py
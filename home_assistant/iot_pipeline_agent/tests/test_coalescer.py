@@ -0,0 +1,144 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "agent"))
+
+import coalescer as coalescer_module  # noqa: E402
+from coalescer import EventCoalescer  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(coalescer_module, "time", clock)
+    return clock
+
+
+def state_changed(entity_id, state, attributes=None):
+    return {
+        "event_type": "state_changed",
+        "data": {"entity_id": entity_id, "new_state": {"state": state, "attributes": attributes or {}}},
+    }
+
+
+def states(events):
+    return [evt["data"]["new_state"]["state"] for evt in events]
+
+
+def make_coalescer(rules):
+    forwarded = []
+    return EventCoalescer(on_event=forwarded.append, rules=rules), forwarded
+
+
+def test_latest_forwards_the_newest_state_once_per_window(clock):
+    coalescer, forwarded = make_coalescer({"sensor": {"mode": "latest", "window": 2}})
+    for state in ("1", "2", "2", "3"):
+        coalescer.submit(state_changed("sensor.a", state))
+
+    clock.now += 1.9
+    coalescer.flush()
+    assert forwarded == []
+
+    clock.now += 0.1
+    coalescer.flush()
+    assert states(forwarded) == ["3"]
+    assert "coalesced" not in forwarded[0]["data"]
+    assert coalescer.suppressed == {"identical": 1, "deadband": 0, "window": 2}
+
+    # Nothing held, nothing more to forward
+    clock.now += 5
+    coalescer.flush()
+    assert len(forwarded) == 1
+
+
+def test_deadband_forwards_moves_of_at_least_the_deadband(clock):
+    coalescer, forwarded = make_coalescer({"input_number": {"mode": "deadband", "deadband": 0.5}})
+    for state in ("20.0", "20.49", "20.5", "20.99", "21.0", "unavailable", "21.1"):
+        coalescer.submit(state_changed("input_number.a", state))
+
+    # A move of exactly the deadband is forwarded; non-numeric states always are
+    assert states(forwarded) == ["20.0", "20.5", "21.0", "unavailable", "21.1"]
+    assert coalescer.suppressed["deadband"] == 2
+
+
+def test_deadband_forwards_attribute_changes(clock):
+    coalescer, forwarded = make_coalescer({"input_number": {"mode": "deadband", "deadband": 0.5}})
+    coalescer.submit(state_changed("input_number.a", "20.0", {"unit": "C"}))
+    coalescer.submit(state_changed("input_number.a", "20.1", {"unit": "F"}))
+    assert states(forwarded) == ["20.0", "20.1"]
+
+
+def test_summary_reports_each_window_on_its_own(clock):
+    coalescer, forwarded = make_coalescer({"sensor": {"mode": "summary", "window": 5}})
+    for state in ("3", "1", "unknown", "2"):
+        coalescer.submit(state_changed("sensor.a", state))
+        clock.now += 1
+
+    clock.now += 0.5
+    coalescer.flush()
+    assert forwarded == []
+
+    clock.now += 0.5
+    coalescer.flush()
+    assert states(forwarded) == ["2"]
+    assert forwarded[0]["data"]["coalesced"] == {"count": 4, "min": 1.0, "max": 3.0}
+
+    # The next window starts with the next event, not where the last one ended
+    clock.now += 60
+    coalescer.submit(state_changed("sensor.a", "7"))
+    clock.now += 4.9
+    coalescer.flush()
+    assert len(forwarded) == 1
+    clock.now += 0.1
+    coalescer.flush()
+    assert forwarded[1]["data"]["coalesced"] == {"count": 1, "min": 7.0, "max": 7.0}
+
+
+def test_forced_flush_forwards_windows_still_open(clock):
+    coalescer, forwarded = make_coalescer(
+        {"sensor": {"mode": "summary", "window": 5}, "light": {"mode": "latest", "window": 5}}
+    )
+    coalescer.submit(state_changed("sensor.a", "1"))
+    coalescer.submit(state_changed("light.a", "on"))
+
+    coalescer.flush(force=True)
+    assert sorted(states(forwarded)) == ["1", "on"]
+    coalescer.flush(force=True)
+    assert len(forwarded) == 2
+
+
+def test_unruled_domains_and_other_events_pass_through(clock):
+    coalescer, forwarded = make_coalescer({"sensor": {"mode": "latest"}})
+    coalescer.submit(state_changed("switch.a", "on"))
+    coalescer.submit(state_changed("switch.a", "on"))
+    coalescer.submit({"event_type": "call_service", "data": {}})
+    assert [evt["event_type"] for evt in forwarded] == ["state_changed", "call_service"]
+    assert coalescer.suppressed["identical"] == 1
+
+
+def test_events_from_different_instances_coalesce_separately(clock):
+    coalescer, forwarded = make_coalescer({"sensor": {"mode": "latest", "window": 1}})
+    for instance in ("site-a", "site-b"):
+        evt = state_changed("sensor.a", "1")
+        evt["instance"] = instance
+        coalescer.submit(evt)
+
+    clock.now += 1
+    coalescer.flush()
+    assert sorted(evt["instance"] for evt in forwarded) == ["site-a", "site-b"]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        EventCoalescer(on_event=None, rules={"sensor": {"mode": "median"}})
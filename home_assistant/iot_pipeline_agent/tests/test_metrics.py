@@ -0,0 +1,69 @@
+import os
+import re
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "agent"))
+
+pytest.importorskip("aiohttp")
+
+from metrics import AgentMetrics  # noqa: E402
+from coalescer import EventCoalescer  # noqa: E402
+from fan_in import FanIn  # noqa: E402
+
+# name{labels} value
+LABEL = r'[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"'
+SAMPLE = re.compile(rf"^[a-zA-Z_:][a-zA-Z0-9_:]*(\{{{LABEL}(,{LABEL})*\}})? \S+$")
+
+
+def state_changed(entity_id, state):
+    return {"event_type": "state_changed", "data": {"entity_id": entity_id, "new_state": {"state": state}}}
+
+
+@pytest.fixture
+def metrics():
+    metrics = AgentMetrics()
+    coalescer = EventCoalescer(on_event=lambda evt: None, rules={"sensor": {"mode": "deadband", "deadband": 1}})
+    for state in ("1", "1", "1.5", "3"):
+        coalescer.submit(state_changed("sensor.a", state))
+    fan_in = FanIn(on_event=lambda evt: None, max_queue=1)
+    for name in ("site-a", 'site "b"'):
+        on_event = fan_in.add_source(name)
+        on_event({})
+        on_event({})
+    metrics.extra += [coalescer.metric_values, fan_in.metric_values]
+    return metrics
+
+
+def types(text):
+    return dict(line.split()[2:4] for line in text.splitlines() if line.startswith("# TYPE"))
+
+
+def test_prometheus_output_uses_labels_and_counter_types(metrics):
+    text = metrics.render_prometheus()
+    for line in text.splitlines():
+        assert line.startswith("#") or SAMPLE.match(line), line
+
+    declared = types(text)
+    for name, kind in declared.items():
+        assert name.endswith("_total") == (kind == "counter"), name
+    assert declared["agent_coalescer_suppressed_total"] == "counter"
+    assert declared["agent_fanin_queue_depth"] == "gauge"
+    # One family per metric, however many label sets it has
+    assert text.count("# TYPE agent_fanin_dropped_total") == 1
+
+    lines = text.splitlines()
+    assert 'agent_coalescer_suppressed_total{reason="identical"} 1' in lines
+    assert 'agent_coalescer_suppressed_total{reason="deadband"} 1' in lines
+    assert "agent_coalescer_forwarded_total 2" in lines
+    assert 'agent_fanin_dropped_total{instance="site-a"} 1' in lines
+    assert 'agent_fanin_queue_depth{instance="site \\"b\\""} 1' in lines
+
+
+def test_json_snapshot_nests_labelled_samples(metrics):
+    snap = metrics.snapshot()
+    assert snap["coalescer_forwarded_total"] == 2
+    assert snap["coalescer_suppressed_total"] == {"identical": 1, "deadband": 1, "window": 0}
+    assert snap["fanin_dropped_total"] == {"site-a": 1, 'site "b"': 1}
@@ -5,6 +5,7 @@ import aws_cdk as cdk
 from stacks.infrastructure_stack import InfrastructureStack
 from stacks.ingestion_stack import IngestionStack
 from stacks.consumer_stack import ConsumerStack
+from stacks.backend_control_stack import BackendControlStack
 from constants import PROJECT_NAME
 
 env = cdk.Environment(
@@ -35,6 +36,18 @@ consumer = ConsumerStack(
     vpc=infra.vpc,
     kinesis_stream=infra.kinesis_stream,
     s3_bucket=infra.s3_data_bucket,
+    shard_count=infra.shard_count,
+    env=env,
+)
+
+BackendControlStack(
+    scope=app,
+    construct_id=f"{PROJECT_NAME}-backend-control-stack",
+    cluster=infra.cluster,
+    service=consumer.service,
+    kinesis_stream=infra.kinesis_stream,
+    api_key_secret=ingestion.api_key_secret,
+    shared_layer=ingestion.shared_layer,
     env=env,
 )
 
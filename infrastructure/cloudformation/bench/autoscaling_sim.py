@@ -0,0 +1,143 @@
+"""
+Consumer autoscaling simulator.
+
+Replays a per-minute iterator_age_seconds series through the step scaling
+policy defined in stacks/consumer_stack.py: the two CloudWatch alarms and
+their evaluation periods, the step adjustments, the cooldown and the
+min/max task bounds. Prints the alarm state and task count for every minute.
+
+The replay is open loop: the lag series is taken as given, not recomputed
+from the simulated task count. CPU target tracking and scale-in protection
+are not modelled; protection only delays when a scale-in takes effect.
+
+The series is a CSV of `minute,lag_seconds` (header optional), or a built-in
+synthetic incident when no file is given.
+
+Usage:
+    python bench/autoscaling_sim.py
+    python bench/autoscaling_sim.py --shards 4 --lag lag.csv
+"""
+
+import os
+import sys
+import csv
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from stacks.consumer_stack import (  # noqa: E402
+    ITERATOR_AGE_STEPS,
+    ITERATOR_AGE_EVALUATION_PERIODS,
+    SCALING_COOLDOWN_SECONDS,
+)
+
+MIN_CAPACITY = 1
+
+
+def synthetic_incident():
+    """Quiet hour, a backlog building for 20 minutes, then draining."""
+    series = [5.0] * 30
+    series += [5.0 + 45.0 * m for m in range(20)]
+    series += [max(905.0 - 60.0 * m, 8.0) for m in range(30)]
+    series += [5.0] * 40
+    return series
+
+
+def load_series(path):
+    series = []
+    with open(path) as f:
+        for row in csv.reader(f):
+            try:
+                series.append(float(row[-1]))
+            except (ValueError, IndexError):
+                continue
+    return series
+
+
+def step_change(lag):
+    """Change in tasks for one evaluation, or None when neither alarm breaches."""
+    for lower, upper, change in ITERATOR_AGE_STEPS:
+        if change < 0 and upper is not None and lag <= upper:
+            return change
+        if change > 0 and lag >= lower and (upper is None or lag < upper):
+            return change
+    return None
+
+
+def simulate(series, max_capacity, start_tasks=MIN_CAPACITY):
+    """
+    Yield (minute, lag, alarm, tasks) per minute.
+
+    An alarm fires once its direction has breached for
+    ITERATOR_AGE_EVALUATION_PERIODS consecutive minutes and stays in alarm,
+    invoking the policy every minute, while it keeps breaching. During a
+    cooldown scale-in is blocked and scale-out only applies the part of a
+    larger step not already applied.
+    """
+    tasks = start_tasks
+    breaching = {"in": 0, "out": 0}
+    cooldown_until = -1
+    last_out = 0
+    for minute, lag in enumerate(series):
+        change = step_change(lag)
+        direction = None if change is None else ("out" if change > 0 else "in")
+        for key in breaching:
+            breaching[key] = breaching[key] + 1 if key == direction else 0
+
+        alarm = "OK"
+        if direction and breaching[direction] >= ITERATOR_AGE_EVALUATION_PERIODS:
+            alarm = f"scale-{direction}"
+            in_cooldown = minute * 60 < cooldown_until
+            if direction == "out":
+                applied = change - last_out if in_cooldown else change
+                if applied > 0:
+                    target = min(tasks + applied, max_capacity)
+                    if target != tasks:
+                        tasks = target
+                        last_out = change
+                        cooldown_until = minute * 60 + SCALING_COOLDOWN_SECONDS
+            elif not in_cooldown:
+                target = max(tasks + change, MIN_CAPACITY)
+                if target != tasks:
+                    tasks = target
+                    last_out = 0
+                    cooldown_until = minute * 60 + SCALING_COOLDOWN_SECONDS
+        if minute * 60 >= cooldown_until:
+            last_out = 0
+        yield minute, lag, alarm, tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lag", help="CSV of minute,lag_seconds; defaults to a synthetic incident")
+    parser.add_argument("--shards", type=int, default=2, help="stream shard count (max tasks)")
+    parser.add_argument("--start-tasks", type=int, default=MIN_CAPACITY)
+    parser.add_argument("--changes-only", action="store_true", help="only print minutes where the count changes")
+    args = parser.parse_args()
+
+    series = load_series(args.lag) if args.lag else synthetic_incident()
+    if not series:
+        print("No lag samples")
+        sys.exit(1)
+
+    print(f"{'minute':>6} {'lag s':>8} {'alarm':<10} {'tasks':>5}")
+    previous = None
+    task_minutes = 0
+    changes = 0
+    for minute, lag, alarm, tasks in simulate(series, args.shards, args.start_tasks):
+        task_minutes += tasks
+        if tasks != previous and previous is not None:
+            changes += 1
+        if not args.changes_only or tasks != previous:
+            print(f"{minute:>6} {lag:>8.0f} {alarm:<10} {tasks:>5} {'#' * tasks}")
+        previous = tasks
+
+    print(
+        f"\n{len(series)} minutes, {changes} scaling changes, "
+        f"{task_minutes / len(series):.2f} tasks on average (max {args.shards})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,61 +3,62 @@ import os
 import json
 import traceback
 import logging
-from datetime import datetime, timedelta, timezone
+
+import activity
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-cw = boto3.client("cloudwatch")
 ecs = boto3.client("ecs")
+autoscaling = boto3.client("application-autoscaling")
 
 CLUSTER_ARN = os.environ["CLUSTER_ARN"]
 SERVICE_ARN = os.environ["SERVICE_ARN"]
-LB_FULL_NAME = os.environ["LB_FULL_NAME"]
+# The service's autoscaling target, "service/<cluster>/<service>"
+SCALING_RESOURCE_ID = os.environ["SCALING_RESOURCE_ID"]
 IDLE_HOURS = int(os.environ.get("IDLE_HOURS", "3"))
 
+# Per container: warm invocations only fetch the periods since the last run
+monitor = activity.monitor_from_env(window_seconds=IDLE_HOURS * 3600)
+
 
 def lambda_handler(event, context):
     logger.info("=== IDLE REAPER INVOKED ===")
 
     try:
-        now = datetime.now(timezone.utc)
-        start = now - timedelta(hours=IDLE_HOURS)
-
-        logger.info(f"Checking RequestCount from {start} → {now}")
-
-        metrics = cw.get_metric_statistics(
-            Namespace="AWS/ApplicationELB",
-            MetricName="RequestCount",
-            Dimensions=[{"Name": "LoadBalancer", "Value": LB_FULL_NAME}],
-            StartTime=start,
-            EndTime=now,
-            Period=300,
-            Statistics=["Sum"],
-        )
+        service = ecs.describe_services(cluster=CLUSTER_ARN, services=[SERVICE_ARN])["services"][0]
+        if service["desiredCount"] == 0:
+            logger.info("Backend already scaled to 0")
+            return {"status": "stopped"}
 
-        logger.info(f"Retrieved Metrics: {json.dumps(metrics, default=str)}")
+        summary = monitor.evaluate()
+        logger.info(f"Activity over the last {IDLE_HOURS}h: {json.dumps(summary)}")
 
-        total = sum(dp["Sum"] for dp in metrics.get("Datapoints", []))
-        logger.info(f"Total RequestCount: {total}")
-
-        if total > 0:
+        if not summary["idle"]:
             logger.info("Backend is active — NOT scaling down.")
-            return {"status": "active", "request_count": total}
+            return {"status": "active", **summary}
+
+        if not summary["drained"]:
+            logger.info("Ingestion idle but backlog not drained — NOT scaling down.")
+            return {"status": "draining", **summary}
 
-        logger.info("Backend idle — scaling down to 0")
+        logger.info("Backend idle and drained — scaling down to 0")
 
-        ecs_response = ecs.update_service(
+        # Lower the autoscaling floor first, or Application Auto Scaling would
+        # start a task again
+        autoscaling.register_scalable_target(
+            ServiceNamespace="ecs",
+            ResourceId=SCALING_RESOURCE_ID,
+            ScalableDimension="ecs:service:DesiredCount",
+            MinCapacity=0,
+        )
+        ecs.update_service(
             cluster=CLUSTER_ARN,
             service=SERVICE_ARN,
             desiredCount=0,
         )
 
-        logger.info(
-            f"ECS UpdateService Response: {json.dumps(ecs_response, default=str)}"
-        )
-
-        return {"status": "scaled_to_zero", "request_count": 0}
+        return {"status": "scaled_to_zero", **summary}
 
     except Exception as e:
         logger.error("ERROR in Idle Reaper:")
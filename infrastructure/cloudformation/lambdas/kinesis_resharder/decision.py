@@ -0,0 +1,166 @@
+"""
+Shard count decisions for the Kinesis resharding controller.
+
+No AWS calls in here: the handler fetches per-minute samples and the times of
+previous changes, and this module decides, so recorded metric traces can be
+replayed through the same logic offline.
+
+A sample is a dict for one minute with "timestamp" (epoch seconds),
+"incoming_bytes" and "incoming_records" (the stream's IncomingBytes and
+IncomingRecords sums), "events_ingested" and "failed_records" (the ingestion
+Lambda's events_ingested and kinesis_failed_records sums). Missing keys count
+as 0.
+"""
+
+import math
+
+# Per-shard write limits
+SHARD_BYTES_PER_SECOND = 1024 * 1024
+SHARD_RECORDS_PER_SECOND = 1000
+PERIOD_SECONDS = 60
+
+# Hysteresis band on utilization, the busier of bytes and records against the
+# open shards' limits. Both directions resize to put the window's peak at
+# TARGET_UTILIZATION, as far as UpdateShardCount's halve/double limits allow,
+# so a resize does not land on the other side of the band.
+SCALE_OUT_UTILIZATION = 0.75
+SCALE_IN_UTILIZATION = 0.30
+TARGET_UTILIZATION = 0.5
+
+# Minutes with this share of records failing count as over the band whatever
+# the utilization: throttling on a hot shard long before the stream is full
+FAILED_RATIO = 0.01
+
+# Scale out when SCALE_OUT_BREACHES of the last SCALE_OUT_PERIODS minutes are
+# over the band; scale in only after SCALE_IN_PERIODS quiet minutes
+SCALE_OUT_PERIODS = 5
+SCALE_OUT_BREACHES = 4
+SCALE_IN_PERIODS = 60
+
+SCALE_OUT_COOLDOWN_SECONDS = 15 * 60
+SCALE_IN_COOLDOWN_SECONDS = 6 * 3600
+
+# UpdateShardCount allows 10 calls per stream per rolling 24 hours. Scale-in
+# leaves SCALE_OUT_RESERVE of them for scaling back out.
+MAX_CHANGES_PER_DAY = 10
+SCALE_OUT_RESERVE = 2
+
+MIN_SHARDS = 1
+MAX_SHARDS = 16
+
+
+def demand(sample):
+    """Shards needed to carry the sample at 100% of the write limits."""
+    return max(
+        sample.get("incoming_bytes", 0) / (SHARD_BYTES_PER_SECOND * PERIOD_SECONDS),
+        sample.get("incoming_records", 0) / (SHARD_RECORDS_PER_SECOND * PERIOD_SECONDS),
+    )
+
+
+def utilization(sample, shards):
+    return demand(sample) / shards
+
+
+def failed_ratio(sample):
+    failed = sample.get("failed_records", 0)
+    total = sample.get("events_ingested", 0) + failed
+    return failed / total if total else 0.0
+
+
+def _hot(sample, shards):
+    return utilization(sample, shards) >= SCALE_OUT_UTILIZATION or failed_ratio(sample) >= FAILED_RATIO
+
+
+def _quiet(sample, shards):
+    return utilization(sample, shards) <= SCALE_IN_UTILIZATION and failed_ratio(sample) < FAILED_RATIO
+
+
+def _decision(action, shards, target, reason):
+    return {"action": action, "shards": shards, "target": target, "reason": reason}
+
+
+def decide(samples, shards, now, changes=(), min_shards=MIN_SHARDS, max_shards=MAX_SHARDS):
+    """
+    Decide whether to change the stream's shard count.
+
+    Args:
+        samples: Per-minute samples, oldest first, ending at the last complete minute
+        shards: Open shard count
+        now: Current time, epoch seconds
+        changes: Epoch seconds of earlier shard count changes
+        min_shards: Lower bound on the shard count
+        max_shards: Upper bound on the shard count
+
+    Returns:
+        dict: "action" ("scale_out", "scale_in" or "none"), "shards", "target"
+        and a human-readable "reason"
+    """
+    recent_changes = [t for t in changes if now - t < 24 * 3600]
+    since_change = now - max(changes) if changes else math.inf
+
+    window = samples[-SCALE_OUT_PERIODS:]
+    hot = sum(1 for sample in window if _hot(sample, shards))
+    if len(window) == SCALE_OUT_PERIODS and hot >= SCALE_OUT_BREACHES:
+        peak = max(demand(sample) for sample in window)
+        # Failures at low utilization still add a shard
+        target = max(math.ceil(peak / TARGET_UTILIZATION), shards + 1)
+        target = min(target, shards * 2, max_shards)
+        if target <= shards:
+            reason = f"over the band for {hot} minutes, already at {max_shards} shards"
+            return _decision("none", shards, shards, reason)
+        if since_change < SCALE_OUT_COOLDOWN_SECONDS:
+            reason = f"over the band, cooling down ({since_change:.0f}s since last change)"
+            return _decision("none", shards, shards, reason)
+        if len(recent_changes) >= MAX_CHANGES_PER_DAY:
+            return _decision("none", shards, shards, "over the band, daily UpdateShardCount quota used")
+        reason = f"over the band for {hot} of {SCALE_OUT_PERIODS} minutes, peak {peak:.2f} shards"
+        return _decision("scale_out", shards, target, reason)
+
+    window = samples[-SCALE_IN_PERIODS:]
+    if len(window) == SCALE_IN_PERIODS and all(_quiet(sample, shards) for sample in window):
+        peak = max(demand(sample) for sample in window)
+        # UpdateShardCount can at most halve the stream
+        target = max(math.ceil(peak / TARGET_UTILIZATION), (shards + 1) // 2, min_shards)
+        if target >= shards:
+            return _decision("none", shards, shards, f"under the band, already at {shards} shards")
+        if since_change < SCALE_IN_COOLDOWN_SECONDS:
+            reason = f"under the band, cooling down ({since_change:.0f}s since last change)"
+            return _decision("none", shards, shards, reason)
+        if len(recent_changes) >= MAX_CHANGES_PER_DAY - SCALE_OUT_RESERVE:
+            reason = "under the band, keeping the remaining UpdateShardCount quota for scale-out"
+            return _decision("none", shards, shards, reason)
+        reason = f"under the band for {SCALE_IN_PERIODS} minutes, peak {peak:.2f} shards"
+        return _decision("scale_in", shards, target, reason)
+
+    return _decision("none", shards, shards, "within the band")
+
+
+def replay(samples, shards, interval_seconds=300, **bounds):
+    """
+    Run the controller over a recorded trace as it would run on a schedule.
+
+    The trace's load is replayed as recorded; only the utilization it implies
+    changes with the shard count. Returns the decisions that changed the shard
+    count, each with its "timestamp" added.
+
+    Args:
+        samples: Per-minute samples, oldest first
+        shards: Shard count at the start of the trace
+        interval_seconds: Controller schedule
+        **bounds: min_shards / max_shards for decide()
+    """
+    changes = []
+    actions = []
+    next_run = samples[0]["timestamp"] + interval_seconds if samples else None
+    for end, sample in enumerate(samples, start=1):
+        if sample["timestamp"] < next_run:
+            continue
+        next_run += interval_seconds
+        # The handler only sees minutes that have completed
+        now = sample["timestamp"] + PERIOD_SECONDS
+        decision = decide(samples[max(end - SCALE_IN_PERIODS, 0):end], shards, now, changes, **bounds)
+        if decision["action"] != "none":
+            changes.append(now)
+            shards = decision["target"]
+            actions.append({"timestamp": now, **decision})
+    return actions
@@ -0,0 +1,151 @@
+import boto3
+import os
+import json
+import traceback
+import logging
+from datetime import datetime, timezone
+
+import decision
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+cw = boto3.client("cloudwatch")
+kinesis = boto3.client("kinesis")
+autoscaling = boto3.client("application-autoscaling")
+
+STREAM_NAME = os.environ["STREAM_NAME"]
+MIN_SHARDS = int(os.environ.get("MIN_SHARDS", decision.MIN_SHARDS))
+MAX_SHARDS = int(os.environ.get("MAX_SHARDS", decision.MAX_SHARDS))
+INGESTION_SERVICE = os.environ.get("INGESTION_SERVICE", "ingestion_lambda")
+# ECS service whose task count is bounded by the shard count, "service/<cluster>/<service>"
+CONSUMER_SCALING_RESOURCE_ID = os.environ.get("CONSUMER_SCALING_RESOURCE_ID")
+
+# Times of earlier changes, for cooldowns and the daily quota, kept on the stream
+CHANGES_TAG = "resharder:changes"
+
+METRICS = {
+    "incoming_bytes": ("AWS/Kinesis", "IncomingBytes", "StreamName", STREAM_NAME),
+    "incoming_records": ("AWS/Kinesis", "IncomingRecords", "StreamName", STREAM_NAME),
+    "events_ingested": ("IoTIngestionPipeline", "events_ingested", "Service", INGESTION_SERVICE),
+    "failed_records": ("IoTIngestionPipeline", "kinesis_failed_records", "Service", INGESTION_SERVICE),
+}
+
+
+def _load_samples(end):
+    """Per-minute samples over the decision window, oldest first; minutes without datapoints are 0."""
+    start = end - decision.SCALE_IN_PERIODS * decision.PERIOD_SECONDS
+    queries = [
+        {
+            "Id": key,
+            "MetricStat": {
+                "Metric": {
+                    "Namespace": namespace,
+                    "MetricName": metric_name,
+                    "Dimensions": [{"Name": dimension, "Value": value}],
+                },
+                "Period": decision.PERIOD_SECONDS,
+                "Stat": "Sum",
+            },
+        }
+        for key, (namespace, metric_name, dimension, value) in METRICS.items()
+    ]
+
+    samples = {
+        t: {"timestamp": t}
+        for t in range(start, end, decision.PERIOD_SECONDS)
+    }
+    kwargs = {
+        "MetricDataQueries": queries,
+        "StartTime": datetime.fromtimestamp(start, timezone.utc),
+        "EndTime": datetime.fromtimestamp(end, timezone.utc),
+    }
+    while True:
+        response = cw.get_metric_data(**kwargs)
+        for result in response["MetricDataResults"]:
+            for timestamp, value in zip(result["Timestamps"], result["Values"]):
+                sample = samples.get(int(timestamp.timestamp()))
+                if sample is not None:
+                    sample[result["Id"]] = value
+        if "NextToken" not in response:
+            break
+        kwargs["NextToken"] = response["NextToken"]
+
+    return [samples[t] for t in sorted(samples)]
+
+
+def _load_changes():
+    tags = kinesis.list_tags_for_stream(StreamName=STREAM_NAME)["Tags"]
+    value = next((tag["Value"] for tag in tags if tag["Key"] == CHANGES_TAG), "")
+    return [int(t) for t in value.split()]
+
+
+def _record_change(changes, now):
+    changes = [t for t in changes if now - t < 24 * 3600] + [now]
+    kinesis.add_tags_to_stream(
+        StreamName=STREAM_NAME,
+        Tags={CHANGES_TAG: " ".join(str(t) for t in changes)},
+    )
+
+
+def _bound_consumer(shards):
+    """One consumer task per shard at most; tasks beyond that hold no lease."""
+    if not CONSUMER_SCALING_RESOURCE_ID:
+        return
+    autoscaling.register_scalable_target(
+        ServiceNamespace="ecs",
+        ResourceId=CONSUMER_SCALING_RESOURCE_ID,
+        ScalableDimension="ecs:service:DesiredCount",
+        MaxCapacity=shards,
+    )
+
+
+def lambda_handler(event, context):
+    logger.info("=== KINESIS RESHARDER INVOKED ===")
+
+    try:
+        summary = kinesis.describe_stream_summary(StreamName=STREAM_NAME)["StreamDescriptionSummary"]
+        if summary["StreamStatus"] != "ACTIVE":
+            logger.info(f"Stream is {summary['StreamStatus']} — skipping")
+            return {"status": "stream_busy", "stream_status": summary["StreamStatus"]}
+
+        shards = summary["OpenShardCount"]
+        now = int(datetime.now(timezone.utc).timestamp())
+        # Stream metrics for the current minute are still incomplete
+        end = now // decision.PERIOD_SECONDS * decision.PERIOD_SECONDS - decision.PERIOD_SECONDS
+        samples = _load_samples(end)
+        changes = _load_changes()
+
+        result = decision.decide(
+            samples,
+            shards,
+            now,
+            changes,
+            min_shards=MIN_SHARDS,
+            max_shards=MAX_SHARDS,
+        )
+        logger.info(f"Decision: {json.dumps(result)}")
+
+        if result["action"] == "none":
+            # Every run, not only after a change: the resharder owns MaxCapacity,
+            # CloudFormation only sets the initial shard count
+            _bound_consumer(shards)
+            return {"status": "unchanged", **result}
+
+        kinesis.update_shard_count(
+            StreamName=STREAM_NAME,
+            TargetShardCount=result["target"],
+            ScalingType="UNIFORM_SCALING",
+        )
+        _record_change(changes, now)
+        _bound_consumer(result["target"])
+
+        return {"status": "resharding", **result}
+
+    except Exception as e:
+        logger.error("ERROR in Kinesis resharder:")
+        logger.error(traceback.format_exc())
+        return {
+            "status": "error",
+            "details": str(e),
+        }
@@ -0,0 +1,153 @@
+"""
+Activity detection shared by the backend control Lambdas (ecs_reaper,
+start_backend, stop_backend). Deployed as a Lambda layer, so it lives under
+python/ and imports as `activity`.
+
+One GetMetricData call covers ALB requests, Kinesis incoming records and the
+consumer's iterator age. Datapoints are kept per container, so a warm
+invocation only fetches the periods that completed since the last one.
+"""
+
+import os
+import logging
+from datetime import datetime, timezone
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+PERIOD_SECONDS = 300
+
+# The latest period's lag at or under this counts as drained
+DRAINED_ITERATOR_AGE_SECONDS = int(os.environ.get("DRAINED_ITERATOR_AGE_SECONDS", "60"))
+
+METRICS_NAMESPACE = "IoTIngestionPipeline"
+
+
+def queries_from_env():
+    """
+    Metric queries for the resources named in the environment: LB_FULL_NAME
+    (ALB requests), STREAM_NAME (Kinesis incoming records) and
+    CONSUMER_SERVICE (iterator age, defaults to "consumer"). Unset resources
+    are left out.
+    """
+    queries = {}
+    if os.environ.get("LB_FULL_NAME"):
+        queries["requests"] = ("AWS/ApplicationELB", "RequestCount", "LoadBalancer", os.environ["LB_FULL_NAME"], "Sum")
+    if os.environ.get("STREAM_NAME"):
+        queries["incoming_records"] = ("AWS/Kinesis", "IncomingRecords", "StreamName", os.environ["STREAM_NAME"], "Sum")
+    queries["iterator_age"] = (
+        METRICS_NAMESPACE,
+        "iterator_age_seconds",
+        "Service",
+        os.environ.get("CONSUMER_SERVICE", "consumer"),
+        "Maximum",
+    )
+    return queries
+
+
+class ActivityMonitor:
+    """
+    Rolling window of per-period datapoints for a fixed set of metrics.
+
+    Args:
+        cloudwatch: boto3 CloudWatch client
+        queries: {id: (namespace, metric name, dimension name, dimension value, stat)}
+        window_seconds: How far back evaluate() looks
+        period_seconds: Datapoint resolution
+    """
+
+    def __init__(self, cloudwatch, queries, window_seconds, period_seconds=PERIOD_SECONDS):
+        self._cw = cloudwatch
+        self._queries = queries
+        self._window = window_seconds
+        self._period = period_seconds
+        self._datapoints = {key: {} for key in queries}
+        self._fetched_until = None
+
+    def _metric_data_queries(self):
+        return [
+            {
+                "Id": key,
+                "MetricStat": {
+                    "Metric": {
+                        "Namespace": namespace,
+                        "MetricName": metric_name,
+                        "Dimensions": [{"Name": dimension, "Value": value}],
+                    },
+                    "Period": self._period,
+                    "Stat": stat,
+                },
+            }
+            for key, (namespace, metric_name, dimension, value, stat) in self._queries.items()
+        ]
+
+    def _fetch(self, start, end):
+        kwargs = {
+            "MetricDataQueries": self._metric_data_queries(),
+            "StartTime": datetime.fromtimestamp(start, timezone.utc),
+            "EndTime": datetime.fromtimestamp(end, timezone.utc),
+            "ScanBy": "TimestampAscending",
+        }
+        while True:
+            response = self._cw.get_metric_data(**kwargs)
+            for result in response["MetricDataResults"]:
+                points = self._datapoints[result["Id"]]
+                for timestamp, value in zip(result["Timestamps"], result["Values"]):
+                    points[int(timestamp.timestamp())] = value
+            if "NextToken" not in response:
+                return
+            kwargs["NextToken"] = response["NextToken"]
+
+    def refresh(self, now=None):
+        """Fetch the periods completed since the last refresh and drop those out of the window."""
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        end = int(now) // self._period * self._period
+        start = end - self._window
+        if self._fetched_until is not None and self._fetched_until > start:
+            # The last fetched period again, for datapoints that arrived late
+            start = self._fetched_until - self._period
+        if self._fetched_until != end:
+            self._fetch(start, end)
+            logger.info(f"Fetched {(end - start) // self._period} periods of {len(self._queries)} metrics")
+            self._fetched_until = end
+
+        for points in self._datapoints.values():
+            for timestamp in [t for t in points if t < end - self._window]:
+                del points[timestamp]
+        return end
+
+    def evaluate(self, now=None):
+        """
+        Summarize the window.
+
+        Returns:
+            dict: "window_start" / "window_end" (epoch seconds), "requests"
+            and "incoming_records" summed over the window (None when not
+            queried), "iterator_age_seconds" of the latest period with a
+            datapoint (None without one), "idle" when no requests or records
+            came in, "drained" when the consumer's latest lag is within
+            DRAINED_ITERATOR_AGE_SECONDS (however old, once idle)
+        """
+        end = self.refresh(now)
+        summary = {"window_start": end - self._window, "window_end": end}
+        for key in ("requests", "incoming_records"):
+            summary[key] = sum(self._datapoints[key].values()) if key in self._datapoints else None
+
+        ages = self._datapoints["iterator_age"]
+        latest = max(ages) if ages else None
+        summary["iterator_age_seconds"] = ages[latest] if latest is not None else None
+
+        summary["idle"] = not summary["requests"] and not summary["incoming_records"]
+        # While records come in, an old lag datapoint leaves the backlog unknown.
+        # Once idle nothing new can pile up, so the last lag still holds.
+        summary["drained"] = (
+            latest is not None
+            and (summary["idle"] or latest >= end - 2 * self._period)
+            and ages[latest] <= DRAINED_ITERATOR_AGE_SECONDS
+        )
+        return summary
+
+
+def monitor_from_env(window_seconds, period_seconds=PERIOD_SECONDS):
+    return ActivityMonitor(boto3.client("cloudwatch"), queries_from_env(), window_seconds, period_seconds)
@@ -0,0 +1,102 @@
+"""
+API key validation shared by the ingestion Lambda and the backend control
+Lambdas, deployed in the same layer as activity.py.
+
+Keys are cached for a TTL, so warm invocations make no Secrets Manager call.
+Both the AWSCURRENT and AWSPENDING versions are accepted, so clients that
+already hold the key a rotation is about to promote keep working. A key that
+matches neither triggers one early refresh, rate-limited, in case a rotation
+finished since the cache was filled.
+"""
+
+import os
+import hmac
+import time
+import logging
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+CACHE_SECONDS = int(os.environ.get("API_KEY_CACHE_SECONDS", "300"))
+# Bound on refreshes triggered by unknown keys, so bad keys cannot drive Secrets Manager calls
+MIN_REFRESH_SECONDS = 30
+
+STAGES = ("AWSCURRENT", "AWSPENDING")
+
+
+class ApiKeyValidator:
+    """
+    Args:
+        secret_id: ARN or name of the API key secret
+        client: boto3 Secrets Manager client
+        ttl_seconds: How long fetched keys are trusted
+        clock: Monotonic time source, replaceable in tests
+    """
+
+    def __init__(self, secret_id, client, ttl_seconds=CACHE_SECONDS, clock=time.monotonic):
+        self._secret_id = secret_id
+        self._client = client
+        self._ttl = ttl_seconds
+        self._clock = clock
+        self._keys = ()
+        self._fetched_at = None
+
+    def _fetch(self):
+        keys = []
+        for stage in STAGES:
+            try:
+                value = self._client.get_secret_value(SecretId=self._secret_id, VersionStage=stage)["SecretString"]
+            except ClientError as e:
+                # No AWSPENDING version outside a rotation
+                if stage != "AWSCURRENT" and e.response["Error"]["Code"] == "ResourceNotFoundException":
+                    continue
+                raise
+            if value not in keys:
+                keys.append(value)
+        return tuple(key.encode() for key in keys)
+
+    def _refresh(self):
+        try:
+            self._keys = self._fetch()
+        except Exception:
+            if not self._keys:
+                raise
+            # Keep serving the cached keys until Secrets Manager is reachable again
+            logger.exception("API key refresh failed, using cached keys")
+        self._fetched_at = self._clock()
+
+    def _age(self):
+        return self._clock() - self._fetched_at if self._fetched_at is not None else None
+
+    def _matches(self, supplied):
+        # Every key is compared, in constant time
+        matched = False
+        for key in self._keys:
+            matched |= hmac.compare_digest(supplied, key)
+        return matched
+
+    def validate(self, supplied):
+        """
+        Check a client-supplied key.
+
+        Returns:
+            bool: True when it matches the current or pending key
+
+        Raises:
+            Exception: Secrets Manager errors, only when no keys are cached yet
+        """
+        if not supplied:
+            return False
+        supplied = supplied.encode()
+
+        age = self._age()
+        if age is None or age >= self._ttl:
+            self._refresh()
+        if self._matches(supplied):
+            return True
+
+        if self._age() >= MIN_REFRESH_SECONDS:
+            self._refresh()
+            return self._matches(supplied)
+        return False
@@ -1,46 +1,145 @@
 import boto3
 import os
 import json
+import time
 import traceback
 import logging
 
+import activity
+from api_keys import ApiKeyValidator
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 ecs = boto3.client("ecs")
+autoscaling = boto3.client("application-autoscaling")
 secrets = boto3.client("secretsmanager")
+dynamodb = boto3.client("dynamodb")
 
 CLUSTER_ARN = os.environ["CLUSTER_ARN"]
 SERVICE_ARN = os.environ["SERVICE_ARN"]
+# The service's autoscaling target, "service/<cluster>/<service>"
+SCALING_RESOURCE_ID = os.environ["SCALING_RESOURCE_ID"]
 API_KEY_SECRET_ARN = os.environ["API_KEY_SECRET_ARN"]
 
+# Per container, so warm invocations skip Secrets Manager
+api_keys = ApiKeyValidator(API_KEY_SECRET_ARN, client=secrets)
+BACKLOG_MINUTES = int(os.environ.get("BACKLOG_MINUTES", "15"))
+
+monitor = activity.monitor_from_env(window_seconds=BACKLOG_MINUTES * 60)
+
+# Heartbeats the consumer's shard processors write once they are consuming
+# (services/consumer/src/readiness.py); older than HEARTBEAT_STALE_SECONDS
+# means the processor stopped
+READINESS_TABLE = os.environ.get("READINESS_TABLE")
+HEARTBEAT_STALE_SECONDS = 180
+
+
+def _heartbeats():
+    if not READINESS_TABLE:
+        return []
+    heartbeats = []
+    kwargs = {"TableName": READINESS_TABLE}
+    while True:
+        try:
+            response = dynamodb.scan(**kwargs)
+        except dynamodb.exceptions.ResourceNotFoundException:
+            # Created by the first consumer to become ready
+            return []
+        heartbeats.extend(json.loads(item["heartbeat"]["S"]) for item in response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return heartbeats
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _status():
+    """Readiness of the service's tasks: time from task creation to the first consumed batch."""
+    service = ecs.describe_services(cluster=CLUSTER_ARN, services=[SERVICE_ARN])["services"][0]
+    task_arns = ecs.list_tasks(cluster=CLUSTER_ARN, serviceName=SERVICE_ARN, desiredStatus="RUNNING")["taskArns"]
+    tasks = ecs.describe_tasks(cluster=CLUSTER_ARN, tasks=task_arns)["tasks"] if task_arns else []
+    heartbeats = _heartbeats()
+    now = time.time()
+
+    report = []
+    for task in tasks:
+        created_at = task["createdAt"].timestamp()
+        beats = [
+            h for h in heartbeats
+            if h["task"] == task["taskArn"] and h["ready_at"] >= created_at
+        ]
+        fresh = [h for h in beats if now - h["heartbeat_at"] <= HEARTBEAT_STALE_SECONDS]
+        first = min(beats, key=lambda h: h["ready_at"], default=None)
+        ready_at = first["ready_at"] if first else None
+        report.append(
+            {
+                "task": task["taskArn"].rsplit("/", 1)[-1],
+                "last_status": task["lastStatus"],
+                "ready": bool(fresh),
+                # Task creation covers Fargate provisioning and image pull too
+                "time_to_ready_seconds": ready_at - created_at if ready_at else None,
+                "waiting_seconds": None if ready_at else now - created_at,
+                "shards": sorted(h["shard_id"] for h in fresh),
+                "phases": first["phases"] if first else None,
+            }
+        )
+
+    if any(t["ready"] for t in report):
+        status = "ready"
+    elif service["desiredCount"] > 0 or report:
+        status = "starting"
+    else:
+        status = "stopped"
+    return {
+        "status": status,
+        "desired_count": service["desiredCount"],
+        "running_count": service["runningCount"],
+        "tasks": report,
+    }
+
 
 def lambda_handler(event, context):
     logger.info("=== START BACKEND LAMBDA INVOKED ===")
 
     try:
-        supplied_key = event.get("headers", {}).get("x-api-key")
+        supplied_key = (event.get("headers") or {}).get("x-api-key")
         if not supplied_key:
             return {"statusCode": 401, "body": "Missing x-api-key header"}
 
-        real_secret = secrets.get_secret_value(SecretId=API_KEY_SECRET_ARN)[
-            "SecretString"
-        ]
-        if supplied_key != real_secret:
+        if not api_keys.validate(supplied_key):
             logger.warning("Invalid API Key attempt")
-            return {"status_code": 403, "body": "Forbidden"}
+            return {"statusCode": 403, "body": "Forbidden"}
+
+        # ?mode=status reports readiness without starting anything
+        if (event.get("queryStringParameters") or {}).get("mode") == "status":
+            return {"statusCode": 200, "body": json.dumps(_status())}
+
+        # Restore the autoscaling floor the reaper and stop_backend lower to 0
+        autoscaling.register_scalable_target(
+            ServiceNamespace="ecs",
+            ResourceId=SCALING_RESOURCE_ID,
+            ScalableDimension="ecs:service:DesiredCount",
+            MinCapacity=1,
+        )
 
         response = ecs.update_service(
             cluster=CLUSTER_ARN,
             service=SERVICE_ARN,
             desiredCount=1,
         )
-        logger.info(f"ECS UpdateService Response: {json.dumps(response, default=str)}")
+        logger.info(f"Desired count set to {response['service']['desiredCount']}")
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps({"status": "starting_backend"}),
-        }
+        # What the backend will start into: recent ingestion and the last known lag.
+        # The service is already starting, so a CloudWatch error must not fail the call.
+        body = {"status": "starting_backend"}
+        try:
+            summary = monitor.evaluate()
+            body["incoming_records"] = summary["incoming_records"]
+            body["iterator_age_seconds"] = summary["iterator_age_seconds"]
+        except Exception as e:
+            logger.error(f"Activity lookup failed after starting backend: {e}")
+
+        # Callers poll ?mode=status for readiness
+        return {"statusCode": 200, "body": json.dumps(body)}
 
     except Exception as e:
         logger.error("ERROR while starting backend:")
@@ -4,31 +4,42 @@ import json
 import traceback
 import logging
 
+import activity
+from api_keys import ApiKeyValidator
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 ecs = boto3.client("ecs")
+autoscaling = boto3.client("application-autoscaling")
 secrets = boto3.client("secretsmanager")
 
 CLUSTER_ARN = os.environ["CLUSTER_ARN"]
 SERVICE_ARN = os.environ["SERVICE_ARN"]
+# The service's autoscaling target, "service/<cluster>/<service>"
+SCALING_RESOURCE_ID = os.environ["SCALING_RESOURCE_ID"]
 API_KEY_SECRET_ARN = os.environ["API_KEY_SECRET_ARN"]
 
+# Per container, so warm invocations skip Secrets Manager
+api_keys = ApiKeyValidator(API_KEY_SECRET_ARN, client=secrets)
+# Ingestion must have been quiet this long, and the backlog drained, to stop
+# without ?force=true
+IDLE_MINUTES = int(os.environ.get("IDLE_MINUTES", "15"))
+
+monitor = activity.monitor_from_env(window_seconds=IDLE_MINUTES * 60)
+
 
 def lambda_handler(event, context):
     logger.info("=== STOP BACKEND LAMBDA INVOKED ===")
 
     try:
-        supplied_key = event.get("headers", {}).get("x-api-key")
+        supplied_key = (event.get("headers") or {}).get("x-api-key")
         if not supplied_key:
-            return {"status_code": 401, "body": "Missing x-api-key header"}
+            return {"statusCode": 401, "body": "Missing x-api-key header"}
 
-        real_secret = secrets.get_secret_value(SecretId=API_KEY_SECRET_ARN)[
-            "SecretString"
-        ]
-        if supplied_key != real_secret:
+        if not api_keys.validate(supplied_key):
             logger.warning("Invalid API Key attempt")
-            return {"status_code": 403, "body": "Forbidden"}
+            return {"statusCode": 403, "body": "Forbidden"}
 
         tasks = ecs.list_tasks(
             cluster=CLUSTER_ARN, serviceName=SERVICE_ARN, desiredStatus="RUNNING"
@@ -36,6 +47,31 @@ def lambda_handler(event, context):
 
         logger.info(f"Running Tasks Found: {tasks}")
 
+        force = (event.get("queryStringParameters") or {}).get("force") == "true"
+        if tasks and not force:
+            summary = monitor.evaluate()
+            logger.info(f"Activity over the last {IDLE_MINUTES}m: {json.dumps(summary)}")
+            if not (summary["idle"] and summary["drained"]):
+                return {
+                    "statusCode": 409,
+                    "body": json.dumps(
+                        {
+                            "status": "backend_busy",
+                            "detail": "Ingestion active or backlog not drained; retry with ?force=true to stop anyway",
+                            **summary,
+                        }
+                    ),
+                }
+
+        # Lower the autoscaling floor first, or Application Auto Scaling would
+        # start a task again
+        autoscaling.register_scalable_target(
+            ServiceNamespace="ecs",
+            ResourceId=SCALING_RESOURCE_ID,
+            ScalableDimension="ecs:service:DesiredCount",
+            MinCapacity=0,
+        )
+
         stopped = []
 
         for task_arn in tasks:
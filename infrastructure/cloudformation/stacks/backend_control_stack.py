@@ -0,0 +1,145 @@
+from aws_cdk import (
+    Duration,
+    Stack,
+    CfnOutput,
+    aws_apigatewayv2 as apigwv2,
+    aws_apigatewayv2_integrations as integrations,
+    aws_ecs as ecs,
+    aws_events as events,
+    aws_events_targets as events_targets,
+    aws_iam as iam,
+    aws_kinesis as kinesis,
+    aws_lambda as _lambda,
+    aws_logs as logs,
+    aws_secretsmanager as secretsmanager,
+)
+from constructs import Construct
+
+from constants import PROJECT_NAME
+
+# How often ecs_reaper checks whether the consumer can be scaled to zero
+REAPER_INTERVAL_MINUTES = 15
+
+
+class BackendControlStack(Stack):
+    """
+    The Lambdas that start, stop and reap the consumer service: ecs_reaper on
+    a schedule, start_backend and stop_backend behind an HTTP API. All three
+    import the shared layer (activity, api_keys).
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        cluster: ecs.ICluster,
+        service: ecs.BaseService,
+        kinesis_stream: kinesis.IStream,
+        api_key_secret: secretsmanager.ISecret,
+        shared_layer: _lambda.ILayerVersion,
+        **kwargs,
+    ):
+        super().__init__(scope, construct_id, **kwargs)
+        service_name = f"{PROJECT_NAME}-backend-control"
+
+        region = Stack.of(self).region
+        account = Stack.of(self).account
+        # The consumer creates this table on first use (readiness.py)
+        readiness_table = f"{service.service_name}-checkpoint-readiness"
+
+        environment = {
+            "CLUSTER_ARN": cluster.cluster_arn,
+            "SERVICE_ARN": service.service_arn,
+            "STREAM_NAME": kinesis_stream.stream_name,
+            "SCALING_RESOURCE_ID": f"service/{cluster.cluster_name}/{service.service_name}",
+        }
+
+        def control_function(name, extra_environment):
+            return _lambda.Function(
+                self,
+                f"{service_name}-{name}-fn",
+                function_name=f"{service_name}-{name}-fn",
+                runtime=_lambda.Runtime.PYTHON_3_13,
+                handler="index.lambda_handler",
+                code=_lambda.Code.from_asset(f"lambdas/{name}", exclude=["**/__pycache__"]),
+                layers=[shared_layer],
+                architecture=_lambda.Architecture.ARM_64,
+                timeout=Duration.seconds(30),
+                environment={**environment, **extra_environment},
+                log_retention=logs.RetentionDays.TWO_WEEKS,
+            )
+
+        reaper_fn = control_function("ecs_reaper", {})
+        start_fn = control_function(
+            "start_backend",
+            {"API_KEY_SECRET_ARN": api_key_secret.secret_arn, "READINESS_TABLE": readiness_table},
+        )
+        stop_fn = control_function("stop_backend", {"API_KEY_SECRET_ARN": api_key_secret.secret_arn})
+
+        task_arns = f"arn:aws:ecs:{region}:{account}:task/{cluster.cluster_name}/*"
+        for fn in (reaper_fn, start_fn, stop_fn):
+            # Activity detection (activity.py)
+            fn.add_to_role_policy(
+                iam.PolicyStatement(actions=["cloudwatch:GetMetricData"], resources=["*"])
+            )
+            fn.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["ecs:DescribeServices", "ecs:UpdateService"],
+                    resources=[service.service_arn],
+                )
+            )
+            # Stopping and starting move the autoscaling floor (MinCapacity)
+            fn.add_to_role_policy(
+                iam.PolicyStatement(actions=["application-autoscaling:RegisterScalableTarget"], resources=["*"])
+            )
+
+        for fn in (start_fn, stop_fn):
+            api_key_secret.grant_read(fn)
+            # ListTasks is scoped by the cluster condition, not by resource
+            fn.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["ecs:ListTasks"],
+                    resources=["*"],
+                    conditions={"ArnEquals": {"ecs:cluster": cluster.cluster_arn}},
+                )
+            )
+
+        start_fn.add_to_role_policy(
+            iam.PolicyStatement(actions=["ecs:DescribeTasks"], resources=[task_arns])
+        )
+        start_fn.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["dynamodb:Scan"],
+                resources=[f"arn:aws:dynamodb:{region}:{account}:table/{readiness_table}"],
+            )
+        )
+        stop_fn.add_to_role_policy(
+            iam.PolicyStatement(actions=["ecs:StopTask"], resources=[task_arns])
+        )
+
+        events.Rule(
+            self,
+            f"{service_name}-reaper-schedule",
+            schedule=events.Schedule.rate(Duration.minutes(REAPER_INTERVAL_MINUTES)),
+            targets=[events_targets.LambdaFunction(reaper_fn)],
+        )
+
+        # Both check the x-api-key header themselves
+        http_api = apigwv2.HttpApi(self, "BackendControlHttpApi", api_name=service_name)
+        http_api.add_routes(
+            path="/start",
+            # GET /start?mode=status reports readiness
+            methods=[apigwv2.HttpMethod.GET, apigwv2.HttpMethod.POST],
+            integration=integrations.HttpLambdaIntegration("StartIntegration", start_fn),
+        )
+        http_api.add_routes(
+            path="/stop",
+            methods=[apigwv2.HttpMethod.POST],
+            integration=integrations.HttpLambdaIntegration("StopIntegration", stop_fn),
+        )
+
+        CfnOutput(
+            self,
+            "BackendControlApiUrl",
+            value=http_api.api_endpoint,
+        )
@@ -1,5 +1,8 @@
 from aws_cdk import (
+    Duration,
     Stack,
+    aws_applicationautoscaling as appscaling,
+    aws_cloudwatch as cloudwatch,
     aws_ec2 as ec2,
     aws_ecs as ecs,
     aws_ecr as ecr,
@@ -15,6 +18,24 @@ from cdk_ecr_deployment import ECRDeployment, DockerImageName
 
 from constants import PROJECT_NAME
 
+# Step scaling on the consumer's iterator_age_seconds (Maximum over a minute,
+# across shards), as (lower, upper, change in tasks). Lag under 30s for
+# ITERATOR_AGE_EVALUATION_PERIODS minutes removes a task; between 30s and 120s
+# nothing changes.
+ITERATOR_AGE_STEPS = [
+    (None, 30, -1),
+    (120, 600, +1),
+    (600, None, +2),
+]
+ITERATOR_AGE_EVALUATION_PERIODS = 3
+SCALING_COOLDOWN_SECONDS = 300
+
+# Scale out on CPU alone when the processors are busy but not yet behind;
+# scale-in is left to the lag policy
+CPU_TARGET_PERCENT = 70
+
+TASK_PROTECTION_MINUTES = 30
+
 
 class ConsumerStack(Stack):
     def __init__(
@@ -26,6 +47,7 @@ class ConsumerStack(Stack):
         vpc: ec2.IVpc,
         kinesis_stream: kinesis.IStream,
         s3_bucket: s3.IBucket,
+        shard_count: int,
         **kwargs,
     ):
         super().__init__(scope, construct_id, **kwargs)
@@ -74,10 +96,19 @@ class ConsumerStack(Stack):
                 "S3_BUCKET": s3_bucket.bucket_name,
                 "APPLICATION_NAME": f"{service_name}-checkpoint",
                 "DEDUP_TTL_DAYS": "30",
+                # Leaves headroom under memory_limit_mib for the KCL JVM
+                "CONSUMER_MEMORY_BUDGET_MIB": "3072",
+                "TASK_PROTECTION_MINUTES": str(TASK_PROTECTION_MINUTES),
             },
         )
 
         s3_bucket.grant_put(task_def.task_role)
+        # Shard processors seed their latest-state table from their newest snapshot
+        s3_bucket.grant_read(task_def.task_role, "snapshot/*")
+        # ...and delete the ones a newer snapshot supersedes
+        s3_bucket.grant_delete(task_def.task_role, "snapshot/*")
+        # ...and restore the late-event watermark stored with their checkpoint
+        s3_bucket.grant_read(task_def.task_role, "watermark/*")
         kinesis_stream.grant_read(task_def.task_role)
 
         task_def.task_role.add_to_policy(
@@ -125,13 +156,26 @@ class ConsumerStack(Stack):
             )
         )
 
-        ecs.FargateService(
+        # Flushes turn on scale-in protection through the ECS agent endpoint
+        task_def.task_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "ecs:GetTaskProtection",
+                    "ecs:UpdateTaskProtection",
+                ],
+                resources=[
+                    f"arn:aws:ecs:{region}:{account}:task/{cluster.cluster_name}/*"
+                ],
+            )
+        )
+
+        # desired_count is left to autoscaling
+        service = ecs.FargateService(
             self,
             "ConsumerService",
             service_name=service_name,
             cluster=cluster,
             task_definition=task_def,
-            desired_count=2,
             min_healthy_percent=0,
             max_healthy_percent=100,
             vpc_subnets=ec2.SubnetSelection(
@@ -140,3 +184,40 @@ class ConsumerStack(Stack):
             assign_public_ip=False,
             propagate_tags=ecs.PropagatedTagSource.SERVICE,
         )
+        self.service = service
+
+        # KCL leases each shard to one worker, so tasks beyond the shard count
+        # would sit idle. These are only the initial bounds: kinesis_resharder
+        # owns MaxCapacity and keeps it at the open shard count, and the backend
+        # control Lambdas lower MinCapacity to 0 when they stop the service and
+        # raise it back to 1 when they start it.
+        scaling = service.auto_scale_task_count(
+            min_capacity=1,
+            max_capacity=shard_count,
+        )
+
+        iterator_age = cloudwatch.Metric(
+            namespace="IoTIngestionPipeline",
+            metric_name="iterator_age_seconds",
+            dimensions_map={"Service": "consumer"},
+            statistic=cloudwatch.Stats.MAXIMUM,
+            period=Duration.minutes(1),
+        )
+        scaling.scale_on_metric(
+            "IteratorAgeScaling",
+            metric=iterator_age,
+            scaling_steps=[
+                appscaling.ScalingInterval(lower=lower, upper=upper, change=change)
+                for lower, upper, change in ITERATOR_AGE_STEPS
+            ],
+            adjustment_type=appscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+            evaluation_periods=ITERATOR_AGE_EVALUATION_PERIODS,
+            cooldown=Duration.seconds(SCALING_COOLDOWN_SECONDS),
+        )
+
+        scaling.scale_on_cpu_utilization(
+            "CpuScaling",
+            target_utilization_percent=CPU_TARGET_PERCENT,
+            disable_scale_in=True,
+            scale_out_cooldown=Duration.seconds(SCALING_COOLDOWN_SECONDS),
+        )
@@ -4,7 +4,12 @@ from aws_cdk import (
     aws_ec2 as ec2,
     aws_ecs as ecs,
     aws_ecr as ecr,
+    aws_events as events,
+    aws_events_targets as events_targets,
+    aws_iam as iam,
     aws_kinesis as kinesis,
+    aws_lambda as _lambda,
+    aws_logs as logs,
     aws_s3 as s3,
     RemovalPolicy,
 )
@@ -16,6 +21,9 @@ class InfrastructureStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
+        # Initial shard count; kinesis_resharder changes it from there, and
+        # consumer autoscaling bounds follow it
+        self.shard_count = 2
         self.vpc = ec2.Vpc(
             self,
             f"{PROJECT_NAME}-vpc",
@@ -46,7 +54,7 @@ class InfrastructureStack(Stack):
             self,
             f"{PROJECT_NAME}-event-stream",
             stream_name=f"{PROJECT_NAME}-event-stream",
-            shard_count=2,
+            shard_count=self.shard_count,
             retention_period=Duration.hours(24),
         )
         self.s3_data_bucket = s3.Bucket(
@@ -65,3 +73,60 @@ class InfrastructureStack(Stack):
             prefix="raw/",
             expiration=Duration.days(90),
         )
+        # The consumer deletes superseded snapshots; on a versioned bucket that
+        # only hides them, so expire the noncurrent versions and delete markers
+        self.s3_data_bucket.add_lifecycle_rule(
+            id="expire-superseded-snapshots",
+            prefix="snapshot/",
+            noncurrent_version_expiration=Duration.days(1),
+            expired_object_delete_marker=True,
+        )
+
+        resharder_fn = _lambda.Function(
+            self,
+            f"{PROJECT_NAME}-kinesis-resharder-fn",
+            function_name=f"{PROJECT_NAME}-kinesis-resharder-fn",
+            runtime=_lambda.Runtime.PYTHON_3_13,
+            handler="index.lambda_handler",
+            code=_lambda.Code.from_asset("lambdas/kinesis_resharder"),
+            architecture=_lambda.Architecture.ARM_64,
+            timeout=Duration.seconds(30),
+            environment={
+                "STREAM_NAME": self.kinesis_stream.stream_name,
+                "MIN_SHARDS": "1",
+                "MAX_SHARDS": "16",
+                "CONSUMER_SCALING_RESOURCE_ID": f"service/{PROJECT_NAME}/{PROJECT_NAME}-consumer",
+            },
+            log_retention=logs.RetentionDays.TWO_WEEKS,
+        )
+
+        resharder_fn.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "kinesis:DescribeStreamSummary",
+                    "kinesis:UpdateShardCount",
+                    "kinesis:ListTagsForStream",
+                    "kinesis:AddTagsToStream",
+                ],
+                resources=[self.kinesis_stream.stream_arn],
+            )
+        )
+        resharder_fn.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "cloudwatch:GetMetricData",
+                    "application-autoscaling:RegisterScalableTarget",
+                    "application-autoscaling:DescribeScalableTargets",
+                    "ecs:DescribeServices",
+                    "ecs:UpdateService",
+                ],
+                resources=["*"],
+            )
+        )
+
+        events.Rule(
+            self,
+            f"{PROJECT_NAME}-kinesis-resharder-schedule",
+            schedule=events.Schedule.rate(Duration.minutes(5)),
+            targets=[events_targets.LambdaFunction(resharder_fn)],
+        )
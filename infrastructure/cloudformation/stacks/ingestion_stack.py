@@ -50,6 +50,7 @@ class IngestionStack(Stack):
             timeout=Duration.seconds(30),
         )
 
+        self.api_key_secret = api_key_secret
         api_key_secret.grant_read(rotation_fn)
         api_key_secret.grant_write(rotation_fn)
 
@@ -72,17 +73,31 @@ class IngestionStack(Stack):
             region=self.region,
         )
 
+        # Modules shared with the backend control Lambdas (api_keys, activity)
+        shared_layer = _lambda.LayerVersion(
+            self,
+            f"{service_name}-shared-layer",
+            code=_lambda.Code.from_asset("lambdas/shared", exclude=["**/__pycache__"]),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
+        )
+        self.shared_layer = shared_layer
+
         ingestion_lambda = _lambda.Function(
             self,
             "IngestionLambda",
             function_name=f"{service_name}-fn",
             runtime=_lambda.Runtime.PYTHON_3_13,
             handler="app.lambda_handler",
-            code=_lambda.Code.from_asset("../../services/ingestion_lambda"),
+            code=_lambda.Code.from_asset("../../services/ingestion_lambda", exclude=["bench"]),
+            layers=[shared_layer],
             timeout=Duration.seconds(10),
             environment={
                 "KINESIS_STREAM": kinesis_stream.stream_name,
                 "API_KEY_SECRET_ARN": api_key_secret.secret_arn,
+                # Salting (auto/salted) spreads an entity over shards; the
+                # consumer does not reorder by the ordering tag yet
+                "PARTITION_STRATEGY": "entity",
+                "ENVELOPE_FORMAT": "json",
             },
             log_retention=logs.RetentionDays.TWO_WEEKS,
         )
@@ -0,0 +1,104 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "lambdas", "shared", "python"))
+
+import activity  # noqa: E402
+
+PERIOD = activity.PERIOD_SECONDS
+NOW = 1772409600 + 30
+
+QUERIES = {
+    "requests": ("AWS/ApplicationELB", "RequestCount", "LoadBalancer", "app/lb/1", "Sum"),
+    "incoming_records": ("AWS/Kinesis", "IncomingRecords", "StreamName", "stream", "Sum"),
+    "iterator_age": ("IoTIngestionPipeline", "iterator_age_seconds", "Service", "consumer", "Maximum"),
+}
+
+
+class FakeCloudWatch:
+    """Serves {id: {period start: value}}; records the requested ranges."""
+
+    def __init__(self, series):
+        self.series = series
+        self.calls = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, **kwargs):
+        start, end = int(StartTime.timestamp()), int(EndTime.timestamp())
+        self.calls.append((start, end, len(MetricDataQueries)))
+        results = []
+        for query in MetricDataQueries:
+            points = sorted((t, v) for t, v in self.series.get(query["Id"], {}).items() if start <= t < end)
+            results.append(
+                {
+                    "Id": query["Id"],
+                    "Timestamps": [datetime.fromtimestamp(t, timezone.utc) for t, _ in points],
+                    "Values": [v for _, v in points],
+                }
+            )
+        return {"MetricDataResults": results}
+
+
+def test_one_call_for_all_metrics_then_only_new_periods():
+    cw = FakeCloudWatch({})
+    monitor = activity.ActivityMonitor(cw, QUERIES, window_seconds=3 * 3600)
+
+    monitor.evaluate(NOW)
+    monitor.evaluate(NOW + 60)
+    monitor.evaluate(NOW + 3 * PERIOD)
+
+    end = NOW // PERIOD * PERIOD
+    assert cw.calls == [
+        (end - 3 * 3600, end, 3),
+        # The last fetched period again, then the three that completed since
+        (end - PERIOD, end + 3 * PERIOD, 3),
+    ]
+
+
+def test_idle_and_drained():
+    end = NOW // PERIOD * PERIOD
+    cw = FakeCloudWatch({"iterator_age": {end - PERIOD: 12.0, end - 2 * PERIOD: 400.0}})
+    summary = activity.ActivityMonitor(cw, QUERIES, window_seconds=3600).evaluate(NOW)
+    assert summary["requests"] == 0 and summary["incoming_records"] == 0
+    assert summary["iterator_age_seconds"] == 12.0
+    assert summary["idle"] and summary["drained"]
+
+
+def test_ingestion_or_backlog_keeps_it_busy():
+    end = NOW // PERIOD * PERIOD
+    cw = FakeCloudWatch({"incoming_records": {end - 4 * PERIOD: 50.0}, "iterator_age": {end - PERIOD: 5.0}})
+    assert not activity.ActivityMonitor(cw, QUERIES, window_seconds=3600).evaluate(NOW)["idle"]
+
+    cw = FakeCloudWatch({"iterator_age": {end - PERIOD: 900.0}})
+    assert not activity.ActivityMonitor(cw, QUERIES, window_seconds=3600).evaluate(NOW)["drained"]
+
+    # Records still coming in and no recent lag datapoint: backlog unknown
+    cw = FakeCloudWatch({"incoming_records": {end - PERIOD: 50.0}, "iterator_age": {end - 6 * PERIOD: 5.0}})
+    assert not activity.ActivityMonitor(cw, QUERIES, window_seconds=3600).evaluate(NOW)["drained"]
+
+
+def test_idle_stream_keeps_its_last_lag():
+    end = NOW // PERIOD * PERIOD
+    # The consumer stopped reporting a while ago, and nothing has come in since
+    cw = FakeCloudWatch({"iterator_age": {end - 6 * PERIOD: 5.0}})
+    summary = activity.ActivityMonitor(cw, QUERIES, window_seconds=3600).evaluate(NOW)
+    assert summary["idle"] and summary["drained"]
+
+    cw = FakeCloudWatch({"iterator_age": {end - 6 * PERIOD: 900.0}})
+    assert not activity.ActivityMonitor(cw, QUERIES, window_seconds=3600).evaluate(NOW)["drained"]
+
+    # No lag datapoint at all: still unknown
+    assert not activity.ActivityMonitor(FakeCloudWatch({}), QUERIES, window_seconds=3600).evaluate(NOW)["drained"]
+
+
+def test_activity_ages_out_of_the_window():
+    end = NOW // PERIOD * PERIOD
+    cw = FakeCloudWatch({"incoming_records": {end - PERIOD: 50.0}, "iterator_age": {end - PERIOD: 5.0}})
+    monitor = activity.ActivityMonitor(cw, QUERIES, window_seconds=3600)
+    assert not monitor.evaluate(NOW)["idle"]
+
+    cw.series["iterator_age"][end + 12 * PERIOD] = 3.0
+    later = monitor.evaluate(NOW + 13 * PERIOD)
+    assert later["incoming_records"] == 0
+    assert later["idle"] and later["drained"]
@@ -0,0 +1,136 @@
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "lambdas", "shared", "python"))
+
+import api_keys  # noqa: E402
+from api_keys import ApiKeyValidator  # noqa: E402
+
+TTL = 300
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RotatingSecretsManager:
+    """
+    Versions and staging labels of one secret, moved through the same steps
+    as lambdas/secret_rotation: createSecret adds an AWSPENDING version,
+    finishSecret moves AWSCURRENT onto it.
+    """
+
+    def __init__(self, key):
+        self.versions = {"v1": key}
+        self.stages = {"AWSCURRENT": "v1"}
+        self.calls = 0
+        self.down = False
+
+    def get_secret_value(self, SecretId, VersionStage="AWSCURRENT"):
+        self.calls += 1
+        if self.down:
+            raise ClientError({"Error": {"Code": "InternalServiceError"}}, "GetSecretValue")
+        if VersionStage not in self.stages:
+            raise ClientError({"Error": {"Code": "ResourceNotFoundException"}}, "GetSecretValue")
+        return {"SecretString": self.versions[self.stages[VersionStage]]}
+
+    def create_secret(self, version, key):
+        self.versions[version] = key
+        self.stages["AWSPENDING"] = version
+
+    def finish_secret(self, version):
+        self.stages["AWSPREVIOUS"] = self.stages["AWSCURRENT"]
+        self.stages["AWSCURRENT"] = version
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def sm():
+    return RotatingSecretsManager("old-key")
+
+
+@pytest.fixture
+def validator(sm, clock):
+    return ApiKeyValidator("arn:secret", client=sm, ttl_seconds=TTL, clock=clock)
+
+
+def test_warm_calls_skip_secrets_manager(validator, sm, clock):
+    assert validator.validate("old-key")
+    calls = sm.calls
+    for _ in range(100):
+        clock.now += 1
+        assert validator.validate("old-key")
+    assert sm.calls == calls
+
+
+def test_rejects_missing_and_wrong_keys(validator):
+    assert not validator.validate(None)
+    assert not validator.validate("")
+    assert not validator.validate("old-ke")
+    assert not validator.validate("old-key ")
+
+
+def test_unknown_keys_refresh_at_most_every_min_refresh_seconds(validator, sm, clock):
+    validator.validate("old-key")
+    calls = sm.calls
+    for _ in range(50):
+        clock.now += 1
+        assert not validator.validate("guess")
+    # One early refresh in 50 seconds of bad keys
+    assert sm.calls - calls == len(api_keys.STAGES)
+
+
+def test_rotation_mid_run(validator, sm, clock):
+    assert validator.validate("old-key")
+
+    # createSecret: a client that already has the pending key is accepted
+    # on its first attempt after the rate limit, not after the TTL
+    sm.create_secret("v2", "new-key")
+    clock.now += api_keys.MIN_REFRESH_SECONDS
+    assert validator.validate("new-key")
+    assert validator.validate("old-key")
+
+    # finishSecret: the old key is dropped at the next refresh
+    sm.finish_secret("v2")
+    assert validator.validate("old-key")
+    clock.now += TTL
+    assert validator.validate("new-key")
+    assert not validator.validate("old-key")
+
+
+def test_rotation_finished_while_cached(validator, sm, clock):
+    assert validator.validate("old-key")
+    sm.create_secret("v2", "new-key")
+    sm.finish_secret("v2")
+    del sm.stages["AWSPENDING"]
+
+    clock.now += 1
+    assert not validator.validate("new-key")
+    clock.now += api_keys.MIN_REFRESH_SECONDS
+    assert validator.validate("new-key")
+
+
+def test_keeps_cached_keys_when_secrets_manager_fails(validator, sm, clock):
+    assert validator.validate("old-key")
+    sm.down = True
+    clock.now += TTL
+    assert validator.validate("old-key")
+    assert not validator.validate("other")
+
+
+def test_cold_start_failure_raises(validator, sm):
+    sm.down = True
+    with pytest.raises(ClientError):
+        validator.validate("old-key")
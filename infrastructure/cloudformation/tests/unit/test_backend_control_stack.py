@@ -0,0 +1,104 @@
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+from aws_cdk import (
+    Duration,
+    Stack,
+    aws_ec2 as ec2,
+    aws_ecs as ecs,
+    aws_kinesis as kinesis,
+    aws_lambda as _lambda,
+    aws_secretsmanager as secretsmanager,
+)
+
+from stacks.backend_control_stack import BackendControlStack
+
+ENV = core.Environment(account="123456789012", region="us-east-1")
+
+
+@pytest.fixture(scope="module")
+def template():
+    app = core.App()
+    deps = Stack(app, "deps", env=ENV)
+    vpc = ec2.Vpc(deps, "vpc", max_azs=2)
+    cluster = ecs.Cluster(deps, "cluster", vpc=vpc)
+    task_def = ecs.FargateTaskDefinition(deps, "task")
+    task_def.add_container("container", image=ecs.ContainerImage.from_registry("consumer"))
+    stack = BackendControlStack(
+        app,
+        "backend-control",
+        cluster=cluster,
+        service=ecs.FargateService(deps, "service", cluster=cluster, task_definition=task_def),
+        kinesis_stream=kinesis.Stream(deps, "stream", shard_count=2, retention_period=Duration.hours(24)),
+        api_key_secret=secretsmanager.Secret(deps, "secret"),
+        shared_layer=_lambda.LayerVersion(deps, "layer", code=_lambda.Code.from_asset("lambdas/shared")),
+        env=ENV,
+    )
+    return assertions.Template.from_stack(stack)
+
+
+def functions(template):
+    return {
+        props["FunctionName"].rsplit("-", 2)[-2]: props
+        for props in (f["Properties"] for f in template.find_resources("AWS::Lambda::Function").values())
+        if "FunctionName" in props
+    }
+
+
+def actions(template, function_props):
+    """Actions allowed to the function's role."""
+    role = function_props["Role"]["Fn::GetAtt"][0]
+    allowed = set()
+    for policy in template.find_resources("AWS::IAM::Policy").values():
+        if {"Ref": role} not in policy["Properties"]["Roles"]:
+            continue
+        for statement in policy["Properties"]["PolicyDocument"]["Statement"]:
+            action = statement["Action"]
+            allowed.update([action] if isinstance(action, str) else action)
+    return allowed
+
+
+def test_handlers_get_the_shared_layer_and_their_environment(template):
+    fns = functions(template)
+    assert set(fns) == {"ecs_reaper", "start_backend", "stop_backend"}
+    for props in fns.values():
+        assert len(props["Layers"]) == 1
+        assert {"CLUSTER_ARN", "SERVICE_ARN", "STREAM_NAME", "SCALING_RESOURCE_ID"} <= set(
+            props["Environment"]["Variables"]
+        )
+    assert {"API_KEY_SECRET_ARN", "READINESS_TABLE"} <= set(fns["start_backend"]["Environment"]["Variables"])
+    assert "API_KEY_SECRET_ARN" in fns["stop_backend"]["Environment"]["Variables"]
+
+
+def test_handlers_are_allowed_what_they_call(template):
+    fns = functions(template)
+    assert {
+        "cloudwatch:GetMetricData",
+        "ecs:DescribeServices",
+        "ecs:UpdateService",
+        "application-autoscaling:RegisterScalableTarget",
+    } <= actions(template, fns["ecs_reaper"])
+    assert {
+        "cloudwatch:GetMetricData",
+        "secretsmanager:GetSecretValue",
+        "dynamodb:Scan",
+        "ecs:DescribeServices",
+        "ecs:ListTasks",
+        "ecs:DescribeTasks",
+        "ecs:UpdateService",
+        "application-autoscaling:RegisterScalableTarget",
+    } <= actions(template, fns["start_backend"])
+    assert {
+        "cloudwatch:GetMetricData",
+        "secretsmanager:GetSecretValue",
+        "ecs:ListTasks",
+        "ecs:StopTask",
+        "ecs:UpdateService",
+        "application-autoscaling:RegisterScalableTarget",
+    } <= actions(template, fns["stop_backend"])
+
+
+def test_reaper_runs_on_a_schedule_and_the_api_routes_start_and_stop(template):
+    template.has_resource_properties("AWS::Events::Rule", {"ScheduleExpression": "rate(15 minutes)"})
+    routes = {r["Properties"]["RouteKey"] for r in template.find_resources("AWS::ApiGatewayV2::Route").values()}
+    assert routes == {"GET /start", "POST /start", "POST /stop"}
@@ -0,0 +1,166 @@
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+from aws_cdk import (
+    Duration,
+    Stack,
+    aws_ec2 as ec2,
+    aws_ecs as ecs,
+    aws_ecr as ecr,
+    aws_kinesis as kinesis,
+    aws_s3 as s3,
+)
+
+from stacks.consumer_stack import ConsumerStack, ITERATOR_AGE_EVALUATION_PERIODS
+
+ENV = core.Environment(account="123456789012", region="us-east-1")
+
+
+def synth(shard_count=4):
+    app = core.App()
+    deps = Stack(app, "deps", env=ENV)
+    vpc = ec2.Vpc(deps, "vpc", max_azs=2)
+    stack = ConsumerStack(
+        app,
+        "consumer",
+        repository=ecr.Repository(deps, "repository"),
+        cluster=ecs.Cluster(deps, "cluster", vpc=vpc),
+        vpc=vpc,
+        kinesis_stream=kinesis.Stream(deps, "stream", shard_count=shard_count, retention_period=Duration.hours(24)),
+        s3_bucket=s3.Bucket(deps, "bucket"),
+        shard_count=shard_count,
+        env=ENV,
+    )
+    return assertions.Template.from_stack(stack)
+
+
+@pytest.fixture(scope="module")
+def template():
+    return synth()
+
+
+def step_policies(template):
+    policies = template.find_resources(
+        "AWS::ApplicationAutoScaling::ScalingPolicy",
+        {"Properties": {"PolicyType": "StepScaling"}},
+    )
+    return [policy["Properties"]["StepScalingPolicyConfiguration"] for policy in policies.values()]
+
+
+def test_task_count_bounded_by_shard_count(template):
+    template.resource_count_is("AWS::ApplicationAutoScaling::ScalableTarget", 1)
+    template.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalableTarget",
+        {"MinCapacity": 1, "MaxCapacity": 4, "ScalableDimension": "ecs:service:DesiredCount"},
+    )
+
+
+def test_max_capacity_follows_shard_count():
+    synth(shard_count=8).has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalableTarget",
+        {"MinCapacity": 1, "MaxCapacity": 8},
+    )
+
+
+def test_service_leaves_desired_count_to_autoscaling(template):
+    service = next(iter(template.find_resources("AWS::ECS::Service").values()))
+    assert "DesiredCount" not in service["Properties"]
+
+
+def test_iterator_age_step_scaling(template):
+    configs = step_policies(template)
+    assert len(configs) == 2
+
+    scale_out = next(c for c in configs if c["StepAdjustments"][0]["ScalingAdjustment"] > 0)
+    assert scale_out["AdjustmentType"] == "ChangeInCapacity"
+    assert scale_out["MetricAggregationType"] == "Maximum"
+    assert [(s.get("MetricIntervalLowerBound"), s.get("MetricIntervalUpperBound"), s["ScalingAdjustment"])
+            for s in scale_out["StepAdjustments"]] == [(0, 480, 1), (480, None, 2)]
+
+    scale_in = next(c for c in configs if c["StepAdjustments"][0]["ScalingAdjustment"] < 0)
+    assert scale_in["StepAdjustments"] == [{"MetricIntervalUpperBound": 0, "ScalingAdjustment": -1}]
+
+
+def test_iterator_age_alarms(template):
+    alarms = template.find_resources(
+        "AWS::CloudWatch::Alarm",
+        {"Properties": {"MetricName": "iterator_age_seconds"}},
+    )
+    thresholds = {}
+    for alarm in alarms.values():
+        props = alarm["Properties"]
+        assert props["Namespace"] == "IoTIngestionPipeline"
+        assert props["Dimensions"] == [{"Name": "Service", "Value": "consumer"}]
+        assert props["Statistic"] == "Maximum"
+        assert props["Period"] == 60
+        assert props["EvaluationPeriods"] == ITERATOR_AGE_EVALUATION_PERIODS
+        thresholds[props["ComparisonOperator"]] = props["Threshold"]
+    assert thresholds == {"LessThanOrEqualToThreshold": 30, "GreaterThanOrEqualToThreshold": 120}
+
+
+def test_cpu_target_tracking_never_scales_in(template):
+    template.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalingPolicy",
+        {
+            "PolicyType": "TargetTrackingScaling",
+            "TargetTrackingScalingPolicyConfiguration": assertions.Match.object_like(
+                {
+                    "PredefinedMetricSpecification": {"PredefinedMetricType": "ECSServiceAverageCPUUtilization"},
+                    "DisableScaleIn": True,
+                }
+            ),
+        },
+    )
+
+
+def test_task_role_can_protect_itself_from_scale_in(template):
+    template.has_resource_properties(
+        "AWS::IAM::Policy",
+        {
+            "PolicyDocument": {
+                "Statement": assertions.Match.array_with(
+                    [
+                        assertions.Match.object_like(
+                            {"Action": ["ecs:GetTaskProtection", "ecs:UpdateTaskProtection"], "Effect": "Allow"}
+                        )
+                    ]
+                )
+            }
+        },
+    )
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "ContainerDefinitions": [
+                assertions.Match.object_like(
+                    {
+                        "Environment": assertions.Match.array_with(
+                            [{"Name": "TASK_PROTECTION_MINUTES", "Value": "30"}]
+                        )
+                    }
+                )
+            ]
+        },
+    )
+
+
+def s3_prefixes(template, action):
+    """Object prefixes of the bucket statements that allow `action`."""
+    prefixes = set()
+    for policy in template.find_resources("AWS::IAM::Policy").values():
+        for statement in policy["Properties"]["PolicyDocument"]["Statement"]:
+            if action not in statement["Action"]:
+                continue
+            resources = statement["Resource"]
+            for resource in resources if isinstance(resources, list) else [resources]:
+                if "Fn::Join" in resource:
+                    prefixes.add(resource["Fn::Join"][1][-1])
+    return prefixes
+
+
+def test_task_role_can_read_snapshots_and_watermarks(template):
+    assert {"/snapshot/*", "/watermark/*"} <= s3_prefixes(template, "s3:GetObject*")
+
+
+def test_task_role_can_prune_snapshots_only(template):
+    assert s3_prefixes(template, "s3:DeleteObject*") == {"/snapshot/*"}
@@ -0,0 +1,163 @@
+import os
+import sys
+import csv
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "lambdas", "kinesis_resharder"))
+
+import decision  # noqa: E402
+
+TRACE = os.path.join(HERE, "traces", "kinesis_resharder_trace.csv")
+DAY = 24 * 3600
+NOW = 1772409600
+
+# Records per minute at a given utilization of one shard (bytes stay under the limit)
+RECORDS_PER_SHARD_MINUTE = decision.SHARD_RECORDS_PER_SECOND * decision.PERIOD_SECONDS
+
+
+def minutes(utilizations, shards=2, failed_ratio=0.0, end=NOW):
+    """Per-minute samples ending at `end`, one per utilization."""
+    samples = []
+    start = end - len(utilizations) * decision.PERIOD_SECONDS
+    for i, u in enumerate(utilizations):
+        records = int(u * shards * RECORDS_PER_SHARD_MINUTE)
+        failed = int(records * failed_ratio)
+        samples.append(
+            {
+                "timestamp": start + i * decision.PERIOD_SECONDS,
+                "incoming_bytes": records * 200,
+                "incoming_records": records,
+                "events_ingested": records - failed,
+                "failed_records": failed,
+            }
+        )
+    return samples
+
+
+@pytest.fixture(scope="module")
+def trace():
+    """Three days of per-minute stream and ingestion metrics: a quiet day, a
+    day of growth, a day with a three-minute spike and a hot-key episode."""
+    with open(TRACE) as f:
+        return [{key: int(value) for key, value in row.items()} for row in csv.DictReader(f)]
+
+
+def test_sustained_load_scales_out_to_target_utilization():
+    result = decision.decide(minutes([0.2] * 55 + [0.9] * 5), shards=2, now=NOW)
+    assert result["action"] == "scale_out"
+    # 1.8 shards of demand at 50% utilization
+    assert result["target"] == 4
+
+
+def test_short_spike_does_not_scale_out():
+    result = decision.decide(minutes([0.4] * 57 + [0.95] * 3), shards=2, now=NOW)
+    assert result["action"] == "none"
+
+
+def test_failures_scale_out_at_low_utilization():
+    result = decision.decide(minutes([0.4] * 60, failed_ratio=0.03), shards=2, now=NOW)
+    assert result == {**result, "action": "scale_out", "target": 3}
+
+
+def test_scale_out_at_most_doubles_and_respects_max_shards():
+    assert decision.decide(minutes([3.0] * 5), shards=2, now=NOW)["target"] == 4
+    assert decision.decide(minutes([3.0] * 5), shards=2, now=NOW, max_shards=3)["target"] == 3
+    assert decision.decide(minutes([3.0] * 5), shards=3, now=NOW, max_shards=3)["action"] == "none"
+
+
+def test_between_thresholds_is_left_alone():
+    result = decision.decide(minutes([0.5] * 60), shards=2, now=NOW)
+    assert result["action"] == "none"
+    assert result["reason"] == "within the band"
+
+
+def test_scale_in_needs_a_full_quiet_window():
+    assert decision.decide(minutes([0.1] * 59, shards=4), shards=4, now=NOW)["action"] == "none"
+    assert decision.decide(minutes([0.1] * 30 + [0.35] + [0.1] * 29, shards=4), shards=4, now=NOW)["action"] == "none"
+
+    result = decision.decide(minutes([0.1] * 60, shards=4), shards=4, now=NOW)
+    assert result["action"] == "scale_in"
+    # Halving is the most UpdateShardCount allows
+    assert result["target"] == 2
+
+
+def test_scale_in_lands_inside_the_band():
+    samples = minutes([0.28] * 60, shards=4)
+    result = decision.decide(samples, shards=4, now=NOW)
+    assert result["action"] == "scale_in"
+    peak = max(decision.utilization(s, result["target"]) for s in samples)
+    assert decision.SCALE_IN_UTILIZATION < peak < decision.SCALE_OUT_UTILIZATION
+
+
+def test_scale_in_respects_min_shards():
+    assert decision.decide(minutes([0.05] * 60, shards=1), shards=1, now=NOW)["action"] == "none"
+    assert decision.decide(minutes([0.05] * 60, shards=4), shards=4, now=NOW, min_shards=4)["action"] == "none"
+
+
+def test_cooldowns():
+    hot = minutes([0.9] * 5)
+    assert decision.decide(hot, shards=2, now=NOW, changes=[NOW - 600])["action"] == "none"
+    assert decision.decide(hot, shards=2, now=NOW, changes=[NOW - 1200])["action"] == "scale_out"
+
+    quiet = minutes([0.1] * 60, shards=4)
+    assert decision.decide(quiet, shards=4, now=NOW, changes=[NOW - 3 * 3600])["action"] == "none"
+    assert decision.decide(quiet, shards=4, now=NOW, changes=[NOW - 7 * 3600])["action"] == "scale_in"
+
+
+def test_daily_quota():
+    changes = [NOW - DAY + 3600 + i * 600 for i in range(decision.MAX_CHANGES_PER_DAY)]
+    assert decision.decide(minutes([0.9] * 5), shards=2, now=NOW, changes=changes)["action"] == "none"
+
+    # Scale-in keeps a reserve for scaling back out
+    changes = [NOW - DAY + 3600 + i * 600 for i in range(decision.MAX_CHANGES_PER_DAY - decision.SCALE_OUT_RESERVE)]
+    quiet = minutes([0.1] * 60, shards=4)
+    assert decision.decide(quiet, shards=4, now=NOW, changes=changes)["action"] == "none"
+    assert decision.decide(minutes([0.9] * 5), shards=2, now=NOW, changes=changes)["action"] == "scale_out"
+
+
+def test_missing_datapoints_count_as_zero():
+    samples = [{"timestamp": NOW - (60 - i) * 60} for i in range(60)]
+    assert decision.decide(samples, shards=2, now=NOW)["action"] == "scale_in"
+
+
+def test_trace_follows_the_load(trace):
+    actions = decision.replay(trace, shards=2)
+    day = [a["timestamp"] // DAY - trace[0]["timestamp"] // DAY for a in actions]
+
+    # The day of growth ends at 4 shards
+    assert max(a["target"] for a, d in zip(actions, day) if d == 1) == 4
+    # The three-minute spike on day 3 at 14:00 does not reshard
+    spike = trace[0]["timestamp"] + 2 * DAY + 14 * 3600
+    assert not [a for a in actions if spike <= a["timestamp"] < spike + 15 * 60]
+    # The hot-key episode on day 3 at 09:00 does
+    hot_key = trace[0]["timestamp"] + 2 * DAY + 9 * 3600
+    assert [a for a in actions if hot_key <= a["timestamp"] < hot_key + 30 * 60 and a["action"] == "scale_out"]
+
+
+def test_trace_respects_cooldowns_and_quota(trace):
+    actions = decision.replay(trace, shards=2, min_shards=1, max_shards=8)
+    assert actions
+
+    for previous, action in zip(actions, actions[1:]):
+        gap = action["timestamp"] - previous["timestamp"]
+        if action["action"] == "scale_in":
+            assert gap >= decision.SCALE_IN_COOLDOWN_SECONDS
+        else:
+            assert gap >= decision.SCALE_OUT_COOLDOWN_SECONDS
+        assert previous["target"] == action["shards"]
+
+    for action in actions:
+        window = [a for a in actions if action["timestamp"] - DAY < a["timestamp"] <= action["timestamp"]]
+        assert len(window) <= decision.MAX_CHANGES_PER_DAY
+        assert 1 <= action["target"] <= 8
+        assert action["shards"] / 2 <= action["target"] <= action["shards"] * 2
+
+
+def test_trace_does_not_flap(trace):
+    actions = decision.replay(trace, shards=2)
+    for previous, action in zip(actions, actions[1:]):
+        if previous["action"] != action["action"]:
+            # A reversal is never within an hour of the change it reverses
+            assert action["timestamp"] - previous["timestamp"] >= 3600
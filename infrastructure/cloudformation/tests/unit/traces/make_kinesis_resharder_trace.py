@@ -0,0 +1,69 @@
+"""
+Generates kinesis_resharder_trace.csv, the synthetic metric trace the
+resharding controller tests replay.
+
+Three days of per-minute stream and ingestion metrics, starting 2026-03-02
+00:00 UTC, shaped like the pipeline's daily load: quiet nights and a daytime
+hump from 06:00 to 22:00, with 4% noise.
+
+- Day 1: quiet, 250-900 records/s.
+- Day 2: growth, 400-1900 records/s.
+- Day 3: like day 1, plus a three-minute spike to 3500 records/s at 14:00
+  and a hot-key episode at 09:00 (25 minutes with 2.5-4% of records failing
+  at normal load).
+
+Records average 1100 bytes. The output is deterministic for a given seed:
+
+    python tests/unit/traces/make_kinesis_resharder_trace.py
+"""
+
+import os
+import csv
+import math
+import random
+import calendar
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OUTPUT = os.path.join(HERE, "kinesis_resharder_trace.csv")
+
+START = calendar.timegm((2026, 3, 2, 0, 0, 0))
+DAYS = 3
+# (night records/s, daytime hump records/s) per day
+DAY_LOAD = [(250, 650), (400, 1500), (260, 680)]
+SPIKE = (2, 14 * 60, 3, 3500)  # day, start minute, minutes, records/s
+HOT_KEY = (2, 9 * 60, 25, 0.025, 0.04)  # day, start minute, minutes, failed ratio range
+RECORD_BYTES = 1100
+
+
+def rows(seed=7):
+    rng = random.Random(seed)
+    for m in range(DAYS * 1440):
+        day, minute = divmod(m, 1440)
+        hour = minute / 60
+        base, amp = DAY_LOAD[day]
+        shape = max(0.0, math.sin(math.pi * (hour - 6) / 16)) if 6 <= hour <= 22 else 0.0
+        rate = (base + amp * shape) * rng.gauss(1.0, 0.04)
+
+        spike_day, spike_start, spike_minutes, spike_rate = SPIKE
+        if day == spike_day and spike_start <= minute < spike_start + spike_minutes:
+            rate = spike_rate * rng.gauss(1.0, 0.03)
+        records = int(rate * 60)
+
+        failed = 0
+        hot_day, hot_start, hot_minutes, low, high = HOT_KEY
+        if day == hot_day and hot_start <= minute < hot_start + hot_minutes:
+            failed = int(records * rng.uniform(low, high))
+
+        incoming_bytes = int(records * rng.gauss(RECORD_BYTES, 15))
+        yield START + m * 60, incoming_bytes, records, records - failed, failed
+
+
+def main():
+    with open(OUTPUT, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "incoming_bytes", "incoming_records", "events_ingested", "failed_records"])
+        writer.writerows(rows())
+
+
+if __name__ == "__main__":
+    main()
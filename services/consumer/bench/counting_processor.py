@@ -0,0 +1,30 @@
+"""
+RecordProcessor wrapper used by the consumer benchmarks.
+
+Appends "<unix time> <records>" to $BENCH_PROGRESS_FILE after every
+process_records call so the driver can follow progress in either runtime.
+Run as a script it is the KCL MultiLangDaemon executable.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from record_processor import RecordProcessor  # noqa: E402
+
+PROGRESS_FILE = os.environ["BENCH_PROGRESS_FILE"]
+
+
+class CountingRecordProcessor(RecordProcessor):
+    def process_records(self, process_records_input):
+        super().process_records(process_records_input)
+        with open(PROGRESS_FILE, "a") as f:
+            f.write(f"{time.time()} {len(process_records_input.records)}\n")
+
+
+if __name__ == "__main__":
+    from amazon_kclpy import kcl
+
+    kcl.KCLProcess(CountingRecordProcessor()).run()
@@ -0,0 +1,67 @@
+"""
+Decode pool speedup benchmark.
+
+Pushes the synthetic benchmark inputs through the same path RecordProcessor uses
+(JSON decode -> Arrow -> Snappy Parquet spill) inline and with DecodePool at
+several worker counts, and reports records/s and speedup over inline.
+
+Usage:
+    python bench/decode_pool_speedup.py --records 200000 --batch 10000 --workers 1,2,4
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("S3_BUCKET", "bench")
+
+from events import make_payloads  # noqa: E402
+from aws_utils import ParquetSpiller  # noqa: E402
+from decode_pool import DecodePool, decode_payloads  # noqa: E402
+
+
+def run(payloads, batch, pool):
+    spiller = ParquetSpiller(batch_size_threshold=1000)
+    start = time.perf_counter()
+    for i in range(0, len(payloads), batch):
+        chunk = payloads[i : i + batch]
+        if pool:
+            pool.decode(chunk, spiller.add_table)
+        else:
+            rows, _ = decode_payloads(chunk)
+            for row in rows:
+                spiller.add_record(row)
+    spiller._flush_buffer_to_disk()
+    spiller._writer.close()
+    elapsed = time.perf_counter() - start
+    os.remove(spiller._current_file)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=10000, help="records per GetRecords batch")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--chunk", type=int, default=5000, help="records per worker chunk")
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)  # the inputs include deliberately undecodable records
+
+    payloads = make_payloads(args.records)
+    baseline = run(payloads, args.batch, None)
+    print(f"{'workers':>8} {'records/s':>12} {'speedup':>8}")
+    print(f"{'inline':>8} {args.records / baseline:>12.0f} {1.0:>8.2f}")
+
+    for workers in (int(w) for w in args.workers.split(",")):
+        pool = DecodePool(workers, chunk_size=args.chunk)
+        run(payloads[: args.batch], args.batch, pool)  # warm up worker processes
+        elapsed = run(payloads, args.batch, pool)
+        pool.close()
+        print(f"{workers:>8} {args.records / elapsed:>12.0f} {baseline / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
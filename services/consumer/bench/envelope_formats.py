@@ -0,0 +1,87 @@
+"""
+Envelope format comparison.
+
+Encodes synthetic envelopes with the ingestion Lambda's envelope.py (its
+pure-Python msgpack packer, as in the Lambda runtime) in every wire format,
+decodes them with decode_payloads, checks the round trip, and reports bytes
+per event and encode/decode cost per event.
+
+Usage:
+    python bench/envelope_formats.py --events 50000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import importlib.util
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+from events import make_envelope  # noqa: E402
+from decode_pool import decode_payloads  # noqa: E402
+from envelope import ZDICT_V1  # noqa: E402
+
+
+def load_lambda_envelope():
+    """Import the Lambda's envelope.py without msgpack, like the Lambda runtime."""
+    path = os.path.join(HERE, "..", "..", "ingestion_lambda", "envelope.py")
+    spec = importlib.util.spec_from_file_location("lambda_envelope", path)
+    module = importlib.util.module_from_spec(spec)
+    saved = sys.modules.get("msgpack")
+    sys.modules["msgpack"] = None
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        if saved is not None:
+            sys.modules["msgpack"] = saved
+        else:
+            del sys.modules["msgpack"]
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    lambda_envelope = load_lambda_envelope()
+    if lambda_envelope.ZDICT_V1 != ZDICT_V1:
+        print("MISMATCH: the Lambda and consumer deflate dictionaries differ")
+        sys.exit(1)
+
+    rng = random.Random(args.seed)
+    envelopes = [make_envelope(i, rng, 1767225600.0 + i * 0.001) for i in range(args.events)]
+
+    ok = True
+    print(f"{'format':<14} {'bytes/event':>12} {'vs json':>8} {'encode us/event':>16} {'decode us/event':>16}")
+    json_bytes = None
+    for fmt in lambda_envelope.FORMATS:
+        start = time.perf_counter()
+        payloads = [lambda_envelope.encode_envelope(envelope, fmt) for envelope in envelopes]
+        encode = time.perf_counter() - start
+        payloads = [payload.encode() if isinstance(payload, str) else payload for payload in payloads]
+
+        start = time.perf_counter()
+        rows, rejects = decode_payloads(payloads)
+        decode = time.perf_counter() - start
+
+        size = sum(len(payload) for payload in payloads) / len(payloads)
+        json_bytes = json_bytes or size
+        print(
+            f"{fmt:<14} {size:>12.1f} {size / json_bytes:>8.0%} "
+            f"{encode / len(payloads) * 1e6:>16.2f} {decode / len(payloads) * 1e6:>16.2f}"
+        )
+        if rejects or [row["data"] for row in rows] != envelopes:
+            print(f"MISMATCH: {fmt} does not round-trip ({len(rejects)} rejected)")
+            ok = False
+
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Synthetic benchmark inputs: Kinesis payloads shaped like the ingestion Lambda's
+envelopes around Home Assistant state_changed events from the worker generator
+(temperature, humidity, power, ... input_numbers), with a small share of
+undecodable and entity-less records.
+"""
+
+import json
+import random
+import time
+
+DOMAINS = {
+    "temp": ("°F", 70.0, 3.0),
+    "hum": ("%", 45.0, 5.0),
+    "power": ("W", 200.0, 80.0),
+    "light": ("lx", 300.0, 140.0),
+    "co2": ("ppm", 600.0, 80.0),
+    "noise": ("dB", 40.0, 5.0),
+    "occ": (None, 0.5, 0.3),
+    "hvac": ("mode", 1.0, 1.0),
+}
+
+
+def make_envelope(seq, rng=random, now=None):
+    prefix = list(DOMAINS)[seq % len(DOMAINS)]
+    unit, base, spread = DOMAINS[prefix]
+    entity = f"input_number.{prefix}_{seq // len(DOMAINS) % 100 + 1:03d}"
+    now = now or time.time()
+    fired = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)) + f".{int(now % 1 * 1e6):06d}+00:00"
+    attributes = {"min": 0, "max": 5000, "step": 0.1, "mode": "slider", "friendly_name": entity}
+    if unit:
+        attributes["unit_of_measurement"] = unit
+    state = {
+        "entity_id": entity,
+        "state": f"{base + rng.uniform(-spread, spread):.1f}",
+        "attributes": attributes,
+        "last_changed": fired,
+        "last_updated": fired,
+        "context": {"id": f"{seq:026d}", "parent_id": None, "user_id": None},
+    }
+    return {
+        "source": "homeassistant",
+        "received_at": now,
+        "event": {
+            "event_type": "state_changed",
+            "data": {"entity_id": entity, "old_state": state, "new_state": state},
+            "origin": "LOCAL",
+            "time_fired": fired,
+            "context": state["context"],
+        },
+    }
+
+
+def make_payloads(count, bad_ratio=0.001, seed=42):
+    """Return `count` encoded Kinesis payloads, deterministic for a given seed."""
+    rng = random.Random(seed)
+    start = 1767225600.0
+    payloads = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < bad_ratio:
+            payloads.append(b'{"source": "homeassistant", "event": {truncated')
+        elif roll < bad_ratio * 2:
+            payloads.append(json.dumps({"source": "homeassistant", "event": {"data": {}}}).encode())
+        else:
+            payloads.append(json.dumps(make_envelope(i, rng, start + i * 0.001)).encode())
+    return payloads
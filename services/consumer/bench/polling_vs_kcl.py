@@ -0,0 +1,165 @@
+"""
+Polling consumer vs KCL MultiLangDaemon benchmark.
+
+Seeds a stream on a local Kinesis emulator (kinesis-mock, LocalStack, ...) with
+synthetic Home Assistant envelopes, then runs each consumer runtime in a fresh
+process tree until every record has been delivered to RecordProcessor. Reports
+startup time (launch to first record), drain throughput, CPU per record across
+the whole process tree, and peak RSS.
+
+The emulator endpoint is taken from AWS_ENDPOINT_URL, which boto3 honours. The
+KCL run needs a properties file pointing the daemon at the same emulator (the
+`kinesisEndpoint`/`dynamoDBEndpoint` keys), passed with --kcl-properties.
+
+Usage:
+    AWS_ENDPOINT_URL=http://localhost:4566 python bench/polling_vs_kcl.py \
+        --records 200000 --kcl-properties bench/kcl.local.properties
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import tempfile
+import subprocess
+
+import boto3
+
+from events import make_envelope
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CONSUMER_DIR = os.path.dirname(BENCH_DIR)
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def seed_stream(kinesis, stream, records, shards):
+    kinesis.create_stream(StreamName=stream, ShardCount=shards)
+    kinesis.get_waiter("stream_exists").wait(StreamName=stream)
+    for start in range(0, records, 500):
+        batch = [
+            {"Data": json.dumps(envelope).encode(), "PartitionKey": envelope["event"]["data"]["entity_id"]}
+            for envelope in (make_envelope(i) for i in range(start, min(start + 500, records)))
+        ]
+        kinesis.put_records(StreamName=stream, Records=batch)
+
+
+def _tree(pid):
+    pids = [pid]
+    for p in pids:
+        try:
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children") as f:
+                    pids.extend(int(c) for c in f.read().split())
+        except FileNotFoundError:
+            continue
+    return pids
+
+
+def sample_tree(pid):
+    """Return (rss_bytes, cpu_seconds) summed over a process and its descendants."""
+    rss, cpu = 0, 0.0
+    for p in _tree(pid):
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                rss += int(f.read().split()[1]) * PAGE_SIZE
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+                cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+        except FileNotFoundError:
+            continue
+    return rss, cpu
+
+
+def run_consumer(name, cmd, env, expected, timeout):
+    progress = tempfile.NamedTemporaryFile(prefix=f"{name}-", suffix=".progress", delete=False).name
+    env = dict(env, BENCH_PROGRESS_FILE=progress)
+
+    launched = time.time()
+    proc = subprocess.Popen(cmd, env=env, cwd=CONSUMER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first_record_at, done_at, delivered, peak_rss, cpu = None, None, 0, 0, 0.0
+
+    while time.time() - launched < timeout:
+        time.sleep(0.2)
+        rss, cpu_now = sample_tree(proc.pid)
+        peak_rss, cpu = max(peak_rss, rss), max(cpu, cpu_now)
+        with open(progress) as f:
+            lines = f.read().split()
+        delivered = sum(int(n) for n in lines[1::2])
+        if lines and first_record_at is None:
+            first_record_at = float(lines[0])
+        if delivered >= expected:
+            done_at = float(lines[-2])
+            break
+
+    for p in reversed(_tree(proc.pid)):
+        try:
+            os.kill(p, 15)
+        except ProcessLookupError:
+            pass
+    proc.wait(timeout=30)
+    os.remove(progress)
+
+    return {
+        "runtime": name,
+        "records": delivered,
+        "startup_seconds": first_record_at - launched if first_record_at else None,
+        "drain_records_per_second": (
+            delivered / (done_at - first_record_at) if done_at and done_at > first_record_at else None
+        ),
+        "cpu_us_per_record": cpu / delivered * 1e6 if delivered else None,
+        "peak_rss_mib": peak_rss / 2**20,
+        "completed": done_at is not None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--kcl-properties", help="KCL properties file pointing at the emulator; skip KCL if unset")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    kinesis = boto3.client("kinesis")
+    results = []
+    runs = [("polling", None)]
+    if args.kcl_properties:
+        runs.append(("kcl", args.kcl_properties))
+
+    for name, properties in runs:
+        # A fresh stream per runtime so neither starts with the other's checkpoints
+        stream = f"bench-{name}-{uuid.uuid4().hex[:8]}"
+        seed_stream(kinesis, stream, args.records, args.shards)
+        env = dict(
+            os.environ, KINESIS_STREAM=stream, APPLICATION_NAME=stream, S3_BUCKET="bench", READINESS_STORE="none"
+        )
+
+        if name == "polling":
+            env["LEASE_STORE"] = f"sqlite:{tempfile.mktemp(suffix='.db')}"
+            cmd = [
+                sys.executable,
+                "-u",
+                "-c",
+                "import sys; sys.path[:0] = ['bench', 'src'];"
+                "import poller, counting_processor;"
+                "poller.main(counting_processor.CountingRecordProcessor)",
+            ]
+        else:
+            cmd = ["bash", os.path.join(BENCH_DIR, "run_kcl.sh"), properties, stream]
+
+        result = run_consumer(name, cmd, env, args.records, args.timeout)
+        results.append(result)
+        print(json.dumps(result))
+        kinesis.delete_stream(StreamName=stream, EnforceConsumerDeletion=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+#!/bin/bash
+# Launch the KCL MultiLangDaemon for the benchmark: run_kcl.sh <properties> <stream>
+# The properties file must point the daemon at the emulator; stream, application
+# name and executable are overridden here.
+set -e
+
+PROPS=$(mktemp --suffix=.properties)
+grep -vE '^(streamName|applicationName|executableName)' "$1" > "$PROPS"
+cat >> "$PROPS" <<PROPERTIES
+streamName = $2
+applicationName = $2
+executableName = python -u bench/counting_processor.py
+PROPERTIES
+
+KCLPY_PATH=$(python -c "import os, amazon_kclpy; print(os.path.dirname(amazon_kclpy.__file__))")
+CLASSPATH=$(find "$KCLPY_PATH/jars" -name "*.jar" | tr '\n' ':')
+
+exec java -cp "$CLASSPATH" software.amazon.kinesis.multilang.MultiLangDaemon --properties-file "$PROPS"
@@ -0,0 +1,61 @@
+"""
+Typed column encode cost benchmark.
+
+Spills the synthetic benchmark inputs to Snappy Parquet with and without the
+typed state columns (value_float, value_bool, is_unavailable, unit) and reports
+the extra spill time per record and the file size change.
+
+Usage:
+    python bench/typed_columns_cost.py --records 200000
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("S3_BUCKET", "bench")
+
+from events import make_payloads  # noqa: E402
+from aws_utils import ParquetSpiller  # noqa: E402
+from decode_pool import decode_payloads  # noqa: E402
+
+
+def spill(rows, typed_columns):
+    spiller = ParquetSpiller(batch_size_threshold=1000, typed_columns=typed_columns)
+    start = time.perf_counter()
+    for row in rows:
+        spiller.add_record(row)
+    spiller._flush_buffer_to_disk()
+    spiller._writer.close()
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(spiller._current_file)
+    os.remove(spiller._current_file)
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    rows, _ = decode_payloads(make_payloads(args.records))
+    results = {}
+    for typed in (False, True):
+        runs = [spill(rows, typed) for _ in range(args.repeat)]
+        results[typed] = (min(r[0] for r in runs), runs[0][1])
+
+    (plain_s, plain_size), (typed_s, typed_size) = results[False], results[True]
+    print(f"records:            {len(rows)}")
+    print(f"raw spill:          {plain_s / len(rows) * 1e6:.2f} us/record, {plain_size / 2**20:.1f} MiB")
+    print(f"with typed columns: {typed_s / len(rows) * 1e6:.2f} us/record, {typed_size / 2**20:.1f} MiB")
+    print(f"overhead:           {(typed_s - plain_s) / len(rows) * 1e6:.2f} us/record "
+          f"({(typed_s / plain_s - 1) * 100:.1f}%), size {(typed_size / plain_size - 1) * 100:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,20 @@
 #!/bin/bash
 set -e
 
+# Start-up phase timings (src/startup.py)
+export CONSUMER_STARTED_AT=$(date +%s.%N)
+
 # 1. Inject environment variables
 sed -i "s|%KINESIS_STREAM%|$KINESIS_STREAM|g" kcl.properties
 sed -i "s|%AWS_REGION%|$AWS_REGION|g" kcl.properties
 sed -i "s|%APPLICATION_NAME%|${APPLICATION_NAME:-ConsumerApp}|g" kcl.properties
 
+# CONSUMER_MODE=polling runs the in-process asyncio consumer instead of the KCL daemon
+if [ "${CONSUMER_MODE:-kcl}" = "polling" ]; then
+    echo "Starting polling consumer..."
+    exec python -u src/poller.py
+fi
+
 # 2. Construct the Java command manually
 echo "Locating KCL JARs..."
 KCLPY_PATH=$(python -c "import os, amazon_kclpy; print(os.path.dirname(amazon_kclpy.__file__))")
@@ -27,4 +36,5 @@ echo "Classpath length: ${#CLASSPATH}"
 CMD="java -cp $CLASSPATH software.amazon.kinesis.multilang.MultiLangDaemon --properties-file kcl.properties"
 
 echo "Starting KCL Daemon..."
+export JVM_STARTED_AT=$(date +%s.%N)
 exec $CMD
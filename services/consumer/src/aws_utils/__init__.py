@@ -1,9 +1,30 @@
-from .s3_ import ParquetSpiller
-from .cloudwatch_ import emit_metrics
+from .s3_ import ParquetSpiller, upload_table, put_table, sequence_range_name
+from .cloudwatch_ import (
+    emit_metrics,
+    emit_mode_transition,
+    emit_watermark,
+    emit_dead_letters,
+    emit_memory,
+    emit_lag,
+    emit_startup,
+)
+from .ecs_ import TaskProtection, set_task_protection, task_arn
 from .logging_ import configure_logging
 
 __all__ = [
     "ParquetSpiller",
+    "upload_table",
+    "put_table",
+    "sequence_range_name",
     "emit_metrics",
+    "emit_mode_transition",
+    "emit_watermark",
+    "emit_dead_letters",
+    "emit_memory",
+    "emit_lag",
+    "emit_startup",
+    "TaskProtection",
+    "set_task_protection",
+    "task_arn",
     "configure_logging",
 ]
@@ -37,32 +37,223 @@ def emit_metrics(
         Timestamp when the service started (for processing_rate).
     """
 
-    now = time.time()
-    elapsed = now - start_time
+    elapsed = time.time() - start_time
 
+    _emit(
+        {
+            "ingestion_rate": (
+                batch_size / batch_latency if batch_latency > 0 else 0,
+                "Count/Second",
+            ),
+            "processing_rate": (
+                total_events / elapsed if elapsed > 0 else 0,
+                "Count/Second",
+            ),
+            "batch_latency_seconds": (batch_latency, "Seconds"),
+            "flush_latency_seconds": (flush_latency, "Seconds"),
+            "iterator_age_seconds": (iterator_age, "Seconds"),
+        },
+        service,
+    )
+
+
+def emit_mode_transition(
+    catching_up: bool,
+    iterator_age: float,
+    previous_mode_seconds: float,
+    service: str = "consumer",
+):
+    """
+    Emit an EMF record when a shard processor enters or leaves catch-up mode.
+
+    Parameters
+    ----------
+    catching_up : bool
+        True when entering catch-up mode, False when returning to steady state.
+    iterator_age : float
+        Lag in seconds at the moment of the transition.
+    previous_mode_seconds : float
+        Time spent in the mode being left. On leaving catch-up this is the
+        backlog recovery time.
+    """
+    metrics = {
+        "catchup_mode": (1 if catching_up else 0, "Count"),
+        "catchup_transition_iterator_age_seconds": (iterator_age, "Seconds"),
+    }
+    if not catching_up:
+        metrics["catchup_recovery_seconds"] = (previous_mode_seconds, "Seconds")
+    _emit(metrics, service)
+
+
+def emit_watermark(
+    watermark_lag: float,
+    late_events: int,
+    shard_id: str = None,
+    service: str = "consumer",
+):
+    """
+    Emit event-time watermark metrics for one shard, per flush.
+
+    Parameters
+    ----------
+    watermark_lag : float
+        Wall clock minus the shard's watermark, in seconds.
+    late_events : int
+        Events routed to the late-data output since the previous flush.
+    shard_id : str
+        Adds a ShardId dimension next to the Service-level aggregate.
+    """
+    _emit(
+        {
+            "watermark_lag_seconds": (watermark_lag, "Seconds"),
+            "late_events": (late_events, "Count"),
+        },
+        service,
+        shard_id,
+    )
+
+
+def emit_dead_letters(
+    counts: dict,
+    shard_id: str = None,
+    service: str = "consumer",
+):
+    """
+    Emit dead-letter counts per reason for one shard, per flush.
+
+    Parameters
+    ----------
+    counts : dict
+        {reason: records} rejected since the previous flush; reasons with no
+        rejections are omitted.
+    shard_id : str
+        Adds a ShardId dimension next to the Service-level aggregate.
+    """
+    metrics = {"dead_letter_records": (sum(counts.values()), "Count")}
+    for reason, count in counts.items():
+        metrics[f"dead_letter_{reason}"] = (count, "Count")
+    _emit(metrics, service, shard_id)
+
+
+def emit_memory(
+    rss: int,
+    arrow_allocated: int,
+    held: int,
+    task_usage: int,
+    forced_flushes: int,
+    shard_id: str = None,
+    service: str = "consumer",
+):
+    """
+    Emit memory footprint metrics for one shard processor.
+
+    Parameters
+    ----------
+    rss : int
+        Resident set size of the processor's process, in bytes.
+    arrow_allocated : int
+        Bytes allocated from Arrow's default memory pool.
+    held : int
+        Payload bytes taken in by the shard since its last upload.
+    task_usage : int
+        RSS summed over every shard process on the task, per the memory ledger.
+    forced_flushes : int
+        Uploads forced by the memory budget since the previous report.
+    shard_id : str
+        Adds a ShardId dimension next to the Service-level aggregate.
+    """
+    _emit(
+        {
+            "memory_rss_bytes": (rss, "Bytes"),
+            "memory_arrow_bytes": (arrow_allocated, "Bytes"),
+            "memory_held_bytes": (held, "Bytes"),
+            "memory_task_usage_bytes": (task_usage, "Bytes"),
+            "memory_forced_flushes": (forced_flushes, "Count"),
+        },
+        service,
+        shard_id,
+    )
+
+
+def emit_lag(
+    iterator_age: float,
+    processing_rate: float,
+    shard_id: str = None,
+    service: str = "consumer",
+):
+    """
+    Emit a shard's lag between flushes, so autoscaling sees it every minute
+    even when files take hours to fill.
+
+    Parameters
+    ----------
+    iterator_age : float
+        Lag in seconds since newest Kinesis record.
+    processing_rate : float
+        Events processed per second since the processor started.
+    shard_id : str
+        Adds a ShardId dimension next to the Service-level aggregate.
+    """
+    _emit(
+        {
+            "iterator_age_seconds": (iterator_age, "Seconds"),
+            "processing_rate": (processing_rate, "Count/Second"),
+        },
+        service,
+        shard_id,
+    )
+
+
+def emit_startup(
+    phases: dict,
+    time_to_ready: float,
+    shard_id: str = None,
+    service: str = "consumer",
+):
+    """
+    Emit how long a shard processor took from container start to its first
+    successful batch, and where the time went.
+
+    Parameters
+    ----------
+    phases : dict
+        {phase: seconds} as from startup.StartupProfile.phases, emitted as
+        startup_<phase>_seconds.
+    time_to_ready : float
+        Container start to first successful process_records, in seconds.
+    shard_id : str
+        Adds a ShardId dimension next to the Service-level aggregate.
+    """
+    metrics = {f"startup_{phase}_seconds": (seconds, "Seconds") for phase, seconds in phases.items()}
+    metrics["startup_time_to_ready_seconds"] = (time_to_ready, "Seconds")
+    _emit(metrics, service, shard_id)
+
+
+def _emit(metrics: dict, service: str, shard_id: str = None):
+    """
+    Log `{name: (value, unit)}` as one EMF record under the Service dimension,
+    and Service+ShardId when a shard is given.
+    """
+    dimensions = [["Service"]]
+    if shard_id:
+        dimensions.append(["Service", "ShardId"])
     metric = {
         "_aws": {
-            "Timestamp": int(now * 1000),
+            "Timestamp": int(time.time() * 1000),
             "CloudWatchMetrics": [
                 {
                     "Namespace": "IoTIngestionPipeline",
-                    "Dimensions": [["Service"]],
+                    "Dimensions": dimensions,
                     "Metrics": [
-                        {"Name": "ingestion_rate", "Unit": "Count/Second"},
-                        {"Name": "processing_rate", "Unit": "Count/Second"},
-                        {"Name": "batch_latency_seconds", "Unit": "Seconds"},
-                        {"Name": "flush_latency_seconds", "Unit": "Seconds"},
-                        {"Name": "iterator_age_seconds", "Unit": "Seconds"},
+                        {"Name": name, "Unit": unit}
+                        for name, (_, unit) in metrics.items()
                     ],
                 }
             ],
         },
         "Service": service,
-        "ingestion_rate": batch_size / batch_latency if batch_latency > 0 else 0,
-        "processing_rate": total_events / elapsed if elapsed > 0 else 0,
-        "batch_latency_seconds": batch_latency,
-        "flush_latency_seconds": flush_latency,
-        "iterator_age_seconds": iterator_age,
+        **({"ShardId": shard_id} if shard_id else {}),
+        **{name: value for name, (value, _) in metrics.items()},
     }
 
     _metrics_logger.info(json.dumps(metric))
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import urllib.request
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Set by the ECS agent inside a task; absent when running locally
+ECS_AGENT_URI = os.environ.get("ECS_AGENT_URI")
+ECS_CONTAINER_METADATA_URI = os.environ.get("ECS_CONTAINER_METADATA_URI_V4")
+
+AGENT_TIMEOUT_SECONDS = 2.0
+
+
+def set_task_protection(enabled, expires_in_minutes=None):
+    """
+    Turn ECS scale-in protection for this task on or off through the ECS
+    agent's task protection endpoint. Returns True when ECS accepted the
+    change; failures are logged, never raised.
+    """
+    if not ECS_AGENT_URI:
+        return False
+
+    body = {"ProtectionEnabled": enabled}
+    if enabled and expires_in_minutes:
+        body["ExpiresInMinutes"] = expires_in_minutes
+    request = urllib.request.Request(
+        f"{ECS_AGENT_URI}/task-protection/v1/state",
+        data=json.dumps(body).encode(),
+        headers={"Content-Type": "application/json"},
+        method="PUT",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=AGENT_TIMEOUT_SECONDS) as response:
+            result = json.loads(response.read() or b"{}")
+    except Exception as e:
+        logger.warning(f"Task protection update failed: {e}")
+        return False
+
+    if "failure" in result or "error" in result:
+        logger.warning(f"Task protection update rejected: {result.get('failure') or result.get('error')}")
+        return False
+    return True
+
+
+def task_arn():
+    """This task's ARN from the task metadata endpoint, or None outside ECS."""
+    if not ECS_CONTAINER_METADATA_URI:
+        return None
+    try:
+        with urllib.request.urlopen(f"{ECS_CONTAINER_METADATA_URI}/task", timeout=AGENT_TIMEOUT_SECONDS) as response:
+            return json.loads(response.read()).get("TaskARN")
+    except Exception as e:
+        logger.warning(f"Task metadata lookup failed: {e}")
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+class TaskProtection:
+    """
+    Scale-in protection for the task while any shard processor is flushing.
+
+    KCL runs each shard in its own process, so holders are counted in a small
+    JSON file guarded by an flock: the first holder turns protection on, the
+    last one to release turns it off. Holders whose process died are dropped,
+    and protection expires after `expires_in_minutes` in case nobody is left to
+    turn it off.
+    """
+
+    def __init__(self, path, expires_in_minutes=30, setter=set_task_protection):
+        self._path = path
+        self._lock_path = f"{path}.lock"
+        self._expires_in_minutes = expires_in_minutes
+        self._setter = setter
+
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"holders": {}, "enabled": False}
+
+    def _save(self, state):
+        tmp = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self._path)
+
+    def _update(self, update):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state = self._load()
+                state["holders"] = {
+                    key: holder for key, holder in state["holders"].items() if _pid_alive(holder["pid"])
+                }
+                update(state["holders"])
+                # Refreshed by later holders once half the expiry has passed
+                expired = time.time() - state.get("enabled_at", 0) > self._expires_in_minutes * 60 / 2
+                if state["holders"] and (not state["enabled"] or expired):
+                    if self._setter(True, self._expires_in_minutes):
+                        state["enabled"], state["enabled_at"] = True, time.time()
+                elif not state["holders"] and state["enabled"]:
+                    if self._setter(False):
+                        state["enabled"] = False
+                self._save(state)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def acquire(self, holder):
+        self._update(lambda holders: holders.__setitem__(holder, {"pid": os.getpid(), "since": time.time()}))
+
+    def release(self, holder):
+        self._update(lambda holders: holders.pop(holder, None))
+
+    @contextmanager
+    def hold(self, holder):
+        """Keep the task protected for the duration of the block; never raises on bookkeeping errors."""
+        try:
+            self.acquire(holder)
+        except OSError as e:
+            logger.error(f"Task protection bookkeeping failed: {e}")
+        try:
+            yield
+        finally:
+            try:
+                self.release(holder)
+            except OSError as e:
+                logger.error(f"Task protection bookkeeping failed: {e}")
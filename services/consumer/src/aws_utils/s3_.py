@@ -4,20 +4,118 @@ import os
 from datetime import datetime, timezone
 
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 
 from clients import s3, S3_BUCKET
+from typed_columns import add_typed_columns
 
 logger = logging.getLogger(__name__)
 
 
+def _dated_key(prefix, when=None, name=None):
+    when = when or datetime.now(timezone.utc)
+    if name is None:
+        timestamp = when.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        name = f"{timestamp}-{uuid.uuid4().hex}"
+    return f"{prefix}/year={when.year}/month={when.month:02d}/day={when.day:02d}/{name}.parquet"
+
+
+def sequence_range_name(shard_id, first_sequence, last_sequence):
+    """Object name for the records first..last of a shard; a replay maps to the same key."""
+    return f"shard={shard_id}/{first_sequence}-{last_sequence}"
+
+
+def upload_table(table, prefix, when=None, name=None):
+    """
+    Write a small derived table (rollups, ...) to one Parquet object under
+    prefix, partitioned by `when` (default: now) and named `name` (default:
+    timestamp and random suffix).
+    """
+    if table.num_rows == 0:
+        return None
+
+    return put_table(table, _dated_key(prefix, when, name))
+
+
+def put_table(table, key):
+    """Write a table to one Parquet object at key."""
+    local_file = f"/tmp/{uuid.uuid4().hex}.parquet"
+    try:
+        pq.write_table(table, local_file, compression="snappy")
+        s3.upload_file(local_file, S3_BUCKET, key)
+        logger.info(f"Uploaded {table.num_rows} rows → s3://{S3_BUCKET}/{key}")
+        return key
+    finally:
+        if os.path.exists(local_file):
+            os.remove(local_file)
+
+
 class ParquetSpiller:
-    def __init__(self, batch_size_threshold=1000):
+    """
+    Spills records to a local Parquet file in chunks and uploads it under
+    `prefix`, partitioned by the newest event time in the file, or by upload
+    time without `partition_by_event_time` or when chunks carry no event_time.
+
+    Once a shard id is set and the caller reports the Kinesis sequence numbers
+    it spilled (`note_sequence_range`), the object is named
+    shard=<id>/<first>-<last>.parquet. Spilling the same records again, e.g.
+    after a crash between upload and checkpoint, overwrites that object instead
+    of adding a duplicate.
+
+    With a `watermark` (WatermarkTracker), rows older than the watermark are
+    diverted to `late_spiller` instead, so files already written for a time
+    partition never need rewriting.
+    """
+
+    def __init__(
+        self,
+        batch_size_threshold=1000,
+        typed_columns=True,
+        on_table=None,
+        prefix="raw",
+        partition_by_event_time=True,
+        watermark=None,
+        late_spiller=None,
+        schema=None,
+    ):
         self._buffer = []
+        # Fixed schema for buffered records; inferred per chunk when None
+        self._schema = schema
         self._batch_size_threshold = batch_size_threshold
+        self._typed_columns = typed_columns
+        # Called with each spilled on-time chunk (typed columns included), e.g. rollups
+        self._on_table = on_table
+        self._prefix = prefix
+        self._partition_by_event_time = partition_by_event_time
+        self._watermark = watermark
+        self._late_spiller = late_spiller
         self._writer = None
         self._current_file = f"/tmp/{uuid.uuid4().hex}.parquet"
         self._record_count = 0
+        self._max_event_time = None
+        self._shard_id = None
+        self._first_sequence = None
+        self._last_sequence = None
+
+    def set_batch_size_threshold(self, batch_size_threshold):
+        self._batch_size_threshold = batch_size_threshold
+
+    def set_shard_id(self, shard_id):
+        self._shard_id = shard_id
+
+    def note_sequence_range(self, first_sequence, last_sequence):
+        """Record that Kinesis records first..last have been handed to the spiller."""
+        if self._first_sequence is None:
+            self._first_sequence = first_sequence
+        self._last_sequence = last_sequence
+
+    @property
+    def sequence_range(self):
+        """(first, last) sequence numbers in the current file, or None."""
+        if self._first_sequence is None:
+            return None
+        return self._first_sequence, self._last_sequence
 
     def add_record(self, record):
         self._buffer.append(record)
@@ -25,26 +123,55 @@ class ParquetSpiller:
         if len(self._buffer) >= self._batch_size_threshold:
             self._flush_buffer_to_disk()
 
+    def add_table(self, table):
+        """Spill an already-built Arrow table, after any buffered records."""
+        self._flush_buffer_to_disk()
+        try:
+            self._write_table(table)
+        except Exception as e:
+            logger.error(f"Failed to spill to disk: {e}")
+            raise
+
     def _flush_buffer_to_disk(self):
         if not self._buffer:
             return
 
         try:
-            table = pa.Table.from_pylist(self._buffer)
-
-            if self._writer is None:
-                self._writer = pq.ParquetWriter(
-                    self._current_file, table.schema, compression="snappy"
-                )
-
-            self._writer.write_table(table)
-            self._record_count += len(self._buffer)
+            self._write_table(pa.Table.from_pylist(self._buffer, schema=self._schema))
             self._buffer = []
 
         except Exception as e:
             logger.error(f"Failed to spill to disk: {e}")
             raise
 
+    def _write_table(self, table):
+        if self._typed_columns:
+            table = add_typed_columns(table)
+
+        # Before the late split, so the partition only depends on the records
+        if self._partition_by_event_time and "event_time" in table.column_names:
+            newest = pc.max(table["event_time"]).as_py()
+            if newest is not None and (self._max_event_time is None or newest > self._max_event_time):
+                self._max_event_time = newest
+
+        if self._watermark:
+            table, late = self._watermark.split(table)
+            if late is not None and self._late_spiller:
+                self._late_spiller.add_table(late)
+            if table.num_rows == 0:
+                return
+
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(
+                self._current_file, table.schema, compression="snappy"
+            )
+
+        self._writer.write_table(table)
+        self._record_count += table.num_rows
+
+        if self._on_table:
+            self._on_table(table)
+
     def close_and_upload(self):
         self._flush_buffer_to_disk()
 
@@ -54,19 +181,14 @@ class ParquetSpiller:
         if self._record_count == 0:
             if os.path.exists(self._current_file):
                 os.remove(self._current_file)
+            self._reset()
             return None
 
         try:
-            now = datetime.now(timezone.utc)
-            year = now.year
-            month = f"{now.month:02d}"
-            day = f"{now.day:02d}"
-            timestamp = now.isoformat(timespec="milliseconds").replace("+00:00", "Z")
-
-            filename = (
-                f"raw/year={year}/month={month}/day={day}/"
-                f"{timestamp}-{uuid.uuid4().hex}.parquet"
-            )
+            name = None
+            if self._shard_id and self._first_sequence is not None:
+                name = sequence_range_name(self._shard_id, self._first_sequence, self._last_sequence)
+            filename = _dated_key(self._prefix, self._max_event_time, name)
 
             s3.upload_file(self._current_file, S3_BUCKET, filename)
             logger.info(
@@ -77,7 +199,12 @@ class ParquetSpiller:
         finally:
             if os.path.exists(self._current_file):
                 os.remove(self._current_file)
+            self._reset()
 
-            self._current_file = f"/tmp/{uuid.uuid4().hex}.parquet"
-            self._writer = None
-            self._record_count = 0
+    def _reset(self):
+        self._current_file = f"/tmp/{uuid.uuid4().hex}.parquet"
+        self._writer = None
+        self._record_count = 0
+        self._max_event_time = None
+        self._first_sequence = None
+        self._last_sequence = None
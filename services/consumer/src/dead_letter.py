@@ -0,0 +1,97 @@
+import time
+import logging
+from datetime import datetime
+from collections import Counter
+
+import pyarrow as pa
+
+import aws_utils
+
+logger = logging.getLogger(__name__)
+
+DLQ_PREFIX = "dlq"
+MAX_LOG_SAMPLES = 3
+SAMPLE_BYTES = 256
+
+DLQ_SCHEMA = pa.schema(
+    [
+        ("shard_id", pa.string()),
+        ("sequence_number", pa.string()),
+        ("partition_key", pa.string()),
+        ("approximate_arrival_millis", pa.int64()),
+        ("reason", pa.string()),
+        ("detail", pa.string()),
+        ("payload", pa.binary()),
+        ("rejected_at", pa.float64()),
+    ]
+)
+
+
+def _arrival_millis(record):
+    # KCL hands over epoch millis, boto3 (polling runtime) a datetime
+    arrival = getattr(record, "approximate_arrival_timestamp", None)
+    if isinstance(arrival, datetime):
+        return int(arrival.timestamp() * 1000)
+    if isinstance(arrival, (int, float)):
+        return int(arrival)
+    return None
+
+
+class DeadLetterSink:
+    """
+    Batched dead-letter output for records the processor rejects.
+
+    Rejected records are kept with their reason code, shard id, sequence
+    number, partition key and raw payload, spilled under dlq/ next to each
+    raw upload (same shard/sequence-range object names), and counted per
+    reason. Only the first MAX_LOG_SAMPLES records per reason and flush are
+    logged, truncated to SAMPLE_BYTES, so poison payloads cannot flood logs.
+    """
+
+    def __init__(self, quiet=False):
+        self._spiller = aws_utils.ParquetSpiller(
+            typed_columns=False, prefix=DLQ_PREFIX, partition_by_event_time=False, schema=DLQ_SCHEMA
+        )
+        self._shard_id = None
+        self._counts = Counter()
+        self._logged = Counter()
+        self.quiet = quiet
+
+    def set_shard_id(self, shard_id):
+        self._shard_id = shard_id
+        self._spiller.set_shard_id(shard_id)
+
+    def note_sequence_range(self, first_sequence, last_sequence):
+        self._spiller.note_sequence_range(first_sequence, last_sequence)
+
+    def add(self, record, reason, detail=None):
+        payload = record.binary_data
+        self._counts[reason] += 1
+        if not self.quiet and self._logged[reason] < MAX_LOG_SAMPLES:
+            self._logged[reason] += 1
+            logger.error(
+                f"Rejected record {record.sequence_number} ({reason}): "
+                f"{detail or ''} {payload[:SAMPLE_BYTES]!r}"
+            )
+
+        self._spiller.add_record(
+            {
+                "shard_id": self._shard_id,
+                "sequence_number": record.sequence_number,
+                "partition_key": getattr(record, "partition_key", None),
+                "approximate_arrival_millis": _arrival_millis(record),
+                "reason": reason,
+                "detail": detail,
+                "payload": bytes(payload),
+                "rejected_at": time.time(),
+            }
+        )
+
+    def take_counts(self):
+        """Rejections per reason since the previous call."""
+        counts, self._counts = self._counts, Counter()
+        return dict(counts)
+
+    def close_and_upload(self):
+        self._logged.clear()
+        return self._spiller.close_and_upload()
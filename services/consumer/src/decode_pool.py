@@ -0,0 +1,168 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import pyarrow as pa
+
+from envelope import decode_envelope
+
+# Reason codes for records that do not become spiller rows
+REASON_DECODE_ERROR = "decode_error"
+REASON_INVALID_ENVELOPE = "invalid_envelope"
+REASON_MISSING_ENTITY_ID = "missing_entity_id"
+
+ERROR_DETAIL_CHARS = 200
+
+
+def decode_payloads(payloads):
+    """
+    Decode raw Kinesis payloads into spiller rows.
+
+    Payloads are JSON or binary envelopes (see envelope.decode_envelope).
+    Returns (rows, rejects), rejects being (index, reason, detail) for every
+    payload that cannot be decoded, is not an envelope object, or has no
+    entity_id.
+    """
+    rows = []
+    rejects = []
+    for index, raw in enumerate(payloads):
+        try:
+            data = decode_envelope(raw)
+        except Exception as e:
+            rejects.append((index, REASON_DECODE_ERROR, str(e)[:ERROR_DETAIL_CHARS]))
+            continue
+
+        try:
+            entity = data.get("event", {}).get("data", {}).get("entity_id")
+        except AttributeError as e:
+            rejects.append((index, REASON_INVALID_ENVELOPE, str(e)[:ERROR_DETAIL_CHARS]))
+            continue
+
+        if not entity:
+            rejects.append((index, REASON_MISSING_ENTITY_ID, None))
+            continue
+
+        rows.append({"data": data})
+    return rows, rejects
+
+
+def _open_shared_memory(**kwargs):
+    # Blocks are unlinked by the parent once consumed; keep the resource tracker
+    # (3.13+) from reclaiming them when a worker exits.
+    try:
+        return shared_memory.SharedMemory(track=False, **kwargs)
+    except TypeError:
+        return shared_memory.SharedMemory(**kwargs)
+
+
+def _write_ipc(memory, table):
+    # Kept in its own frame so every view of `memory` is released on return,
+    # before the shared memory block is closed.
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(memory))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.close()
+
+
+def _decode_chunk(payloads):
+    rows, rejects = decode_payloads(payloads)
+    if not rows:
+        return None, 0, 0, rejects
+
+    table = pa.Table.from_pylist(rows)
+
+    # Size the IPC stream first so it can be serialized straight into shared memory
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    nbytes = mock.size()
+
+    shm = _open_shared_memory(create=True, size=nbytes)
+    _write_ipc(shm.buf, table)
+    name = shm.name
+    shm.close()
+    return name, nbytes, len(rows), rejects
+
+
+def _consume_ipc(memory, nbytes, consume):
+    # The table is a zero-copy view of `memory`; it must not outlive this call.
+    table = pa.ipc.open_stream(pa.py_buffer(memory[:nbytes])).read_all()
+    consume(table)
+
+
+class DecodePool:
+    """
+    Process pool that decodes large GetRecords batches in parallel.
+
+    Batches are split into chunks; each worker decodes its chunk, builds an
+    Arrow table and writes it as an IPC stream into a shared memory block. The
+    parent maps the block and reads the table without copying, in the original
+    chunk order, so it only has to write and checkpoint.
+    """
+
+    def __init__(self, workers, chunk_size=5000):
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    def decode(self, payloads, consume):
+        """
+        Decode payloads and call consume(table) for each chunk in order.
+        Tables reference shared memory that is released once consume returns.
+
+        Returns (rows, rejects) like decode_payloads, with indices into payloads.
+        """
+        size = max(self._chunk_size, -(-len(payloads) // self._workers))
+        starts = range(0, len(payloads), size)
+        futures = [self._executor.submit(_decode_chunk, payloads[i : i + size]) for i in starts]
+
+        total_rows = 0
+        all_rejects = []
+        for start, future in zip(starts, futures):
+            name, nbytes, rows, rejects = future.result()
+            all_rejects.extend((start + index, reason, detail) for index, reason, detail in rejects)
+            if name is None:
+                continue
+
+            shm = _open_shared_memory(name=name)
+            try:
+                _consume_ipc(shm.buf, nbytes, consume)
+                total_rows += rows
+            finally:
+                shm.close()
+                shm.unlink()
+
+        return total_rows, all_rejects
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_shared_pool = None
+_shared_pool_users = 0
+_shared_pool_lock = threading.Lock()
+
+
+def acquire_shared_pool(workers):
+    """
+    The process-wide DecodePool, started on first use, so shard processors in
+    one process (the polling runtime) share a pool instead of starting one
+    each. Every acquire must be matched by a release_shared_pool().
+    """
+    global _shared_pool, _shared_pool_users
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = DecodePool(workers)
+        _shared_pool_users += 1
+        return _shared_pool
+
+
+def release_shared_pool():
+    """Drop one user of the shared pool; the last one shuts it down."""
+    global _shared_pool, _shared_pool_users
+    with _shared_pool_lock:
+        _shared_pool_users -= 1
+        if _shared_pool_users > 0:
+            return
+        pool, _shared_pool = _shared_pool, None
+    pool.close()
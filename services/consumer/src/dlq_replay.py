@@ -0,0 +1,125 @@
+"""
+Dead-letter replay.
+
+Reads dlq/ Parquet files, optionally repairs each payload with a fixer function
+and pushes the records back through RecordProcessor, once per original shard.
+Output goes to the normal raw/, late/, rollup/ and dlq/ prefixes under the shard
+id `replay-<original shard>`, so replayed objects never overwrite the originals.
+
+A fixer is `module:function` importable from the working directory, called as
+function(payload: bytes, row: dict) and returning the fixed payload, or None to
+drop the record.
+
+Usage:
+    python src/dlq_replay.py s3://<bucket>/dlq/year=2026/month=01/day=01/ --fixer fixes:strip_nul
+    python src/dlq_replay.py ./dlq-dump/ --reason missing_entity_id --dry-run
+"""
+
+import os
+import sys
+import argparse
+import importlib
+from collections import defaultdict
+
+# Replays are one-off backfills: no latest-state snapshots for the replay shards
+os.environ.setdefault("SNAPSHOT_INTERVAL_SECONDS", "0")
+
+import pyarrow.parquet as pq  # noqa: E402
+
+import aws_utils  # noqa: E402
+from clients import s3  # noqa: E402
+from poller import Record, ProcessorInput  # noqa: E402
+from record_processor import RecordProcessor  # noqa: E402
+from snapshot import list_objects, read_parquet  # noqa: E402
+
+
+class _NoCheckpoint:
+    def checkpoint(self, sequence_number=None, sub_sequence_number=None):
+        pass
+
+
+def load_fixer(spec):
+    module_name, _, function_name = spec.partition(":")
+    if not function_name:
+        raise ValueError(f"Fixer must be module:function, got {spec!r}")
+    sys.path.insert(0, os.getcwd())
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def read_dead_letters(source):
+    """Yield DLQ tables from an s3://bucket/prefix or local files/directories."""
+    if source.startswith("s3://"):
+        bucket, _, prefix = source[len("s3://") :].partition("/")
+        for obj in list_objects(s3, bucket, prefix):
+            if obj["Key"].endswith(".parquet"):
+                yield read_parquet(s3, bucket, obj["Key"])
+        return
+
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.endswith(".parquet"):
+                    yield pq.read_table(os.path.join(root, name))
+    else:
+        yield pq.read_table(source)
+
+
+def replay(records_by_shard, batch_size=10000):
+    for shard_id, records in records_by_shard.items():
+        records.sort(key=lambda record: int(record.sequence_number))
+        processor = RecordProcessor()
+        processor.initialize(
+            ProcessorInput(shard_id=f"replay-{shard_id}", sequence_number=None, sub_sequence_number=None)
+        )
+        for start in range(0, len(records), batch_size):
+            processor.process_records(
+                ProcessorInput(
+                    records=records[start : start + batch_size],
+                    checkpointer=_NoCheckpoint(),
+                    millis_behind_latest=0,
+                )
+            )
+        processor.shutdown_requested(ProcessorInput(checkpointer=_NoCheckpoint()))
+        print(f"{shard_id}: replayed {len(records)} records as replay-{shard_id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="s3://bucket/prefix, Parquet files or directories")
+    parser.add_argument("--fixer", help="module:function applied to every payload")
+    parser.add_argument("--reason", action="append", help="only replay these reason codes (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="apply the fixer and report, without replaying")
+    args = parser.parse_args()
+
+    aws_utils.configure_logging()
+    fixer = load_fixer(args.fixer) if args.fixer else None
+
+    records_by_shard = defaultdict(list)
+    read = dropped = 0
+    for source in args.sources:
+        for table in read_dead_letters(source):
+            for row in table.to_pylist():
+                if args.reason and row["reason"] not in args.reason:
+                    continue
+                read += 1
+                payload = fixer(row["payload"], row) if fixer else row["payload"]
+                if payload is None:
+                    dropped += 1
+                    continue
+                records_by_shard[row["shard_id"]].append(
+                    Record(
+                        {
+                            "Data": payload,
+                            "SequenceNumber": row["sequence_number"],
+                            "PartitionKey": row["partition_key"],
+                        }
+                    )
+                )
+
+    print(f"{read} dead letters read, {dropped} dropped by the fixer")
+    if not args.dry_run:
+        replay(records_by_shard)
+
+
+if __name__ == "__main__":
+    main()
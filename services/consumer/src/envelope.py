@@ -0,0 +1,92 @@
+import json
+import zlib
+
+import msgpack
+
+# Header bytes of the binary envelope formats written by the ingestion Lambda
+# (ENVELOPE_FORMAT). Payloads without one are JSON envelopes.
+HEADER_MSGPACK = 0x01
+HEADER_MSGPACK_ZLIB_V1 = 0x02
+
+# Preset deflate dictionary, version 1. Must match ZDICT_V1_STRINGS in the
+# ingestion Lambda's envelope.py byte for byte.
+ZDICT_V1_STRINGS = (
+    "sensor.",
+    "binary_sensor.",
+    "light.",
+    "switch.",
+    "input_number.",
+    "automation.",
+    "min",
+    "max",
+    "step",
+    "mode",
+    "icon",
+    "mdi:",
+    "device_class",
+    "temperature",
+    "humidity",
+    "power",
+    "energy",
+    "°C",
+    "W",
+    "kWh",
+    "%",
+    "state_class",
+    "measurement",
+    "total_increasing",
+    "unit_of_measurement",
+    "friendly_name",
+    "on",
+    "off",
+    "unavailable",
+    "unknown",
+    "LOCAL",
+    "origin",
+    "user_id",
+    "parent_id",
+    "id",
+    "context",
+    "last_reported",
+    "last_updated",
+    "last_changed",
+    "attributes",
+    "state",
+    "entity_id",
+    "old_state",
+    "new_state",
+    "+00:00",
+    "time_fired",
+    "state_changed",
+    "event_type",
+    "data",
+    "partition",
+    "homeassistant",
+    "source",
+    "received_at",
+    "event",
+)
+
+ZDICT_V1 = b"".join(msgpack.packb(value) for value in ZDICT_V1_STRINGS)
+
+
+def _unpack(packed):
+    return msgpack.unpackb(packed, raw=False, strict_map_key=False)
+
+
+def decode_envelope(raw):
+    """
+    Decode one Kinesis payload into an envelope, by its header byte.
+
+    Raises on malformed payloads (ValueError, zlib.error, msgpack errors).
+    """
+    header = raw[0] if raw else None
+    if header == HEADER_MSGPACK:
+        return _unpack(memoryview(raw)[1:])
+    if header == HEADER_MSGPACK_ZLIB_V1:
+        decompressor = zlib.decompressobj(wbits=-15, zdict=ZDICT_V1)
+        packed = decompressor.decompress(memoryview(raw)[1:])
+        if not decompressor.eof:
+            raise ValueError("Truncated compressed envelope")
+        return _unpack(packed)
+    return json.loads(raw)
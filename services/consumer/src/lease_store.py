@@ -0,0 +1,202 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+# Checkpoint value recorded once a shard has been read to its end, mirroring KCL.
+SHARD_END = "SHARD_END"
+
+
+class LeaseStore(ABC):
+    """
+    Shard lease and checkpoint storage for the polling consumer.
+
+    A lease is owned by one worker until it expires; owners renew their leases
+    periodically and other workers may take over expired ones. Implementations
+    must make acquire/renew atomic with respect to other workers.
+    """
+
+    @abstractmethod
+    def get_checkpoint(self, shard_id):
+        pass
+
+    @abstractmethod
+    def try_acquire(self, shard_id, owner, duration):
+        pass
+
+    @abstractmethod
+    def renew(self, shard_id, owner, duration):
+        pass
+
+    @abstractmethod
+    def checkpoint(self, shard_id, owner, sequence_number):
+        pass
+
+    @abstractmethod
+    def release(self, shard_id, owner):
+        pass
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """
+    Local stand-in for the DynamoDB lease table, for development and benchmarks.
+    Safe across processes on one host via SQLite's own locking.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            "shard_id TEXT PRIMARY KEY, owner TEXT, expires_at REAL, checkpoint TEXT)"
+        )
+
+    def get_checkpoint(self, shard_id):
+        with self._lock:
+            row = self._conn.execute("SELECT checkpoint FROM leases WHERE shard_id = ?", (shard_id,)).fetchone()
+        return row[0] if row else None
+
+    def try_acquire(self, shard_id, owner, duration):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO leases (shard_id, owner, expires_at, checkpoint) VALUES (?, NULL, 0, NULL)",
+                (shard_id,),
+            )
+            cur = self._conn.execute(
+                "UPDATE leases SET owner = ?, expires_at = ? "
+                "WHERE shard_id = ? AND (owner IS NULL OR owner = ? OR expires_at < ?)",
+                (owner, now + duration, shard_id, owner, now),
+            )
+        return cur.rowcount == 1
+
+    def renew(self, shard_id, owner, duration):
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE shard_id = ? AND owner = ?",
+                (time.time() + duration, shard_id, owner),
+            )
+        return cur.rowcount == 1
+
+    def checkpoint(self, shard_id, owner, sequence_number):
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE leases SET checkpoint = ? WHERE shard_id = ? AND owner = ?",
+                (sequence_number, shard_id, owner),
+            )
+        if cur.rowcount != 1:
+            raise RuntimeError(f"Lease for {shard_id} is no longer held by {owner}")
+
+    def release(self, shard_id, owner):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE leases SET owner = NULL, expires_at = 0 WHERE shard_id = ? AND owner = ?",
+                (shard_id, owner),
+            )
+
+
+class DynamoDBLeaseStore(LeaseStore):
+    """
+    Lease table in DynamoDB using conditional writes, created on first use.
+    """
+
+    def __init__(self, table_name, dynamodb):
+        self._table = table_name
+        self._ddb = dynamodb
+        self._ensure_table()
+
+    def _ensure_table(self):
+        try:
+            self._ddb.describe_table(TableName=self._table)
+            return
+        except self._ddb.exceptions.ResourceNotFoundException:
+            pass
+
+        logger.info(f"Creating lease table {self._table}")
+        self._ddb.create_table(
+            TableName=self._table,
+            AttributeDefinitions=[{"AttributeName": "leaseKey", "AttributeType": "S"}],
+            KeySchema=[{"AttributeName": "leaseKey", "KeyType": "HASH"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        self._ddb.get_waiter("table_exists").wait(TableName=self._table)
+
+    def get_checkpoint(self, shard_id):
+        item = self._ddb.get_item(
+            TableName=self._table,
+            Key={"leaseKey": {"S": shard_id}},
+            ConsistentRead=True,
+        ).get("Item")
+        if not item or "checkpointSequence" not in item:
+            return None
+        return item["checkpointSequence"]["S"]
+
+    def _conditional_update(self, shard_id, update, condition, values):
+        try:
+            self._ddb.update_item(
+                TableName=self._table,
+                Key={"leaseKey": {"S": shard_id}},
+                UpdateExpression=update,
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values,
+            )
+            return True
+        except self._ddb.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def try_acquire(self, shard_id, owner, duration):
+        now = time.time()
+        return self._conditional_update(
+            shard_id,
+            "SET leaseOwner = :owner, leaseExpiresAt = :expires",
+            "attribute_not_exists(leaseOwner) OR leaseOwner = :owner OR leaseExpiresAt < :now",
+            {
+                ":owner": {"S": owner},
+                ":expires": {"N": str(now + duration)},
+                ":now": {"N": str(now)},
+            },
+        )
+
+    def renew(self, shard_id, owner, duration):
+        return self._conditional_update(
+            shard_id,
+            "SET leaseExpiresAt = :expires",
+            "leaseOwner = :owner",
+            {":owner": {"S": owner}, ":expires": {"N": str(time.time() + duration)}},
+        )
+
+    def checkpoint(self, shard_id, owner, sequence_number):
+        if not self._conditional_update(
+            shard_id,
+            "SET checkpointSequence = :checkpoint",
+            "leaseOwner = :owner",
+            {":owner": {"S": owner}, ":checkpoint": {"S": sequence_number}},
+        ):
+            raise RuntimeError(f"Lease for {shard_id} is no longer held by {owner}")
+
+    def release(self, shard_id, owner):
+        self._conditional_update(
+            shard_id,
+            "REMOVE leaseOwner, leaseExpiresAt",
+            "leaseOwner = :owner",
+            {":owner": {"S": owner}},
+        )
+
+
+def lease_store_from_env(application_name):
+    """
+    Build the lease store selected by LEASE_STORE: "dynamodb" (default) or
+    "sqlite:<path>".
+    """
+    spec = os.environ.get("LEASE_STORE", "dynamodb")
+    if spec.startswith("sqlite:"):
+        return SQLiteLeaseStore(spec[len("sqlite:") :])
+    if spec == "dynamodb":
+        import boto3
+
+        return DynamoDBLeaseStore(f"{application_name}-polling", boto3.client("dynamodb"))
+    raise ValueError(f"Unknown LEASE_STORE: {spec}")
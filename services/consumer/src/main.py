@@ -1,8 +1,16 @@
+# First, so the process start is marked before the heavy imports
+import startup
 import sys
 import logging
-import aws_utils
-from amazon_kclpy import kcl
-from record_processor import RecordProcessor
+import pyarrow  # noqa: F401
+
+startup.profile.mark("pyarrow_import")
+
+import aws_utils  # noqa: E402
+from amazon_kclpy import kcl  # noqa: E402
+from record_processor import RecordProcessor  # noqa: E402
+
+startup.profile.mark("imports")
 
 aws_utils.configure_logging()
 logger = logging.getLogger(__name__)
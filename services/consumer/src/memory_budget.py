@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import resource
+
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def rss_bytes():
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # No procfs (macOS): peak RSS is the best available stand-in
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def arrow_bytes():
+    """Bytes currently allocated by Arrow's default memory pool."""
+    return pa.total_allocated_bytes()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+class MemoryLedger:
+    """
+    Memory budget shared by every shard processor on the task.
+
+    Under KCL each shard lease runs in its own process, so processors
+    coordinate through a small JSON file guarded by an flock. Each processor
+    reports its process RSS and the bytes it holds for its shard; usage is the
+    RSS summed over distinct processes (the polling runtime runs every shard in
+    one process). Over budget, the shard holding the most is asked to flush:
+    directly when it is the reporter, otherwise through a flag it picks up on
+    its next report. Entries of dead or silent processes are dropped.
+    """
+
+    def __init__(self, path, budget_bytes, min_flush_bytes=16 * 1024 * 1024, stale_seconds=300.0):
+        self._path = path
+        self._lock_path = f"{path}.lock"
+        self._budget = budget_bytes
+        self._min_flush_bytes = min_flush_bytes
+        self._stale_seconds = stale_seconds
+
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        tmp = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self._path)
+
+    def _locked(self, update):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                entries = self._load()
+                result = update(entries)
+                self._save(entries)
+                return result
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def report(self, shard_id, rss, held):
+        """
+        Record this shard's footprint. Returns (usage_bytes, flush) where flush
+        tells the caller to flush its buffers now.
+        """
+        now = time.time()
+
+        def update(entries):
+            for key, entry in list(entries.items()):
+                if now - entry["updated"] > self._stale_seconds or not _pid_alive(entry["pid"]):
+                    del entries[key]
+
+            previous = entries.get(shard_id, {})
+            entries[shard_id] = {"pid": os.getpid(), "rss": rss, "held": held, "updated": now}
+            flush = previous.get("flush_requested", False) and held >= self._min_flush_bytes
+
+            usage = sum({entry["pid"]: entry["rss"] for entry in entries.values()}.values())
+            if usage > self._budget and not flush:
+                victim = max(entries, key=lambda key: entries[key]["held"])
+                if entries[victim]["held"] >= self._min_flush_bytes:
+                    if victim == shard_id:
+                        flush = True
+                    else:
+                        entries[victim]["flush_requested"] = True
+            return usage, flush
+
+        return self._locked(update)
+
+    def remove(self, shard_id):
+        self._locked(lambda entries: entries.pop(shard_id, None))
@@ -0,0 +1,348 @@
+"""
+In-process polling consumer.
+
+Drives the same RecordProcessor used under the KCL MultiLangDaemon from an
+asyncio GetRecords loop, without a JVM, a subprocess per lease, or base64 JSON
+over stdin/stdout. Shard leases and checkpoints live in a pluggable LeaseStore
+(DynamoDB by default, SQLite locally).
+
+Run with CONSUMER_MODE=polling (see run.sh) or directly:
+    python -u src/poller.py
+"""
+
+# First, so the process start is marked before the heavy imports
+import startup
+import os
+import sys
+import time
+import uuid
+import base64
+import random
+import socket
+import signal
+import asyncio
+import logging
+
+import pyarrow  # noqa: F401
+
+startup.profile.mark("pyarrow_import")
+
+import boto3  # noqa: E402
+from botocore.exceptions import ClientError, HTTPClientError  # noqa: E402
+from botocore.exceptions import ConnectionError as BotocoreConnectionError  # noqa: E402
+
+import aws_utils  # noqa: E402
+from lease_store import SHARD_END, lease_store_from_env  # noqa: E402
+from record_processor import RecordProcessor  # noqa: E402
+
+startup.profile.mark("imports")
+
+logger = logging.getLogger(__name__)
+
+LEASE_DURATION_SECONDS = 30.0
+SHARD_SYNC_INTERVAL_SECONDS = 60.0
+MAX_RECORDS = 10000
+IDLE_TIME_BETWEEN_READS = 0.25
+
+# Kinesis allows 5 GetRecords calls per second per shard
+MIN_TIME_BETWEEN_READS = 0.2
+
+# Throttled and transient Kinesis calls are retried with jittered exponential backoff
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+RETRYABLE_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "LimitExceededException",
+    "KMSThrottlingException",
+    "InternalFailure",
+    "ServiceUnavailable",
+}
+
+
+class Record:
+    """Mirrors the amazon_kclpy record attributes RecordProcessor reads."""
+
+    __slots__ = ("binary_data", "sequence_number", "partition_key", "approximate_arrival_timestamp")
+
+    def __init__(self, raw):
+        self.binary_data = raw["Data"]
+        self.sequence_number = raw["SequenceNumber"]
+        self.partition_key = raw["PartitionKey"]
+        self.approximate_arrival_timestamp = raw.get("ApproximateArrivalTimestamp")
+
+    @property
+    def data(self):
+        return base64.b64encode(self.binary_data).decode()
+
+
+class Checkpointer:
+    def __init__(self, lease_store, shard_id, owner):
+        self._store = lease_store
+        self._shard_id = shard_id
+        self._owner = owner
+        self.last_sequence_number = None
+
+    def checkpoint(self, sequence_number=None, sub_sequence_number=None):
+        sequence_number = sequence_number or self.last_sequence_number
+        if sequence_number is None:
+            return
+        self._store.checkpoint(self._shard_id, self._owner, sequence_number)
+
+
+class ProcessorInput:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class PollingWorker:
+    def __init__(
+        self,
+        stream_name,
+        lease_store,
+        kinesis,
+        processor_factory=RecordProcessor,
+        worker_id=None,
+        max_leases=1024,
+        max_records=MAX_RECORDS,
+        idle_time=IDLE_TIME_BETWEEN_READS,
+        lease_duration=LEASE_DURATION_SECONDS,
+    ):
+        self._stream = stream_name
+        self._store = lease_store
+        self._kinesis = kinesis
+        self._processor_factory = processor_factory
+        self._worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self._max_leases = max_leases
+        self._max_records = max_records
+        self._idle_time = idle_time
+        self._lease_duration = lease_duration
+        self._tasks = {}
+        self._stopping = None
+
+    async def run(self):
+        logger.info(f"Polling worker {self._worker_id} starting on stream {self._stream}")
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        renewer = asyncio.create_task(self._renew_leases())
+        try:
+            while not self._stopping.is_set():
+                await self._sync_shards()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=SHARD_SYNC_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            logger.info("Shutdown requested, draining shard processors")
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        finally:
+            renewer.cancel()
+            for task in self._tasks.values():
+                task.cancel()
+
+    async def _list_shards(self):
+        shards, token = [], None
+        while True:
+            kwargs = {"NextToken": token} if token else {"StreamName": self._stream}
+            resp = await asyncio.to_thread(self._kinesis.list_shards, **kwargs)
+            shards.extend(resp["Shards"])
+            token = resp.get("NextToken")
+            if not token:
+                return shards
+
+    async def _sync_shards(self):
+        for task_shard, task in list(self._tasks.items()):
+            if task.done():
+                del self._tasks[task_shard]
+                # Its lease was released, so the shard is picked up again below
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error(f"Shard processor for {task_shard} failed: {task.exception()!r}")
+
+        shards = await self._list_shards()
+        listed = {shard["ShardId"] for shard in shards}
+        for shard in shards:
+            shard_id = shard["ShardId"]
+            if shard_id in self._tasks or len(self._tasks) >= self._max_leases:
+                continue
+
+            checkpoint = await asyncio.to_thread(self._store.get_checkpoint, shard_id)
+            if checkpoint == SHARD_END or not await self._parents_done(shard, listed):
+                continue
+
+            if await asyncio.to_thread(self._store.try_acquire, shard_id, self._worker_id, self._lease_duration):
+                logger.info(f"Acquired lease for {shard_id}")
+                self._tasks[shard_id] = asyncio.create_task(self._consume(shard_id, checkpoint))
+
+    async def _parents_done(self, shard, listed):
+        # Like KCL, children are only read once their parents have been drained;
+        # parents no longer listed have aged out of the stream's retention.
+        for key in ("ParentShardId", "AdjacentParentShardId"):
+            parent = shard.get(key)
+            if parent in listed and await asyncio.to_thread(self._store.get_checkpoint, parent) != SHARD_END:
+                return False
+        return True
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(self._lease_duration / 3)
+            for shard_id, task in list(self._tasks.items()):
+                if task.done():
+                    continue
+                try:
+                    renewed = await asyncio.to_thread(
+                        self._store.renew, shard_id, self._worker_id, self._lease_duration
+                    )
+                except Exception as e:
+                    # Retried next round; the lease outlives a few missed renewals
+                    logger.error(f"Lease renewal failed for {shard_id}: {e}")
+                    continue
+                if not renewed:
+                    logger.warning(f"Lost lease for {shard_id}")
+                    task.cancel()
+
+    async def _call_kinesis(self, method, **kwargs):
+        delay = RETRY_BASE_SECONDS
+        while True:
+            try:
+                return await asyncio.to_thread(method, **kwargs)
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in RETRYABLE_ERROR_CODES:
+                    raise
+                error = e
+            except (BotocoreConnectionError, HTTPClientError) as e:
+                error = e
+            logger.warning(f"{method.__name__} failed, retrying in {delay:.1f}s: {error}")
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
+
+    async def _call_processor(self, method, processor_input):
+        """
+        Run a processor callback in a thread, off the event loop so lease
+        renewal keeps running. A thread cannot be interrupted: when the shard's
+        task is cancelled this waits for the callback to return before
+        re-raising, so lease_lost and the lease release never overlap with it.
+        """
+        future = asyncio.ensure_future(asyncio.to_thread(method, processor_input))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            while not future.done():
+                try:
+                    await asyncio.wait({future})
+                except asyncio.CancelledError:
+                    pass
+            if future.exception() is not None:
+                logger.error(f"{method.__name__} failed while cancelling: {future.exception()!r}")
+            raise
+
+    async def _shard_iterator(self, shard_id, after_sequence_number):
+        if after_sequence_number:
+            iterator_args = {
+                "ShardIteratorType": "AFTER_SEQUENCE_NUMBER",
+                "StartingSequenceNumber": after_sequence_number,
+            }
+        else:
+            iterator_args = {"ShardIteratorType": "TRIM_HORIZON"}
+        resp = await self._call_kinesis(
+            self._kinesis.get_shard_iterator, StreamName=self._stream, ShardId=shard_id, **iterator_args
+        )
+        return resp["ShardIterator"]
+
+    async def _consume(self, shard_id, checkpoint):
+        processor = self._processor_factory()
+        checkpointer = Checkpointer(self._store, shard_id, self._worker_id)
+        last_read = 0.0
+        ended = False
+
+        try:
+            await self._call_processor(
+                processor.initialize,
+                ProcessorInput(shard_id=shard_id, sequence_number=checkpoint, sub_sequence_number=None),
+            )
+            iterator = await self._shard_iterator(shard_id, checkpoint)
+            while iterator and not self._stopping.is_set():
+                wait = last_read + MIN_TIME_BETWEEN_READS - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                last_read = time.monotonic()
+                try:
+                    resp = await self._call_kinesis(
+                        self._kinesis.get_records, ShardIterator=iterator, Limit=self._max_records
+                    )
+                except ClientError as e:
+                    if e.response["Error"]["Code"] != "ExpiredIteratorException":
+                        raise
+                    # After the last record handed to the processor: records it
+                    # still buffers past the checkpoint must not be read twice
+                    position = checkpointer.last_sequence_number or checkpoint
+                    logger.warning(f"Shard iterator for {shard_id} expired, resuming after {position}")
+                    iterator = await self._shard_iterator(shard_id, position)
+                    continue
+                iterator = resp.get("NextShardIterator")
+                records = [Record(r) for r in resp["Records"]]
+
+                if records:
+                    checkpointer.last_sequence_number = records[-1].sequence_number
+                # Empty batches too, like KCL with callProcessRecordsEvenForEmptyRecordList,
+                # so lag and readiness keep being reported on an idle stream
+                await self._call_processor(
+                    processor.process_records,
+                    ProcessorInput(
+                        records=records,
+                        checkpointer=checkpointer,
+                        millis_behind_latest=resp.get("MillisBehindLatest", 0),
+                    ),
+                )
+
+                if not resp["Records"] or resp.get("MillisBehindLatest", 0) == 0:
+                    await asyncio.sleep(self._idle_time)
+
+            if iterator is None:
+                await self._call_processor(
+                    processor.shard_ended, ProcessorInput(checkpointer=_ShardEndCheckpointer(checkpointer))
+                )
+            else:
+                await self._call_processor(processor.shutdown_requested, ProcessorInput(checkpointer=checkpointer))
+            ended = True
+        finally:
+            try:
+                if not ended:
+                    # Cancelled on a lost lease or failed: release the processor's
+                    # resources without checkpointing, the shard resumes from its
+                    # last checkpoint wherever it is leased next
+                    await self._call_processor(processor.lease_lost, ProcessorInput())
+            finally:
+                await asyncio.to_thread(self._store.release, shard_id, self._worker_id)
+
+
+class _ShardEndCheckpointer:
+    def __init__(self, checkpointer):
+        self._checkpointer = checkpointer
+
+    def checkpoint(self, sequence_number=None, sub_sequence_number=None):
+        self._checkpointer.checkpoint(SHARD_END)
+
+
+def main(processor_factory=RecordProcessor):
+    aws_utils.configure_logging()
+    stream_name = os.environ["KINESIS_STREAM"]
+    application_name = os.environ.get("APPLICATION_NAME", "ConsumerApp")
+
+    worker = PollingWorker(
+        stream_name=stream_name,
+        lease_store=lease_store_from_env(application_name),
+        kinesis=boto3.client("kinesis"),
+        processor_factory=processor_factory,
+    )
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"Polling worker failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
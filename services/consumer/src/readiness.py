@@ -0,0 +1,124 @@
+import os
+import json
+import logging
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessStore(ABC):
+    """
+    Per-shard heartbeats showing the consumer is actually consuming.
+
+    A shard's processor records one after its first successful
+    process_records, empty batches included, and refreshes it while it runs; start_backend reads them
+    to report readiness. A heartbeat is a JSON-serializable dict with at least
+    "shard_id", "task", "started_at", "ready_at" and "heartbeat_at".
+    """
+
+    @abstractmethod
+    def record(self, heartbeat):
+        pass
+
+    @abstractmethod
+    def list(self):
+        pass
+
+
+class FileReadinessStore(ReadinessStore):
+    """
+    Local stand-in for the DynamoDB table: one JSON file per shard in a directory.
+    """
+
+    def __init__(self, directory):
+        self._dir = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, heartbeat):
+        path = os.path.join(self._dir, f"{heartbeat['shard_id']}.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(heartbeat, f)
+        os.replace(tmp, path)
+
+    def list(self):
+        heartbeats = []
+        for name in sorted(os.listdir(self._dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self._dir, name)) as f:
+                    heartbeats.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return heartbeats
+
+
+class DynamoDBReadinessStore(ReadinessStore):
+    """
+    Heartbeats keyed by shard in DynamoDB, the table created on first use.
+    A shard taken over by another task overwrites its previous owner's item.
+    """
+
+    def __init__(self, table_name, dynamodb):
+        self._table = table_name
+        self._ddb = dynamodb
+        self._ready = False
+
+    def _ensure_table(self):
+        if self._ready:
+            return
+        try:
+            self._ddb.describe_table(TableName=self._table)
+        except self._ddb.exceptions.ResourceNotFoundException:
+            logger.info(f"Creating readiness table {self._table}")
+            try:
+                self._ddb.create_table(
+                    TableName=self._table,
+                    AttributeDefinitions=[{"AttributeName": "shard_id", "AttributeType": "S"}],
+                    KeySchema=[{"AttributeName": "shard_id", "KeyType": "HASH"}],
+                    BillingMode="PAY_PER_REQUEST",
+                )
+            except self._ddb.exceptions.ResourceInUseException:
+                # Another shard processor got there first
+                pass
+            self._ddb.get_waiter("table_exists").wait(TableName=self._table)
+        self._ready = True
+
+    def record(self, heartbeat):
+        self._ensure_table()
+        self._ddb.put_item(
+            TableName=self._table,
+            Item={
+                "shard_id": {"S": heartbeat["shard_id"]},
+                "heartbeat": {"S": json.dumps(heartbeat)},
+            },
+        )
+
+    def list(self):
+        heartbeats = []
+        kwargs = {"TableName": self._table}
+        while True:
+            response = self._ddb.scan(**kwargs)
+            heartbeats.extend(json.loads(item["heartbeat"]["S"]) for item in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return heartbeats
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def readiness_store_from_env(application_name):
+    """
+    Build the readiness store selected by READINESS_STORE: "dynamodb"
+    (default, table <application_name>-readiness), "file:<directory>" or
+    "none".
+    """
+    spec = os.environ.get("READINESS_STORE", "dynamodb")
+    if spec == "none":
+        return None
+    if spec.startswith("file:"):
+        return FileReadinessStore(spec[len("file:") :])
+    if spec == "dynamodb":
+        import boto3
+
+        return DynamoDBReadinessStore(f"{application_name}-readiness", boto3.client("dynamodb"))
+    raise ValueError(f"Unknown READINESS_STORE: {spec}")
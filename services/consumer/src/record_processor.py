@@ -1,70 +1,355 @@
+import os
 import time
-import json
 import logging
+from datetime import datetime, timezone
+import startup
 import aws_utils
+import pyarrow as pa
+import pyarrow.compute as pc
 from amazon_kclpy.v3 import processor
+from botocore.exceptions import ClientError
+from clients import s3, S3_BUCKET
+from dead_letter import DeadLetterSink
+from memory_budget import MemoryLedger, arrow_bytes, rss_bytes
+from readiness import readiness_store_from_env
+from decode_pool import acquire_shared_pool, decode_payloads, release_shared_pool
+from rollups import RESOLUTIONS, RollupAggregator
+from snapshot import LatestStateTable, prune_snapshots, read_shard_snapshot, snapshot_key
+from watermark import WatermarkStore, WatermarkTracker
 
 logger = logging.getLogger(__name__)
 
 MAX_BUFFER_SIZE = 1000000
 MAX_BATCH_SECONDS = 300.0
 
+# DECODE_WORKERS > 0 decodes GetRecords batches of at least DECODE_POOL_MIN_RECORDS
+# in a process pool; smaller batches are cheaper to decode inline.
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", "0"))
+DECODE_POOL_MIN_RECORDS = int(os.environ.get("DECODE_POOL_MIN_RECORDS", "2000"))
+
+# Catch-up mode switches on when the shard is more than CATCHUP_ENTER_LAG_SECONDS
+# behind and back off below CATCHUP_EXIT_LAG_SECONDS. While catching up the
+# processor spills in larger chunks, writes larger files, checkpoints every
+# CATCHUP_CHECKPOINT_EVERY flushes and skips per-record error logging.
+CATCHUP_ENTER_LAG_SECONDS = float(os.environ.get("CATCHUP_ENTER_LAG_SECONDS", "300"))
+CATCHUP_EXIT_LAG_SECONDS = float(os.environ.get("CATCHUP_EXIT_LAG_SECONDS", "30"))
+STEADY_SPILL_CHUNK = 1000
+CATCHUP_SPILL_CHUNK = 20000
+CATCHUP_BUFFER_SIZE = 4 * MAX_BUFFER_SIZE
+CATCHUP_CHECKPOINT_EVERY = 4
+
+# Events whose event time trails the shard's watermark by more than
+# ALLOWED_LATENESS_SECONDS are written under late/ instead of raw/ and rollups.
+# The watermark is saved with every checkpoint and restored from it.
+ALLOWED_LATENESS_SECONDS = float(os.environ.get("ALLOWED_LATENESS_SECONDS", "300"))
+
+# Per-entity rollups written next to each raw upload under rollup/<resolution>/.
+# ROLLUP_RESOLUTIONS is a comma separated subset of RESOLUTIONS; empty disables.
+# A shard flushes early once a resolution holds ROLLUP_MAX_BUCKETS buckets.
+ROLLUP_RESOLUTIONS = os.environ.get("ROLLUP_RESOLUTIONS", ",".join(RESOLUTIONS))
+ROLLUP_MAX_BUCKETS = int(os.environ.get("ROLLUP_MAX_BUCKETS", "200000"))
+
+# Latest state per entity is written to snapshot/shard=<id>/ after an upload at
+# most every SNAPSHOT_INTERVAL_SECONDS, and always at shard end or shutdown; 0 disables.
+SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get("SNAPSHOT_INTERVAL_SECONDS", "300"))
+
+# Shard processors on a task share CONSUMER_MEMORY_BUDGET_MIB of RSS (0 disables)
+# through a file ledger. Over budget, the shard holding the most payload bytes
+# since its last upload flushes early. Memory metrics go out every
+# MEMORY_METRICS_INTERVAL_SECONDS.
+CONSUMER_MEMORY_BUDGET_MIB = int(os.environ.get("CONSUMER_MEMORY_BUDGET_MIB", "3072"))
+MEMORY_LEDGER_PATH = os.environ.get("MEMORY_LEDGER_PATH", "/tmp/consumer-memory-ledger.json")
+MEMORY_CHECK_INTERVAL_SECONDS = 1.0
+MEMORY_METRICS_INTERVAL_SECONDS = 60.0
+
+# Lag metrics go out every LAG_METRICS_INTERVAL_SECONDS between flushes, empty
+# batches included; the consumer service scales on iterator_age_seconds.
+LAG_METRICS_INTERVAL_SECONDS = 60.0
+
+# Uploads and checkpoints run with ECS scale-in protection on, shared by the
+# task's shard processes through TASK_PROTECTION_PATH. Protection lapses after
+# TASK_PROTECTION_MINUTES if a process dies holding it.
+TASK_PROTECTION_PATH = os.environ.get("TASK_PROTECTION_PATH", "/tmp/consumer-task-protection.json")
+TASK_PROTECTION_MINUTES = int(os.environ.get("TASK_PROTECTION_MINUTES", "30"))
+
+# Each shard records a readiness heartbeat (READINESS_STORE, see readiness.py)
+# after its first successful batch and then with every lag report, for
+# start_backend's status mode. Empty batches count, so an idle stream is ready.
+APPLICATION_NAME = os.environ.get("APPLICATION_NAME", "ConsumerApp")
+
 
 class RecordProcessor(processor.RecordProcessorBase):
     def __init__(self):
-        self._spiller = aws_utils.ParquetSpiller(batch_size_threshold=1000)
+        resolutions = [name for name in ROLLUP_RESOLUTIONS.split(",") if name]
+        self._rollups = (
+            RollupAggregator(
+                resolutions={name: RESOLUTIONS[name] for name in resolutions},
+                allowed_lateness=ALLOWED_LATENESS_SECONDS,
+                max_buckets=ROLLUP_MAX_BUCKETS,
+            )
+            if resolutions
+            else None
+        )
+        self._latest = LatestStateTable() if SNAPSHOT_INTERVAL_SECONDS > 0 else None
+        self._last_snapshot_time = time.time()
+        self._watermark = WatermarkTracker(ALLOWED_LATENESS_SECONDS)
+        self._watermarks = None
+        self._dead_letters = DeadLetterSink()
+        self._late_spiller = aws_utils.ParquetSpiller(
+            prefix="late",
+            partition_by_event_time=False,
+            on_table=self._latest.update if self._latest is not None else None,
+        )
+        self._spiller = aws_utils.ParquetSpiller(
+            batch_size_threshold=STEADY_SPILL_CHUNK,
+            on_table=self._on_spilled_table,
+            watermark=self._watermark,
+            late_spiller=self._late_spiller,
+        )
         self._last_flush_time = time.time()
         self._total_events = 0
         self._start_time = time.time()
         self._shard_id = None
+        self._last_sequence = None
         self._items_since_last_flush = 0
+        self._records_in_file = 0
+        self._held_bytes = 0
+        self._memory_ledger = (
+            MemoryLedger(MEMORY_LEDGER_PATH, CONSUMER_MEMORY_BUDGET_MIB * 1024 * 1024)
+            if CONSUMER_MEMORY_BUDGET_MIB > 0
+            else None
+        )
+        self._last_memory_check = 0.0
+        self._last_memory_metrics = 0.0
+        self._forced_flushes = 0
+        self._last_lag_metrics = 0.0
+        self._readiness = readiness_store_from_env(APPLICATION_NAME)
+        self._startup_marks = {}
+        self._ready_at = None
+        self._task = None
+        self._task_protection = aws_utils.TaskProtection(TASK_PROTECTION_PATH, TASK_PROTECTION_MINUTES)
+        self._decode_pool = acquire_shared_pool(DECODE_WORKERS) if DECODE_WORKERS > 0 else None
+        self._catching_up = False
+        self._mode_changed_at = time.time()
+        self._flushes_since_checkpoint = 0
 
     def initialize(self, initialization_input):
         self._shard_id = initialization_input.shard_id
+        self._spiller.set_shard_id(self._shard_id)
+        self._late_spiller.set_shard_id(self._shard_id)
+        self._dead_letters.set_shard_id(self._shard_id)
         logger.info(f"Initializing RecordProcessor for shard: {self._shard_id}")
+        self._watermarks = WatermarkStore(s3, S3_BUCKET, self._shard_id)
+        try:
+            state = self._watermarks.load(initialization_input.sequence_number)
+            if state is not None:
+                self._watermark.restore(state)
+                logger.info(f"Restored watermark {self._watermark.watermark} at {initialization_input.sequence_number}")
+        except Exception as e:
+            logger.error(f"Failed to load watermark for {self._shard_id}, starting empty: {e}")
+        if self._latest is not None:
+            try:
+                snapshot = read_shard_snapshot(s3, S3_BUCKET, self._shard_id)
+                if snapshot is not None:
+                    self._latest.update(snapshot)
+                logger.info(f"Seeded latest state of {len(self._latest)} entities from snapshot")
+            except Exception as e:
+                logger.error(f"Failed to load snapshot for {self._shard_id}, starting empty: {e}")
+        self._startup_marks["initialize"] = time.time()
 
     def process_records(self, process_records_input):
         records = process_records_input.records
         millis_behind_latest = process_records_input.millis_behind_latest
         checkpointer = process_records_input.checkpointer
 
-        parsed_records = []
+        lag_seconds = millis_behind_latest / 1000.0
+        if self._update_mode(lag_seconds):
+            self._flush_and_checkpoint(checkpointer, lag_seconds, force_checkpoint=True)
 
-        for r in records:
-            try:
-                data = json.loads(r.binary_data)
-                evt = data.get("event", {})
-                entity = evt.get("data", {}).get("entity_id")
+        # Files end every max_buffer Kinesis records after a checkpoint, so a replay
+        # usually cuts the same object keys. Early flushes (rollups full, memory
+        # pressure) and mode switches depend on batching, so replays are not
+        # idempotent; see "Object keys and replays" in the README.
+        start = 0
+        while start < len(records):
+            max_buffer = CATCHUP_BUFFER_SIZE if self._catching_up else MAX_BUFFER_SIZE
+            end = min(len(records), start + max_buffer - self._records_in_file)
+            self._spill(records[start:end])
+            start = end
+            if self._should_flush():
+                self._flush_and_checkpoint(checkpointer, lag_seconds)
 
-                if not entity:
-                    continue
+        self._check_memory(checkpointer, lag_seconds)
+        self._mark_ready()
+        self._report_lag(lag_seconds)
 
-                parsed_records.append({"data": data})
+    def _mark_ready(self):
+        if self._ready_at is not None:
+            return
+        self._ready_at = time.time()
+        self._startup_marks["first_batch"] = self._ready_at
+        self._task = aws_utils.task_arn() or f"{os.uname().nodename}:{os.getpid()}"
+        phases = startup.profile.phases(self._startup_marks)
+        time_to_ready = self._ready_at - startup.profile.started_at
+        logger.info(
+            f"Consuming {self._shard_id} {time_to_ready:.1f}s after start: "
+            + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phases.items())
+        )
+        aws_utils.emit_startup(phases, time_to_ready, shard_id=self._shard_id)
 
-            except Exception as e:
-                logger.error(
-                    f"Record decode error: {e}. Data type: {type(r.data)}. Data: {r.data!r}"
-                )
+    def _report_lag(self, lag_seconds):
+        now = time.time()
+        if now - self._last_lag_metrics < LAG_METRICS_INTERVAL_SECONDS:
+            return
+        self._last_lag_metrics = now
+        elapsed = now - self._start_time
+        aws_utils.emit_lag(
+            iterator_age=lag_seconds,
+            processing_rate=self._total_events / elapsed if elapsed > 0 else 0,
+            shard_id=self._shard_id,
+        )
+        self._record_heartbeat(now, lag_seconds)
+
+    def _record_heartbeat(self, now, lag_seconds):
+        if self._readiness is None or self._ready_at is None:
+            return
+        try:
+            self._readiness.record(
+                {
+                    "shard_id": self._shard_id,
+                    "task": self._task,
+                    "started_at": startup.profile.started_at,
+                    "ready_at": self._ready_at,
+                    "heartbeat_at": now,
+                    "iterator_age_seconds": lag_seconds,
+                    "phases": startup.profile.phases(self._startup_marks),
+                }
+            )
+        except Exception as e:
+            logger.error(f"Readiness heartbeat failed for {self._shard_id}: {e}")
+
+    def _spill(self, records):
+        payloads = [r.binary_data for r in records]
+
+        if self._decode_pool and len(payloads) >= DECODE_POOL_MIN_RECORDS:
+            parsed_count, rejects = self._decode_pool.decode(payloads, self._spiller.add_table)
+        else:
+            parsed_records, rejects = decode_payloads(payloads)
+            for item in parsed_records:
+                self._spiller.add_record(item)
+            parsed_count = len(parsed_records)
+
+        for index, reason, detail in rejects:
+            self._dead_letters.add(records[index], reason, detail)
 
-        for item in parsed_records:
-            self._spiller.add_record(item)
+        first, last = records[0].sequence_number, records[-1].sequence_number
+        self._last_sequence = last
+        self._spiller.note_sequence_range(first, last)
+        self._late_spiller.note_sequence_range(first, last)
+        self._dead_letters.note_sequence_range(first, last)
+        self._records_in_file += len(records)
+        self._held_bytes += sum(len(payload) for payload in payloads)
+        self._total_events += parsed_count
+        self._items_since_last_flush += parsed_count
 
-        self._total_events += len(parsed_records)
-        self._items_since_last_flush += len(parsed_records)
+    def _flush_and_checkpoint(self, checkpointer, lag_seconds, force_checkpoint=False):
+        sequence_range = self._spiller.sequence_range
+        if sequence_range is None:
+            return
+
+        with self._task_protection.hold(self._shard_id):
+            self._flush_buffer(lag_seconds)
+            self._flushes_since_checkpoint += 1
+            if (
+                force_checkpoint
+                or not self._catching_up
+                or self._flushes_since_checkpoint >= CATCHUP_CHECKPOINT_EVERY
+            ):
+                try:
+                    # The last record of the uploaded file, not of the GetRecords batch
+                    self._checkpoint(checkpointer, sequence_range[1])
+                    self._flushes_since_checkpoint = 0
+                except Exception as e:
+                    logger.error(f"Checkpoint failed: {e}")
 
-        if self._should_flush():
-            self._flush_buffer(millis_behind_latest / 1000.0)
+    def _checkpoint(self, checkpointer, sequence_number=None):
+        """
+        Checkpoint at sequence_number (default: the last record handed over),
+        saving the watermark first so a replay from here routes late rows the
+        same way. A watermark that cannot be saved is logged and the
+        checkpoint goes ahead; a replay from it then starts with no watermark.
+        """
+        position = sequence_number or self._last_sequence
+        if position is not None:
             try:
-                checkpointer.checkpoint()
-            except Exception as e:
-                logger.error(f"Checkpoint failed: {e}")
+                self._watermarks.record(position, self._watermark.state())
+            except ClientError as e:
+                logger.error(f"Failed to save watermark for {self._shard_id} at {position}: {e}")
+        if sequence_number is None:
+            checkpointer.checkpoint()
+        else:
+            checkpointer.checkpoint(sequence_number)
+
+    def _on_spilled_table(self, table):
+        if self._rollups:
+            self._rollups.add_table(table)
+        if self._latest is not None:
+            self._latest.update(table)
+
+    def _check_memory(self, checkpointer, lag_seconds):
+        now = time.time()
+        if self._memory_ledger is None or now - self._last_memory_check < MEMORY_CHECK_INTERVAL_SECONDS:
+            return
+        self._last_memory_check = now
+
+        rss = rss_bytes()
+        try:
+            usage, flush = self._memory_ledger.report(self._shard_id, rss, self._held_bytes)
+        except OSError as e:
+            logger.error(f"Memory ledger update failed: {e}")
+            return
+
+        if flush:
+            logger.warning(
+                f"Task memory {usage / 2**20:.0f} MiB over the {CONSUMER_MEMORY_BUDGET_MIB} MiB budget, "
+                f"flushing shard {self._shard_id} early ({self._held_bytes / 2**20:.0f} MiB held)"
+            )
+            self._forced_flushes += 1
+            self._flush_and_checkpoint(checkpointer, lag_seconds, force_checkpoint=True)
+            pa.default_memory_pool().release_unused()
+
+        if now - self._last_memory_metrics >= MEMORY_METRICS_INTERVAL_SECONDS:
+            aws_utils.emit_memory(
+                rss=rss,
+                arrow_allocated=arrow_bytes(),
+                held=self._held_bytes,
+                task_usage=usage,
+                forced_flushes=self._forced_flushes,
+                shard_id=self._shard_id,
+            )
+            self._forced_flushes = 0
+            self._last_memory_metrics = now
+
+    def _leave_memory_ledger(self):
+        if self._memory_ledger is None:
+            return
+        try:
+            self._memory_ledger.remove(self._shard_id)
+        except OSError as e:
+            logger.error(f"Memory ledger update failed: {e}")
 
     def lease_lost(self, lease_lost_input):
         logger.info("Lease lost")
+        self._close_decode_pool()
+        self._leave_memory_ledger()
 
     def shard_ended(self, shard_ended_input):
         logger.info("Shard ended")
-        self._flush_buffer(0.0)
+        with self._task_protection.hold(self._shard_id):
+            self._flush_buffer(0.0)
+            self._write_snapshot(final=True)
+        self._close_decode_pool()
+        self._leave_memory_ledger()
         try:
             shard_ended_input.checkpointer.checkpoint()
         except Exception as e:
@@ -73,28 +358,93 @@ class RecordProcessor(processor.RecordProcessorBase):
     def shutdown_requested(self, shutdown_requested_input):
         logger.info("Shutdown requested")
         self._flush_buffer(0.0)
+        self._write_snapshot()
+        self._close_decode_pool()
+        self._leave_memory_ledger()
         try:
-            shutdown_requested_input.checkpointer.checkpoint()
+            self._checkpoint(shutdown_requested_input.checkpointer)
         except Exception as e:
             logger.error(f"Checkpoint failed at shutdown: {e}")
 
+    def _close_decode_pool(self):
+        if self._decode_pool:
+            release_shared_pool()
+            self._decode_pool = None
+
+    def _update_mode(self, lag_seconds):
+        """Switch between steady and catch-up settings; True when leaving catch-up."""
+        if self._catching_up:
+            if lag_seconds > CATCHUP_EXIT_LAG_SECONDS:
+                return False
+        elif lag_seconds < CATCHUP_ENTER_LAG_SECONDS:
+            return False
+
+        now = time.time()
+        self._catching_up = not self._catching_up
+        self._dead_letters.quiet = self._catching_up
+        self._spiller.set_batch_size_threshold(
+            CATCHUP_SPILL_CHUNK if self._catching_up else STEADY_SPILL_CHUNK
+        )
+        logger.info(
+            f"Shard {self._shard_id} {'entering' if self._catching_up else 'leaving'} "
+            f"catch-up mode at {lag_seconds:.1f}s behind"
+        )
+        aws_utils.emit_mode_transition(
+            catching_up=self._catching_up,
+            iterator_age=lag_seconds,
+            previous_mode_seconds=now - self._mode_changed_at,
+        )
+        self._mode_changed_at = now
+        return not self._catching_up
+
+    def _write_snapshot(self, final=False):
+        if self._latest is None or len(self._latest) == 0:
+            return
+        try:
+            aws_utils.put_table(
+                self._latest.to_table(), snapshot_key(self._shard_id, datetime.now(timezone.utc), final)
+            )
+            self._last_snapshot_time = time.time()
+        except Exception as e:
+            logger.error(f"Snapshot upload failed: {e}")
+            return
+        try:
+            prune_snapshots(s3, S3_BUCKET, self._shard_id)
+        except Exception as e:
+            logger.error(f"Failed to prune old snapshots of {self._shard_id}: {e}")
+
     def _should_flush(self):
-        if self._items_since_last_flush == 0:
+        if self._records_in_file == 0:
             return False
 
-        count_exceeded = self._items_since_last_flush >= MAX_BUFFER_SIZE
+        max_buffer = CATCHUP_BUFFER_SIZE if self._catching_up else MAX_BUFFER_SIZE
+        count_exceeded = self._records_in_file >= max_buffer
+        if not count_exceeded and self._rollups is not None and self._rollups.full:
+            logger.info(f"Rollup buckets of {self._shard_id} at {ROLLUP_MAX_BUCKETS}, flushing early")
+            return True
         # not implementing time based flushing to stress-test buffer flushing
         # time_exceeded = (time.time() - self._last_flush_time) >= MAX_BATCH_SECONDS
 
         return count_exceeded
 
     def _flush_buffer(self, iterator_age_seconds):
-        if self._items_since_last_flush == 0:
+        if self._records_in_file == 0:
             return
 
         flush_start = time.time()
 
+        sequence_range = self._spiller.sequence_range
         self._spiller.close_and_upload()
+        self._late_spiller.close_and_upload()
+        self._dead_letters.close_and_upload()
+        if self._rollups:
+            name = aws_utils.sequence_range_name(self._shard_id, *sequence_range)
+            for resolution, table in self._rollups.drain(self._watermark.watermark).items():
+                aws_utils.upload_table(
+                    table, f"rollup/{resolution}", when=pc.min(table["bucket_start"]).as_py(), name=name
+                )
+        if time.time() - self._last_snapshot_time >= SNAPSHOT_INTERVAL_SECONDS:
+            self._write_snapshot()
 
         flush_end = time.time()
 
@@ -106,6 +456,14 @@ class RecordProcessor(processor.RecordProcessorBase):
             total_events=self._total_events,
             start_time=self._start_time,
         )
+        aws_utils.emit_watermark(
+            watermark_lag=self._watermark.lag_seconds(),
+            late_events=self._watermark.take_late_count(),
+            shard_id=self._shard_id,
+        )
+        aws_utils.emit_dead_letters(self._dead_letters.take_counts(), shard_id=self._shard_id)
 
         self._items_since_last_flush = 0
+        self._records_in_file = 0
+        self._held_bytes = 0
         self._last_flush_time = time.time()
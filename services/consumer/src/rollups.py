@@ -0,0 +1,201 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from typed_columns import EVENT_TIME_TYPE
+
+RESOLUTIONS = {"1m": 60, "1h": 3600}
+
+ROLLUP_SCHEMA = pa.schema(
+    [
+        ("entity_id", pa.string()),
+        ("bucket_start", EVENT_TIME_TYPE),
+        ("count", pa.int64()),
+        ("min", pa.float64()),
+        ("max", pa.float64()),
+        ("sum", pa.float64()),
+        ("first", pa.float64()),
+        ("first_time", EVENT_TIME_TYPE),
+        ("last", pa.float64()),
+        ("last_time", EVENT_TIME_TYPE),
+        ("final", pa.bool_()),
+    ]
+)
+
+# Accumulator slots: [count, min, max, sum, first, first_time, last, last_time]
+_COUNT, _MIN, _MAX, _SUM, _FIRST, _FIRST_TIME, _LAST, _LAST_TIME = range(8)
+
+
+def _merge(acc, other):
+    acc[_COUNT] += other[_COUNT]
+    acc[_MIN] = min(acc[_MIN], other[_MIN])
+    acc[_MAX] = max(acc[_MAX], other[_MAX])
+    acc[_SUM] += other[_SUM]
+    if other[_FIRST_TIME] < acc[_FIRST_TIME]:
+        acc[_FIRST], acc[_FIRST_TIME] = other[_FIRST], other[_FIRST_TIME]
+    if other[_LAST_TIME] >= acc[_LAST_TIME]:
+        acc[_LAST], acc[_LAST_TIME] = other[_LAST], other[_LAST_TIME]
+
+
+def _chunk_aggregates(table, seconds):
+    """Per (entity_id, bucket_start) aggregates of one typed spill chunk."""
+    times = pc.cast(table["event_time"], pa.int64())
+    bucket = pc.multiply(pc.divide(times, seconds * 1_000_000), seconds * 1_000_000)
+    keyed = pa.table(
+        {
+            "entity_id": table["entity_id"],
+            "bucket": bucket,
+            "value": table["value_float"],
+            "time": times,
+        }
+    )
+    # first/last follow row order, so order by event time (stable for ties)
+    keyed = keyed.take(pc.sort_indices(keyed, [("time", "ascending")]))
+    grouped = keyed.group_by(["entity_id", "bucket"], use_threads=False).aggregate(
+        [
+            ("value", "count"),
+            ("value", "min"),
+            ("value", "max"),
+            ("value", "sum"),
+            ("value", "first"),
+            ("time", "min"),
+            ("value", "last"),
+            ("time", "max"),
+        ]
+    )
+    return zip(
+        grouped["entity_id"].to_pylist(),
+        grouped["bucket"].to_pylist(),
+        grouped["value_count"].to_pylist(),
+        grouped["value_min"].to_pylist(),
+        grouped["value_max"].to_pylist(),
+        grouped["value_sum"].to_pylist(),
+        grouped["value_first"].to_pylist(),
+        grouped["time_min"].to_pylist(),
+        grouped["value_last"].to_pylist(),
+        grouped["time_max"].to_pylist(),
+    )
+
+
+class RollupAggregator:
+    """
+    Incremental per-entity rollups of numeric states (value_float).
+
+    Spill chunks are aggregated with pyarrow.compute and merged into per
+    (entity, bucket) accumulators holding count, min, max, sum, first and last.
+    `drain()` hands back everything accumulated so far as one table per
+    resolution and starts over, so state never outlives a checkpoint. Rows
+    are mergeable partials: a bucket spanning several drains, or receiving late
+    events after its first emission, shows up more than once and is combined by
+    `merge_partials`. Rows are flagged `final` once the bucket end is more than
+    `allowed_lateness` behind the newest event time seen.
+
+    `full` turns True once a resolution holds `max_buckets` accumulators; the
+    owner drains then, so memory stays bounded by the cap plus whatever is
+    added between checks.
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS, allowed_lateness=300.0, max_buckets=200000):
+        self._resolutions = dict(resolutions)
+        self._allowed_lateness_us = int(allowed_lateness * 1_000_000)
+        self._max_buckets = max_buckets
+        self._buckets = {name: {} for name in self._resolutions}
+        self._max_event_time = None
+
+    def add_table(self, table):
+        """Fold a typed spill chunk (entity_id, event_time, value_float) into the rollups."""
+        if "value_float" not in table.column_names:
+            return
+        mask = pc.and_(
+            pc.and_(pc.is_valid(table["entity_id"]), pc.is_valid(table["event_time"])),
+            pc.is_valid(table["value_float"]),
+        )
+        table = table.select(["entity_id", "event_time", "value_float"]).filter(mask)
+        if table.num_rows == 0:
+            return
+
+        newest = pc.max(pc.cast(table["event_time"], pa.int64())).as_py()
+        if self._max_event_time is None or newest > self._max_event_time:
+            self._max_event_time = newest
+
+        for name, seconds in self._resolutions.items():
+            buckets = self._buckets[name]
+            for entity, bucket, *values in _chunk_aggregates(table, seconds):
+                key = (entity, bucket)
+                acc = buckets.get(key)
+                if acc is None:
+                    buckets[key] = values
+                else:
+                    _merge(acc, values)
+
+    @property
+    def full(self):
+        return any(len(buckets) >= self._max_buckets for buckets in self._buckets.values())
+
+    def drain(self, watermark=None):
+        """
+        Return {resolution: table} of all accumulated partials and reset.
+        `watermark` (epoch microseconds) overrides the aggregator's own estimate
+        for the `final` flags, e.g. a shard's WatermarkTracker.
+        """
+        if watermark is None:
+            watermark = (self._max_event_time or 0) - self._allowed_lateness_us
+        out = {}
+        for name, seconds in self._resolutions.items():
+            rows = list(self._buckets[name].items())
+            self._buckets[name] = {}
+            if rows:
+                out[name] = self._to_table(rows, seconds, watermark)
+        return out
+
+    def _to_table(self, rows, seconds, watermark):
+        bucket_us = seconds * 1_000_000
+        columns = [[] for _ in ROLLUP_SCHEMA]
+        for (entity, bucket), acc in rows:
+            columns[0].append(entity)
+            columns[1].append(bucket)
+            for i, value in enumerate(acc):
+                columns[i + 2].append(value)
+            columns[10].append(bucket + bucket_us <= watermark)
+        arrays = []
+        for column, field in zip(columns, ROLLUP_SCHEMA):
+            if field.type == EVENT_TIME_TYPE:
+                arrays.append(pa.array(column, pa.int64()).cast(field.type))
+            else:
+                arrays.append(pa.array(column, field.type))
+        return pa.Table.from_arrays(arrays, schema=ROLLUP_SCHEMA)
+
+
+def merge_partials(table):
+    """
+    Combine rollup partials (e.g. every file under rollup/1m/ for a day) into
+    one row per (entity_id, bucket_start).
+    """
+    keys = ["entity_id", "bucket_start"]
+    totals = table.group_by(keys, use_threads=False).aggregate(
+        [("count", "sum"), ("min", "min"), ("max", "max"), ("sum", "sum"), ("final", "max")]
+    )
+    firsts = (
+        table.take(pc.sort_indices(table, [("first_time", "ascending")]))
+        .group_by(keys, use_threads=False)
+        .aggregate([("first", "first"), ("first_time", "min")])
+    )
+    lasts = (
+        table.take(pc.sort_indices(table, [("last_time", "ascending")]))
+        .group_by(keys, use_threads=False)
+        .aggregate([("last", "last"), ("last_time", "max")])
+    )
+    merged = totals.join(firsts, keys).join(lasts, keys)
+    merged = merged.rename_columns(
+        {
+            "count_sum": "count",
+            "min_min": "min",
+            "max_max": "max",
+            "sum_sum": "sum",
+            "final_max": "final",
+            "first_first": "first",
+            "first_time_min": "first_time",
+            "last_last": "last",
+            "last_time_max": "last_time",
+        }
+    )
+    return merged.select(ROLLUP_SCHEMA.names).sort_by([(key, "ascending") for key in keys])
@@ -0,0 +1,260 @@
+"""
+Latest-state snapshots.
+
+Each shard processor keeps the newest state of every entity it has seen in a
+LatestStateTable and periodically writes it to
+snapshot/shard=<shard_id>/<timestamp>.parquet, the last one of a closed shard
+as <timestamp>.final.parquet, then prunes all but the newest SNAPSHOTS_KEPT of
+them. `load_current_state` answers "current state of
+every entity" from the newest snapshot of each shard plus the raw/ and late/
+files each shard uploaded after it.
+"""
+
+import io
+import logging
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from typed_columns import EVENT_TIME_TYPE, state_column
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = "snapshot"
+FINAL_SUFFIX = ".final.parquet"
+# Snapshots kept per shard after a new one is written; the one before the newest
+# stays so a reader that listed just before the write can still fetch it
+SNAPSHOTS_KEPT = 2
+NO_TIME = -(2**63)
+
+SNAPSHOT_SCHEMA = pa.schema(
+    [
+        ("entity_id", pa.string()),
+        ("event_time", EVENT_TIME_TYPE),
+        ("state", pa.string()),
+        ("value_float", pa.float64()),
+        ("unit", pa.string()),
+        ("is_unavailable", pa.bool_()),
+    ]
+)
+_COLUMNS = SNAPSHOT_SCHEMA.names
+
+
+def _latest_rows(table):
+    """Reduce a typed chunk to its newest row per entity (last wins on ties)."""
+    if "data" in table.column_names:
+        data = table["data"]
+        if isinstance(data, pa.ChunkedArray):
+            data = data.combine_chunks()
+        table = table.append_column("state", state_column(data))
+
+    table = table.select(_COLUMNS)
+    table = table.filter(pc.and_(pc.is_valid(table["entity_id"]), pc.is_valid(table["event_time"])))
+    table = table.take(pc.sort_indices(table, [("event_time", "ascending")]))
+    grouped = table.group_by("entity_id", use_threads=False).aggregate(
+        [(name, "last") for name in _COLUMNS[1:]]
+    )
+    return grouped.rename_columns({f"{name}_last": name for name in _COLUMNS[1:]})
+
+
+class LatestStateTable:
+    """
+    Last value per entity in flat arrays indexed by an interned entity id, so
+    the per-entity cost is one dict slot plus a row of array entries.
+    """
+
+    def __init__(self):
+        self._index = {}
+        self._entities = []
+        self._times = array("q")
+        self._values = array("d")
+        self._states = []
+        self._units = []
+        self._unavailable = bytearray()
+
+    def __len__(self):
+        return len(self._entities)
+
+    def _intern(self, entity):
+        idx = self._index.get(entity)
+        if idx is None:
+            idx = self._index[entity] = len(self._entities)
+            self._entities.append(entity)
+            self._times.append(NO_TIME)
+            self._values.append(float("nan"))
+            self._states.append(None)
+            self._units.append(None)
+            self._unavailable.append(1)
+        return idx
+
+    def update(self, table):
+        """Fold a typed spill chunk (or a snapshot table) into the table."""
+        if "entity_id" not in table.column_names or "event_time" not in table.column_names:
+            return
+        latest = _latest_rows(table)
+        times = pc.cast(latest["event_time"], pa.int64()).to_pylist()
+        for entity, time, state, value, unit, unavailable in zip(
+            latest["entity_id"].to_pylist(),
+            times,
+            latest["state"].to_pylist(),
+            latest["value_float"].to_pylist(),
+            latest["unit"].to_pylist(),
+            latest["is_unavailable"].to_pylist(),
+        ):
+            idx = self._intern(entity)
+            if time < self._times[idx]:
+                continue
+            self._times[idx] = time
+            self._values[idx] = float("nan") if value is None else value
+            self._states[idx] = state
+            self._units[idx] = unit
+            self._unavailable[idx] = 1 if unavailable or unavailable is None else 0
+
+    def to_table(self):
+        values = pa.array(self._values, pa.float64())
+        return pa.Table.from_arrays(
+            [
+                pa.array(self._entities, pa.string()),
+                pa.array(self._times, pa.int64()).cast(EVENT_TIME_TYPE),
+                pa.array(self._states, pa.string()),
+                pc.if_else(pc.is_nan(values), None, values),
+                pa.array(self._units, pa.string()),
+                pa.array([bool(flag) for flag in self._unavailable], pa.bool_()),
+            ],
+            schema=SNAPSHOT_SCHEMA,
+        )
+
+
+def snapshot_key(shard_id, when, final=False):
+    """Snapshot object key; `final` marks the last snapshot of a shard that has ended."""
+    timestamp = when.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+    return f"{SNAPSHOT_PREFIX}/shard={shard_id}/{timestamp}{FINAL_SUFFIX if final else '.parquet'}"
+
+
+def _shard_of(key):
+    """The shard a raw/ or late/ object belongs to, None for keys without one."""
+    for part in key.split("/"):
+        if part.startswith("shard="):
+            return part[len("shard=") :]
+    return None
+
+
+def list_objects(s3, bucket, prefix):
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        yield from page.get("Contents", [])
+
+
+def read_parquet(s3, bucket, key, columns=None):
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    return pq.read_table(io.BytesIO(body), columns=columns)
+
+
+def newest_snapshots(s3, bucket, shard_id=None):
+    """{shard_id: S3 object summary} of the newest snapshot per shard."""
+    prefix = f"{SNAPSHOT_PREFIX}/shard={shard_id}/" if shard_id else f"{SNAPSHOT_PREFIX}/"
+    newest = {}
+    for obj in list_objects(s3, bucket, prefix):
+        shard = obj["Key"].split("/")[1][len("shard=") :]
+        if shard not in newest or obj["Key"] > newest[shard]["Key"]:
+            newest[shard] = obj
+    return newest
+
+
+def prune_snapshots(s3, bucket, shard_id, keep=SNAPSHOTS_KEPT):
+    """Delete all but the shard's `keep` newest snapshots; returns the deleted keys."""
+    keys = sorted(obj["Key"] for obj in list_objects(s3, bucket, f"{SNAPSHOT_PREFIX}/shard={shard_id}/"))
+    stale = keys[:-keep]
+    for start in range(0, len(stale), 1000):
+        s3.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": [{"Key": key} for key in stale[start : start + 1000]], "Quiet": True},
+        )
+    return stale
+
+
+def read_shard_snapshot(s3, bucket, shard_id):
+    """The shard's newest snapshot table, or None."""
+    snapshot = newest_snapshots(s3, bucket, shard_id).get(shard_id)
+    if snapshot is None:
+        return None
+    return read_parquet(s3, bucket, snapshot["Key"])
+
+
+def _day_prefixes(prefix, start, end):
+    day = start.date()
+    while day <= end.date():
+        yield f"{prefix}/year={day.year}/month={day.month:02d}/day={day.day:02d}/"
+        day += timedelta(days=1)
+
+
+# Typed columns load_current_state reads; files without them (written before
+# typed columns existed) are skipped
+STATE_COLUMNS = [
+    "entity_id",
+    "event_time",
+    "value_float",
+    "unit",
+    "is_unavailable",
+    "data.event.data.new_state.state",
+]
+
+
+def _read_state_columns(s3, bucket, key):
+    """STATE_COLUMNS of a raw/ or late/ file, or None if it lacks any of them."""
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    parquet = pq.ParquetFile(io.BytesIO(body))
+    available = set(parquet.schema_arrow.names)
+    available.update(parquet.schema.column(i).path for i in range(len(parquet.schema)))
+    if not available.issuperset(STATE_COLUMNS):
+        return None
+    return parquet.read(columns=STATE_COLUMNS)
+
+
+def load_current_state(s3, bucket, lookback_days=1, max_lookback_days=7, now=None):
+    """
+    Latest state of every entity: the newest snapshot of every shard, plus
+    the raw/ and late/ files each shard uploaded after its snapshot.
+
+    Files are listed from the oldest snapshot of a shard that has not ended,
+    and never from more than `max_lookback_days` back; without such a
+    snapshot, from `lookback_days` back. raw/ is partitioned by event time, so
+    its day partitions are listed from a further `lookback_days` earlier; raw
+    files uploaded later whose events are all older than that are not read.
+    Files of shards without a snapshot, or with no shard in their key, are read
+    when uploaded after the listing start.
+    """
+    now = now or datetime.now(timezone.utc)
+    snapshots = newest_snapshots(s3, bucket)
+    state = LatestStateTable()
+    for obj in snapshots.values():
+        state.update(read_parquet(s3, bucket, obj["Key"]))
+
+    # Closed parent shards stop writing snapshots after a reshard and have
+    # nothing newer to read, so they do not hold the listing start back
+    open_snapshots = [obj["LastModified"] for obj in snapshots.values() if not obj["Key"].endswith(FINAL_SUFFIX)]
+    start = min(open_snapshots) if open_snapshots else now - timedelta(days=lookback_days)
+    start = max(start, now - timedelta(days=max_lookback_days))
+    cutoffs = {shard: obj["LastModified"] for shard, obj in snapshots.items()}
+
+    prefixes = list(_day_prefixes("raw", start - timedelta(days=lookback_days), now))
+    prefixes += list(_day_prefixes("late", start, now))
+
+    files = skipped = 0
+    for prefix in prefixes:
+        for obj in list_objects(s3, bucket, prefix):
+            if obj["LastModified"] < cutoffs.get(_shard_of(obj["Key"]), start):
+                continue
+            table = _read_state_columns(s3, bucket, obj["Key"])
+            if table is None:
+                skipped += 1
+                continue
+            state.update(table)
+            files += 1
+    logger.info(
+        f"Current state from {len(snapshots)} snapshots and {files} newer files"
+        + (f", {skipped} files without typed columns skipped" if skipped else "")
+    )
+    return state.to_table()
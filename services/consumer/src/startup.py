@@ -0,0 +1,69 @@
+"""
+Start-up timings of a shard processor process.
+
+run.sh exports CONSUMER_STARTED_AT when the container starts and
+JVM_STARTED_AT just before it execs the KCL MultiLangDaemon; main.py marks
+the rest as it imports. KCL only spawns a processor once it holds the shard's
+lease, so JVM start and lease acquisition show up as one phase.
+
+Import this module before anything heavy so "process" is marked early.
+"""
+
+import os
+import time
+
+# Phase names, each ending at the mark of the same name and starting at the
+# previous mark that was recorded
+PHASES = (
+    "startup_script",  # container start -> JVM exec
+    "jvm_and_lease",  # JVM exec -> processor process start (lease taken)
+    "process",  # container or JVM start -> process start (polling mode)
+    "pyarrow_import",
+    "imports",  # remaining module imports
+    "initialize",  # KCL initialize, snapshot seeding
+    "first_batch",  # first successful process_records
+)
+
+# The container's start, where run.sh did not record one
+_PROCESS_STARTED_AT = time.time()
+
+
+def _env_time(name):
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class StartupProfile:
+    """Process-wide start-up marks, as epoch seconds."""
+
+    def __init__(self):
+        self.started_at = _env_time("CONSUMER_STARTED_AT") or _PROCESS_STARTED_AT
+        self.marks = {}
+        jvm = _env_time("JVM_STARTED_AT")
+        if jvm is not None:
+            self.marks["startup_script"] = jvm
+            self.marks["jvm_and_lease"] = _PROCESS_STARTED_AT
+        else:
+            self.marks["process"] = _PROCESS_STARTED_AT
+
+    def mark(self, phase, at=None):
+        self.marks[phase] = at if at is not None else time.time()
+
+    def phases(self, marks=None):
+        """
+        Seconds spent in each recorded phase, with `marks` (per processor, e.g.
+        initialize / first_batch) added to the process-wide ones.
+        """
+        marks = {**self.marks, **(marks or {})}
+        result = {}
+        previous = self.started_at
+        for phase in PHASES:
+            if phase in marks:
+                result[phase] = max(marks[phase] - previous, 0.0)
+                previous = marks[phase]
+        return result
+
+
+profile = StartupProfile()
@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Plain decimal or scientific notation, as HA renders numeric sensor states
+NUMERIC_PATTERN = r"^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$"
+TRUE_STATES = ["on", "true", "open", "home", "yes"]
+FALSE_STATES = ["off", "false", "closed", "not_home", "no"]
+UNAVAILABLE_STATES = ["unavailable", "unknown"]
+
+TYPED_COLUMNS = ("entity_id", "event_time", "value_float", "value_bool", "is_unavailable", "unit")
+EVENT_TIME_TYPE = pa.timestamp("us", tz="UTC")
+
+
+def _field(array, path):
+    """Walk a nested struct path, returning None if any level is missing."""
+    for name in path:
+        if not pa.types.is_struct(array.type) or array.type.get_field_index(name) < 0:
+            return None
+        array = pc.struct_field(array, name)
+    return array
+
+
+def _parse_times(strings):
+    try:
+        return pc.cast(strings, EVENT_TIME_TYPE)
+    except pa.ArrowInvalid:
+        pass
+
+    # A malformed timestamp fails the vectorized cast for the whole chunk
+    parsed = []
+    for value in strings.to_pylist():
+        try:
+            parsed.append(datetime.fromisoformat(value) if value else None)
+        except (TypeError, ValueError):
+            parsed.append(None)
+    return pa.array(parsed, EVENT_TIME_TYPE)
+
+
+def event_time_column(data):
+    """
+    Event time of each envelope: the event's time_fired, falling back to the
+    envelope's received_at when time_fired is missing or unparseable.
+    """
+    length = len(data)
+    fired = _field(data, ["event", "time_fired"])
+    if fired is not None and pa.types.is_string(fired.type):
+        event_time = _parse_times(fired)
+    else:
+        event_time = pa.nulls(length, EVENT_TIME_TYPE)
+
+    received = received_time_column(data)
+    if received is not None:
+        event_time = pc.coalesce(event_time, received)
+    return event_time
+
+
+def received_time_column(data):
+    """The envelope's received_at (epoch seconds) as timestamps, or None if absent."""
+    received = _field(data, ["received_at"])
+    if received is None or not (pa.types.is_floating(received.type) or pa.types.is_integer(received.type)):
+        return None
+    micros = pc.cast(pc.multiply(pc.cast(received, pa.float64()), 1e6), pa.int64(), safe=False)
+    return pc.cast(micros, EVENT_TIME_TYPE)
+
+
+def state_column(data):
+    """new_state.state of each envelope as strings (null without a new state)."""
+    state = _field(data, ["event", "data", "new_state", "state"])
+    if state is None:
+        return pa.nulls(len(data), pa.string())
+    if not pa.types.is_string(state.type):
+        return pc.cast(state, pa.string())
+    return state
+
+
+def typed_state_columns(data):
+    """
+    Derive typed columns from the `data` struct of spilled envelopes.
+
+    Returns {name: array} with `entity_id`, `event_time` (see
+    event_time_column), `value_float` (numeric states), `value_bool`
+    (on/off style states), `is_unavailable` (unavailable/unknown or no
+    new_state) and `unit` (attributes.unit_of_measurement).
+    """
+    if isinstance(data, pa.ChunkedArray):
+        data = data.combine_chunks()
+    length = len(data)
+
+    new_state = _field(data, ["event", "data", "new_state"])
+    state = state_column(data)
+
+    numeric = pc.match_substring_regex(state, NUMERIC_PATTERN)
+    value_float = pc.cast(pc.if_else(numeric, state, None), pa.float64())
+
+    lowered = pc.utf8_lower(state)
+    value_bool = pc.if_else(
+        pc.is_in(lowered, pa.array(TRUE_STATES)),
+        True,
+        pc.if_else(pc.is_in(lowered, pa.array(FALSE_STATES)), False, None),
+    )
+
+    is_unavailable = pc.or_kleene(
+        pc.is_null(state), pc.is_in(lowered, pa.array(UNAVAILABLE_STATES))
+    )
+    is_unavailable = pc.fill_null(is_unavailable, True)
+
+    unit = _field(new_state, ["attributes", "unit_of_measurement"]) if new_state is not None else None
+    if unit is None:
+        unit = pa.nulls(length, pa.string())
+    elif not pa.types.is_string(unit.type):
+        unit = pc.cast(unit, pa.string())
+
+    entity_id = _field(data, ["event", "data", "entity_id"])
+    if entity_id is None:
+        entity_id = pa.nulls(length, pa.string())
+
+    return {
+        "entity_id": entity_id,
+        "event_time": event_time_column(data),
+        "value_float": value_float,
+        "value_bool": value_bool,
+        "is_unavailable": is_unavailable,
+        "unit": unit,
+    }
+
+
+def add_typed_columns(table):
+    """Append the typed state columns to a spill table, if not already present."""
+    if "value_float" in table.column_names or "data" not in table.column_names:
+        return table
+    for name, column in typed_state_columns(table["data"]).items():
+        table = table.append_column(name, column)
+    return table
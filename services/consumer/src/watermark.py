@@ -0,0 +1,145 @@
+import json
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from typed_columns import received_time_column
+
+WATERMARK_PREFIX = "watermark"
+# Checkpoints whose watermark state is kept per shard; the previous one is
+# still needed when a worker dies between recording a state and checkpointing
+KEEP_CHECKPOINTS = 2
+
+
+def _max_micros(array):
+    if array is None or len(array) == 0:
+        return None
+    return pc.max(pc.cast(array, pa.int64())).as_py()
+
+
+class WatermarkTracker:
+    """
+    Event-time watermark of one shard.
+
+    The watermark trails the newest event time seen by `allowed_lateness`.
+    Event time is the typed `event_time` column (time_fired); it is capped by
+    the newest envelope `received_at` so an agent with a clock running ahead
+    cannot push the watermark past what has actually been ingested.
+
+    `split(table)` separates rows older than the current watermark from the
+    rest and then advances the watermark with the on-time rows. Until the
+    first chunk is seen nothing is late. `state()` / `restore()` carry the
+    watermark across a restart (see WatermarkStore).
+    """
+
+    def __init__(self, allowed_lateness=300.0):
+        self._allowed_lateness_us = int(allowed_lateness * 1_000_000)
+        self._max_event_time = None
+        self._max_received = None
+        self.late_events = 0
+
+    @property
+    def watermark(self):
+        """Current watermark in epoch microseconds, or None before any event."""
+        if self._max_event_time is None:
+            return None
+        newest = self._max_event_time
+        if self._max_received is not None:
+            newest = min(newest, self._max_received)
+        return newest - self._allowed_lateness_us
+
+    def state(self):
+        """JSON-serializable state, for restore()."""
+        return {"max_event_time": self._max_event_time, "max_received": self._max_received}
+
+    def restore(self, state):
+        self._max_event_time = state.get("max_event_time")
+        self._max_received = state.get("max_received")
+
+    def lag_seconds(self, now=None):
+        """Wall clock minus watermark; 0 before any event."""
+        watermark = self.watermark
+        if watermark is None:
+            return 0.0
+        return (now or time.time()) - watermark / 1_000_000
+
+    def split(self, table):
+        """Return (on_time, late) tables for a typed spill chunk."""
+        watermark = self.watermark
+        if watermark is None or "event_time" not in table.column_names:
+            late = None
+        else:
+            late_mask = pc.fill_null(
+                pc.less(pc.cast(table["event_time"], pa.int64()), watermark), False
+            )
+            late_count = pc.sum(late_mask).as_py() or 0
+            if late_count:
+                self.late_events += late_count
+                late = table.filter(late_mask)
+                table = table.filter(pc.invert(late_mask))
+            else:
+                late = None
+
+        if "event_time" in table.column_names:
+            newest = _max_micros(table["event_time"])
+            if newest is not None and (self._max_event_time is None or newest > self._max_event_time):
+                self._max_event_time = newest
+        if "data" in table.column_names:
+            data = table["data"]
+            if isinstance(data, pa.ChunkedArray):
+                data = data.combine_chunks()
+            received = _max_micros(received_time_column(data))
+            if received is not None and (self._max_received is None or received > self._max_received):
+                self._max_received = received
+
+        return table, late
+
+    def take_late_count(self):
+        """Late events since the previous call."""
+        count, self.late_events = self.late_events, 0
+        return count
+
+
+class WatermarkStore:
+    """
+    Watermark state of one shard at each of its last KEEP_CHECKPOINTS
+    checkpoints, in one S3 object at watermark/shard=<shard_id>.json.
+
+    The processor records the state just before it checkpoints and restores
+    the state for the checkpoint it resumes from, so a replay routes the same
+    rows to late/ as the first pass did.
+    """
+
+    def __init__(self, s3, bucket, shard_id):
+        self._s3 = s3
+        self._bucket = bucket
+        self._key = f"{WATERMARK_PREFIX}/shard={shard_id}.json"
+        self._checkpoints = None
+
+    def _load(self):
+        if self._checkpoints is None:
+            try:
+                body = self._s3.get_object(Bucket=self._bucket, Key=self._key)["Body"].read()
+                self._checkpoints = json.loads(body)["checkpoints"]
+            except self._s3.exceptions.NoSuchKey:
+                self._checkpoints = []
+        return self._checkpoints
+
+    def load(self, sequence_number):
+        """State recorded at `sequence_number`, or None."""
+        for checkpoint in self._load():
+            if checkpoint["sequence_number"] == sequence_number:
+                return checkpoint["state"]
+        return None
+
+    def record(self, sequence_number, state):
+        checkpoints = [c for c in self._load() if c["sequence_number"] != sequence_number]
+        checkpoints = checkpoints[-(KEEP_CHECKPOINTS - 1) :] + [{"sequence_number": sequence_number, "state": state}]
+        self._s3.put_object(
+            Bucket=self._bucket,
+            Key=self._key,
+            Body=json.dumps({"checkpoints": checkpoints}).encode(),
+            ContentType="application/json",
+        )
+        self._checkpoints = checkpoints
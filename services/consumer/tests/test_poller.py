@@ -0,0 +1,155 @@
+import os
+import sys
+import asyncio
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+pytest.importorskip("amazon_kclpy")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+os.environ.setdefault("S3_BUCKET", "test-bucket")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import poller  # noqa: E402
+from lease_store import SHARD_END, SQLiteLeaseStore  # noqa: E402
+
+SHARD = "shardId-000000000000"
+
+
+class ScriptedKinesis:
+    """Plays back GetRecords responses, or errors to raise, in order; then ends the shard."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.iterators = []
+
+    def get_shard_iterator(self, StreamName, ShardId, ShardIteratorType, StartingSequenceNumber=None):
+        self.iterators.append((ShardIteratorType, StartingSequenceNumber))
+        return {"ShardIterator": "iterator"}
+
+    def get_records(self, ShardIterator, Limit):
+        if not self.responses:
+            return {"Records": [], "NextShardIterator": None, "MillisBehindLatest": 0}
+        response = self.responses.pop(0)
+        if isinstance(response, str):
+            raise ClientError({"Error": {"Code": response}}, "GetRecords")
+        return {"NextShardIterator": "iterator", "MillisBehindLatest": 0, **response}
+
+
+class RecordingProcessor:
+    def __init__(self):
+        self.batches = []
+        self.calls = []
+
+    def initialize(self, initialization_input):
+        self.calls.append("initialize")
+
+    def process_records(self, process_records_input):
+        self.batches.append([r.sequence_number for r in process_records_input.records])
+
+    def shard_ended(self, shard_ended_input):
+        self.calls.append("shard_ended")
+        shard_ended_input.checkpointer.checkpoint()
+
+    def shutdown_requested(self, shutdown_requested_input):
+        self.calls.append("shutdown_requested")
+
+    def lease_lost(self, lease_lost_input):
+        self.calls.append("lease_lost")
+
+
+def record(sequence_number):
+    return {"Data": b"{}", "SequenceNumber": sequence_number, "PartitionKey": "sensor.a"}
+
+
+def make_worker(responses, tmp_path, monkeypatch, processor):
+    monkeypatch.setattr(poller, "MIN_TIME_BETWEEN_READS", 0.0)
+    monkeypatch.setattr(poller, "RETRY_BASE_SECONDS", 0.0)
+    store = SQLiteLeaseStore(str(tmp_path / "leases.db"))
+    kinesis = ScriptedKinesis(responses)
+    worker = poller.PollingWorker(
+        "stream", store, kinesis, processor_factory=lambda: processor, worker_id="worker", idle_time=0.0
+    )
+    assert store.try_acquire(SHARD, "worker", 30)
+    return worker, kinesis, store
+
+
+def consume(responses, tmp_path, monkeypatch, processor=None):
+    processor = processor or RecordingProcessor()
+    worker, kinesis, store = make_worker(responses, tmp_path, monkeypatch, processor)
+
+    async def run():
+        worker._stopping = asyncio.Event()
+        await worker._consume(SHARD, None)
+
+    asyncio.run(run())
+    return kinesis, processor, store
+
+
+def test_empty_batches_reach_the_processor(tmp_path, monkeypatch):
+    _, processor, _ = consume([{"Records": []}, {"Records": [record("1")]}, {"Records": []}], tmp_path, monkeypatch)
+    assert processor.batches[:3] == [[], ["1"], []]
+
+
+def test_throttles_are_retried_and_expired_iterators_resume_after_the_last_record(tmp_path, monkeypatch):
+    responses = [
+        {"Records": [record("1")]},
+        "ProvisionedThroughputExceededException",
+        "ExpiredIteratorException",
+        {"Records": [record("2")]},
+    ]
+    kinesis, processor, store = consume(responses, tmp_path, monkeypatch)
+    assert [batch for batch in processor.batches if batch] == [["1"], ["2"]]
+    assert kinesis.iterators == [("TRIM_HORIZON", None), ("AFTER_SEQUENCE_NUMBER", "1")]
+    assert processor.calls == ["initialize", "shard_ended"]
+    assert store.get_checkpoint(SHARD) == SHARD_END
+
+
+def test_failures_release_the_processor_and_the_lease(tmp_path, monkeypatch):
+    processor = RecordingProcessor()
+    with pytest.raises(ClientError):
+        consume([{"Records": [record("1")]}, "AccessDeniedException"], tmp_path, monkeypatch, processor)
+    assert processor.calls == ["initialize", "lease_lost"]
+    store = SQLiteLeaseStore(str(tmp_path / "leases.db"))
+    # Released, so another worker can take it at once
+    assert store.try_acquire(SHARD, "other", 30)
+
+
+class BlockingProcessor(RecordingProcessor):
+    """Holds its first batch until `finish` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.finish = threading.Event()
+
+    def process_records(self, process_records_input):
+        self.started.set()
+        assert self.finish.wait(5)
+        self.calls.append("process_records")
+
+
+def test_lost_lease_waits_for_the_batch_in_flight(tmp_path, monkeypatch):
+    processor = BlockingProcessor()
+    worker, _, store = make_worker([{"Records": [record("1")]}], tmp_path, monkeypatch, processor)
+
+    async def run():
+        worker._stopping = asyncio.Event()
+        task = asyncio.create_task(worker._consume(SHARD, None))
+        assert await asyncio.to_thread(processor.started.wait, 5)
+        task.cancel()
+        await asyncio.sleep(0.1)
+        # Still writing: the processor is not torn down and the lease is still held
+        assert processor.calls == ["initialize"]
+        assert not store.try_acquire(SHARD, "other", 30)
+
+        processor.finish.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert processor.calls == ["initialize", "process_records", "lease_lost"]
+    assert store.try_acquire(SHARD, "other", 30)
@@ -0,0 +1,105 @@
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+pytest.importorskip("amazon_kclpy")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+os.environ.setdefault("S3_BUCKET", "test-bucket")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import record_processor  # noqa: E402
+from poller import ProcessorInput  # noqa: E402
+from readiness import FileReadinessStore  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1772409600.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(record_processor.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def lag_reports(monkeypatch):
+    reports = []
+    monkeypatch.setattr(record_processor.aws_utils, "emit_lag", lambda **kwargs: reports.append(kwargs))
+    return reports
+
+
+@pytest.fixture
+def processor(monkeypatch, tmp_path, clock):
+    monkeypatch.setenv("READINESS_STORE", "none")
+    monkeypatch.setattr(record_processor, "SNAPSHOT_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(record_processor, "CONSUMER_MEMORY_BUDGET_MIB", 0)
+    monkeypatch.setattr(record_processor, "TASK_PROTECTION_PATH", str(tmp_path / "protection.json"))
+    monkeypatch.setattr(record_processor.WatermarkStore, "load", lambda self, sequence_number: None)
+    monkeypatch.setattr(record_processor.aws_utils, "emit_startup", lambda *args, **kwargs: None)
+    processor = record_processor.RecordProcessor()
+    processor.initialize(ProcessorInput(shard_id="shardId-000000000000", sequence_number=None))
+    return processor
+
+
+def idle_batch(millis_behind_latest=0):
+    return ProcessorInput(records=[], checkpointer=None, millis_behind_latest=millis_behind_latest)
+
+
+def test_idle_stream_keeps_reporting_lag(processor, clock, lag_reports):
+    for _ in range(10 * 60 * 4):
+        processor.process_records(idle_batch())
+        clock.now += 0.25
+
+    # One report a minute, all at zero lag, with nothing ever read
+    assert len(lag_reports) == 10
+    assert {report["iterator_age"] for report in lag_reports} == {0.0}
+
+
+def test_idle_stream_reports_the_lag_it_is_given(processor, lag_reports):
+    processor.process_records(idle_batch(millis_behind_latest=45000))
+    assert lag_reports[-1]["iterator_age"] == 45.0
+
+
+def test_idle_stream_is_ready_and_keeps_its_heartbeat(processor, clock, lag_reports, tmp_path):
+    store = FileReadinessStore(str(tmp_path / "readiness"))
+    processor._readiness = store
+    assert store.list() == []
+
+    processor.process_records(idle_batch())
+    [first] = store.list()
+    assert first["shard_id"] == "shardId-000000000000"
+    assert first["ready_at"] == first["heartbeat_at"] == clock.now
+
+    clock.now += 5 * 60
+    processor.process_records(idle_batch())
+    [later] = store.list()
+    assert later["ready_at"] == first["ready_at"]
+    assert later["heartbeat_at"] == clock.now
+
+
+class Checkpointer:
+    def __init__(self):
+        self.positions = []
+
+    def checkpoint(self, sequence_number=None):
+        self.positions.append(sequence_number)
+
+
+def test_checkpoint_goes_ahead_when_the_watermark_cannot_be_saved(processor, monkeypatch):
+    def denied(self, sequence_number, state):
+        raise ClientError({"Error": {"Code": "AccessDenied"}}, "GetObject")
+
+    monkeypatch.setattr(record_processor.WatermarkStore, "record", denied)
+    checkpointer = Checkpointer()
+    processor._checkpoint(checkpointer, "42")
+    assert checkpointer.positions == ["42"]
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import random
+
+import pytest
+import pyarrow as pa
+import pyarrow.compute as pc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, os.path.join(HERE, "..", "bench"))
+
+from events import make_envelope  # noqa: E402
+from decode_pool import decode_payloads  # noqa: E402
+from typed_columns import add_typed_columns  # noqa: E402
+from rollups import RESOLUTIONS, RollupAggregator, merge_partials  # noqa: E402
+
+START = 1767225600.0
+CHUNK = 1000
+
+
+def make_stream(records, step=0.05, late_ratio=0.02, max_delay=900.0, seed=7):
+    """Envelopes in arrival order; late ones are delivered up to max_delay seconds after they fired."""
+    rng = random.Random(seed)
+    arrivals = []
+    for i in range(records):
+        fired = START + i * step
+        delay = rng.uniform(0, max_delay) if rng.random() < late_ratio else 0.0
+        arrivals.append((fired + delay, i, json.dumps(make_envelope(i, rng, fired)).encode()))
+    arrivals.sort()
+    return [payload for _, _, payload in arrivals]
+
+
+def reference_rollup(table, seconds):
+    """Independent group_by over the full data, for comparison with merged partials."""
+    table = table.filter(pc.and_(pc.is_valid(table["entity_id"]), pc.is_valid(table["value_float"])))
+    times = pc.cast(table["event_time"], pa.int64())
+    bucket_us = seconds * 1_000_000
+    keyed = pa.table(
+        {
+            "entity_id": table["entity_id"],
+            "bucket_start": pc.multiply(pc.divide(times, bucket_us), bucket_us),
+            "value": table["value_float"],
+            "time": times,
+        }
+    )
+    keyed = keyed.take(pc.sort_indices(keyed, [("time", "ascending")]))
+    grouped = keyed.group_by(["entity_id", "bucket_start"], use_threads=False).aggregate(
+        [("value", stat) for stat in ("count", "min", "max", "sum", "first", "last")]
+    )
+    return {
+        (row["entity_id"], row["bucket_start"]): (
+            row["value_count"],
+            row["value_min"],
+            row["value_max"],
+            pytest.approx(row["value_sum"]),
+            row["value_first"],
+            row["value_last"],
+        )
+        for row in grouped.to_pylist()
+    }
+
+
+def merged_rollup(partials):
+    return {
+        (row["entity_id"], int(row["bucket_start"].timestamp() * 1_000_000)): (
+            row["count"],
+            row["min"],
+            row["max"],
+            row["sum"],
+            row["first"],
+            row["last"],
+        )
+        for row in merge_partials(pa.concat_tables(partials)).to_pylist()
+    }
+
+
+def run(records, max_buckets, flush_every=None):
+    """
+    Feed spill-sized chunks through an aggregator the way a shard processor
+    does: drain every flush_every records, and whenever the aggregator is full.
+    """
+    rows, _ = decode_payloads(make_stream(records))
+    aggregator = RollupAggregator(max_buckets=max_buckets)
+    emitted = {name: [] for name in RESOLUTIONS}
+    chunks = []
+    peak = 0
+    drains = 0
+    for start in range(0, len(rows), CHUNK):
+        chunk = add_typed_columns(pa.Table.from_pylist(rows[start : start + CHUNK]))
+        chunks.append(chunk)
+        aggregator.add_table(chunk)
+        peak = max(peak, max(len(buckets) for buckets in aggregator._buckets.values()))
+        if aggregator.full or (flush_every and (start + CHUNK) % flush_every == 0):
+            drains += 1
+            for name, table in aggregator.drain().items():
+                emitted[name].append(table)
+    for name, table in aggregator.drain().items():
+        emitted[name].append(table)
+    return pa.concat_tables(chunks), emitted, peak, drains
+
+
+def test_merged_partials_match_batch_aggregation():
+    everything, emitted, _, _ = run(40000, max_buckets=200000, flush_every=10000)
+    for name, seconds in RESOLUTIONS.items():
+        assert merged_rollup(emitted[name]) == reference_rollup(everything, seconds)
+
+
+def test_bucket_cap_bounds_memory_without_losing_rows():
+    max_buckets = 500
+    everything, emitted, peak, drains = run(40000, max_buckets=max_buckets)
+    # Full after at most one chunk past the cap, then drained
+    assert peak < max_buckets + CHUNK
+    assert drains > 1
+    for name, seconds in RESOLUTIONS.items():
+        assert merged_rollup(emitted[name]) == reference_rollup(everything, seconds)
+
+
+def test_final_flags_follow_the_watermark():
+    rows, _ = decode_payloads(make_stream(2000, late_ratio=0.0))
+    aggregator = RollupAggregator(resolutions={"1m": 60}, allowed_lateness=0.0)
+    aggregator.add_table(add_typed_columns(pa.Table.from_pylist(rows)))
+    table = aggregator.drain()["1m"]
+
+    newest = max(table["last_time"].to_pylist())
+    for row in table.to_pylist():
+        assert row["final"] == (row["bucket_start"].timestamp() + 60 <= newest.timestamp())
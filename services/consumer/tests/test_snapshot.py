@@ -0,0 +1,149 @@
+import io
+import os
+import sys
+import json
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, os.path.join(HERE, "..", "bench"))
+
+from events import make_envelope  # noqa: E402
+from decode_pool import decode_payloads  # noqa: E402
+from typed_columns import add_typed_columns  # noqa: E402
+from snapshot import LatestStateTable, load_current_state, prune_snapshots, snapshot_key  # noqa: E402
+
+NOW = datetime(2026, 3, 2, 12, tzinfo=timezone.utc)
+
+
+class MemoryS3:
+    """Objects with their LastModified, and the calls load_current_state makes."""
+
+    def __init__(self):
+        self.objects = {}
+        self.listed = []
+
+    def put(self, key, table, modified):
+        sink = io.BytesIO()
+        pq.write_table(table, sink)
+        self.objects[key] = (sink.getvalue(), modified)
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key][0])}
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        self.listed.append(Prefix)
+        contents = [
+            {"Key": key, "LastModified": modified}
+            for key, (_, modified) in sorted(self.objects.items())
+            if key.startswith(Prefix)
+        ]
+        yield {"Contents": contents}
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            del self.objects[obj["Key"]]
+
+
+def typed_rows(seq, fired):
+    rows, _ = decode_payloads([json.dumps(make_envelope(seq, now=fired.timestamp())).encode()])
+    return add_typed_columns(pa.Table.from_pylist(rows))
+
+
+def entities(table):
+    return set(table["entity_id"].to_pylist())
+
+
+def day_listed(s3, when):
+    return any(f"month={when.month:02d}/day={when.day:02d}/" in prefix for prefix in s3.listed)
+
+
+def raw_key(shard_id, when, name):
+    return f"raw/year={when.year}/month={when.month:02d}/day={when.day:02d}/shard={shard_id}/{name}.parquet"
+
+
+def snapshot_of(*tables):
+    latest = LatestStateTable()
+    for table in tables:
+        latest.update(table)
+    return latest.to_table()
+
+
+def states(table):
+    return {row["entity_id"]: row["event_time"] for row in table.to_pylist()}
+
+
+def test_closed_shards_do_not_hold_back_the_listing():
+    s3 = MemoryS3()
+    # A parent shard that ended at a reshard a month ago, and its child
+    parent_end = NOW - timedelta(days=30)
+    old = typed_rows(0, parent_end - timedelta(minutes=5))
+    s3.put(raw_key("parent", parent_end, "1-2"), old, parent_end - timedelta(minutes=1))
+    s3.put(snapshot_key("parent", parent_end, final=True), snapshot_of(old), parent_end)
+
+    child_snapshot = NOW - timedelta(hours=1)
+    child = typed_rows(1, child_snapshot)
+    s3.put(snapshot_key("child", child_snapshot), snapshot_of(child), child_snapshot)
+    newer = typed_rows(9, NOW - timedelta(minutes=10))
+    s3.put(raw_key("child", NOW, "3-4"), newer, NOW - timedelta(minutes=5))
+
+    table = load_current_state(s3, "bucket", now=NOW)
+    assert set(states(table)) == entities(old) | entities(child) | entities(newer)
+    # Only the days around the child's snapshot are listed
+    assert not day_listed(s3, parent_end)
+
+
+def test_files_before_a_shards_own_snapshot_are_not_reread():
+    s3 = MemoryS3()
+    early = NOW - timedelta(hours=3)
+    late = NOW - timedelta(minutes=30)
+    s3.put(snapshot_key("a", early), snapshot_of(typed_rows(0, early)), early)
+    b = typed_rows(1, late)
+    s3.put(snapshot_key("b", late), snapshot_of(b), late)
+    # Shard b's file predates its snapshot; its state is dated in the future,
+    # so it would win if the file were read
+    future = NOW + timedelta(days=1)
+    s3.put(raw_key("b", NOW, "1-2"), typed_rows(1, future), late - timedelta(minutes=1))
+
+    table = load_current_state(s3, "bucket", now=NOW)
+    assert states(table)[b["entity_id"][0].as_py()] == late
+
+
+def test_without_snapshots_reads_a_bounded_window_and_skips_untyped_files():
+    s3 = MemoryS3()
+    recent = typed_rows(0, NOW - timedelta(hours=2))
+    s3.put(raw_key("a", NOW, "1-2"), recent, NOW - timedelta(hours=1))
+    stale = NOW - timedelta(days=20)
+    s3.put(raw_key("a", stale, "0-1"), typed_rows(1, stale), stale)
+    # Written before typed columns existed
+    s3.put(
+        "raw/year=2026/month=03/day=02/untyped.parquet",
+        pa.table({"data": [{"event": {"event_type": "state_changed"}}]}),
+        NOW - timedelta(minutes=30),
+    )
+
+    table = load_current_state(s3, "bucket", now=NOW)
+    assert set(states(table)) == entities(recent)
+    assert not day_listed(s3, stale)
+
+
+def test_pruning_keeps_the_newest_snapshots_of_the_shard_only():
+    s3 = MemoryS3()
+    times = [NOW - timedelta(minutes=5 * i) for i in range(4)]
+    for i, when in enumerate(times):
+        s3.put(snapshot_key("a", when), snapshot_of(typed_rows(i, when)), when)
+    other = NOW - timedelta(days=1)
+    s3.put(snapshot_key("b", other), snapshot_of(typed_rows(9, other)), other)
+
+    deleted = prune_snapshots(s3, "bucket", "a")
+    assert set(deleted) == {snapshot_key("a", when) for when in times[2:]}
+    assert set(s3.objects) == {snapshot_key("a", times[0]), snapshot_key("a", times[1]), snapshot_key("b", other)}
+    # The final snapshot of an ended shard sorts after the ones before it
+    s3.put(snapshot_key("a", NOW, final=True), snapshot_of(typed_rows(0, NOW)), NOW)
+    assert prune_snapshots(s3, "bucket", "a") == [snapshot_key("a", times[1])]
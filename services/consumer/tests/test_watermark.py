@@ -0,0 +1,89 @@
+import io
+import os
+import sys
+import json
+
+import pyarrow as pa
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, os.path.join(HERE, "..", "bench"))
+
+from events import make_envelope  # noqa: E402
+from decode_pool import decode_payloads  # noqa: E402
+from typed_columns import add_typed_columns  # noqa: E402
+from watermark import KEEP_CHECKPOINTS, WatermarkStore, WatermarkTracker  # noqa: E402
+
+START = 1767225600.0
+LATENESS = 300.0
+
+
+class MemoryS3:
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def chunk(*offsets):
+    """A typed spill chunk of one event per offset (seconds after START), received as it fired."""
+    payloads = [json.dumps(make_envelope(i, now=START + offset)).encode() for i, offset in enumerate(offsets)]
+    rows, _ = decode_payloads(payloads)
+    return add_typed_columns(pa.Table.from_pylist(rows))
+
+
+# Kinesis records by sequence number; "2" carries an event 500s behind the one before it
+STREAM = {"1": chunk(0, 300, 600), "2": chunk(100, 700), "3": chunk(800, 900)}
+
+
+def route(tracker, sequence_numbers):
+    """Rows sent to raw/ and late/ per record, as the spiller splits them."""
+    routed = {}
+    for sequence_number in sequence_numbers:
+        on_time, late = tracker.split(STREAM[sequence_number])
+        routed[sequence_number] = (on_time.num_rows, late.num_rows if late is not None else 0)
+    return routed
+
+
+def test_replay_after_restart_routes_late_rows_the_same_way():
+    s3 = MemoryS3()
+    store = WatermarkStore(s3, "bucket", "shardId-000")
+    tracker = WatermarkTracker(LATENESS)
+
+    first_pass = route(tracker, ["1"])
+    store.record("1", tracker.state())
+    first_pass.update(route(tracker, ["2", "3"]))
+    assert first_pass["2"] == (1, 1)
+
+    # The worker dies before checkpointing again; a new one resumes after "1"
+    restarted = WatermarkTracker(LATENESS)
+    restarted.restore(WatermarkStore(s3, "bucket", "shardId-000").load("1"))
+    assert route(restarted, ["2", "3"]) == {key: first_pass[key] for key in ("2", "3")}
+
+    # Without the stored state the late row would be written to raw/ as well
+    assert route(WatermarkTracker(LATENESS), ["2"])["2"] == (2, 0)
+
+
+def test_previous_checkpoint_survives_a_crash_before_checkpointing():
+    s3 = MemoryS3()
+    store = WatermarkStore(s3, "bucket", "shardId-000")
+    tracker = WatermarkTracker(LATENESS)
+    for sequence_number in STREAM:
+        route(tracker, [sequence_number])
+        store.record(sequence_number, tracker.state())
+
+    reloaded = WatermarkStore(s3, "bucket", "shardId-000")
+    kept = list(STREAM)[-KEEP_CHECKPOINTS:]
+    assert all(reloaded.load(sequence_number) is not None for sequence_number in kept)
+    assert reloaded.load("1") is None
+    assert WatermarkStore(s3, "bucket", "shardId-001").load("3") is None
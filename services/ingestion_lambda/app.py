@@ -1,10 +1,17 @@
 import json
 import os
 import time
+import zlib
+import base64
 import boto3
 import logging
 
+from concurrent.futures import ThreadPoolExecutor
+
 import aws_utils
+from api_keys import ApiKeyValidator
+from envelope import encode_envelope, envelope_format_from_env
+from partitioning import partitioner_from_env
 
 aws_utils.configure_logging()
 
@@ -13,10 +20,27 @@ logger = logging.getLogger(__name__)
 sm = boto3.client("secretsmanager")
 SECRET_ARN = os.environ["API_KEY_SECRET_ARN"]
 
+# From the shared layer; keys are cached across invocations in a warm container
+api_keys = ApiKeyValidator(SECRET_ARN, client=sm)
+
+# Left for building the response after the Kinesis push
+RESPONSE_MARGIN_SECONDS = 0.5
+
+# Newline-delimited request bodies: one event per line
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl")
+# Records per push handed off while the rest of the body is still being parsed
+NDJSON_CHUNK_RECORDS = 500
+# Malformed lines described in the response; the rest are only counted
+MAX_LINE_ERRORS = 50
+LINE_ERROR_CHARS = 200
+
+# One single-threaded lane per push worker. A partition key always goes to the
+# same lane, so its chunks reach Kinesis in body order.
+push_lanes = [ThreadPoolExecutor(max_workers=1) for _ in range(int(os.environ.get("NDJSON_PUSH_WORKERS", "4")))]
 
-def get_api_key():
-    resp = sm.get_secret_value(SecretId=SECRET_ARN)
-    return resp["SecretString"]
+# Kept across invocations so per-key rate estimates survive in a warm container
+partitioner = partitioner_from_env()
+ENVELOPE_FORMAT = envelope_format_from_env()
 
 
 def _is_authorized(func):
@@ -38,9 +62,8 @@ def _is_authorized(func):
             return {"statusCode": 401, "body": "Unauthorized"}
 
         incoming_token = auth.replace("Bearer ", "").strip()
-        expected_token = get_api_key()
 
-        if incoming_token != expected_token:
+        if not api_keys.validate(incoming_token):
             request_latency = time.time() - start_time
             aws_utils.emit_metrics(
                 events_received=0,
@@ -57,12 +80,61 @@ def _is_authorized(func):
     return wrapper
 
 
+def _entity_id(ev):
+    data = ev.get("data") if isinstance(ev, dict) else None
+    return data.get("entity_id") if isinstance(data, dict) else None
+
+
+def _to_record(ev, entity_id):
+    received_at = time.time()
+    partition_fields, order_tag = partitioner.assign(ev, entity_id, now=received_at)
+
+    envelope = {
+        "source": "homeassistant",
+        "received_at": received_at,
+        "event": ev,
+    }
+    if order_tag:
+        envelope["partition"] = order_tag
+
+    return {
+        "Data": encode_envelope(envelope, ENVELOPE_FORMAT),
+        **partition_fields,
+    }
+
+
+def _push_lane(record):
+    return zlib.crc32(record["PartitionKey"].encode()) % len(push_lanes)
+
+
+def _time_budget(context):
+    if hasattr(context, "get_remaining_time_in_millis"):
+        return context.get_remaining_time_in_millis() / 1000 - RESPONSE_MARGIN_SECONDS
+    return None
+
+
+def _request_body(event):
+    body = event.get("body", "{}")
+    if event.get("isBase64Encoded") and body:
+        body = base64.b64decode(body).decode()
+    return body
+
+
+def _is_ndjson(event):
+    headers = event.get("headers", {}) or {}
+    content_type = headers.get("content-type") or headers.get("Content-Type") or ""
+    return content_type.split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES
+
+
 @_is_authorized
 def lambda_handler(event, context, start_time=None):
     start = start_time if start_time is not None else time.time()
 
+    if _is_ndjson(event):
+        return _ingest_ndjson(_request_body(event), context, start)
+
     try:
-        body = json.loads(event.get("body", "{}"))
+        body = json.loads(_request_body(event))
     except Exception:
         request_latency = time.time() - start
         aws_utils.emit_metrics(
@@ -76,26 +148,17 @@ def lambda_handler(event, context, start_time=None):
     incoming_events = body.get("events", [])
     events_received = len(incoming_events)
     valid_records = []
+    record_events = []
     events_ignored = 0
 
-    for ev in incoming_events:
-        entity_id = ev.get("data", {}).get("entity_id")
+    for position, ev in enumerate(incoming_events):
+        entity_id = _entity_id(ev)
         if not entity_id:
             events_ignored += 1
             continue
 
-        envelope = {
-            "source": "homeassistant",
-            "received_at": time.time(),
-            "event": ev,
-        }
-
-        valid_records.append(
-            {
-                "Data": json.dumps(envelope),
-                "PartitionKey": entity_id,
-            }
-        )
+        valid_records.append(_to_record(ev, entity_id))
+        record_events.append(position)
 
     if not valid_records:
         request_latency = time.time() - start
@@ -118,26 +181,135 @@ def lambda_handler(event, context, start_time=None):
             ),
         }
 
-    response = aws_utils.push_to_kinesis(valid_records)
+    response = aws_utils.push_to_kinesis(valid_records, time_budget=_time_budget(context))
 
     failed = response.get("FailedRecordCount", 0)
     ingested_count = len(valid_records) - failed
+    # Positions in the request's events array, for the agent to resend
+    retry = [record_events[index] for index in response.get("RetryIndices", [])]
     request_latency = time.time() - start
 
     aws_utils.emit_metrics(
         events_received=events_received,
         events_ingested=ingested_count,
         events_ignored=events_ignored,
+        events_retry=len(retry),
         request_latency=request_latency,
     )
 
+    result = {
+        "events_ingested": ingested_count,
+        "events_ignored": events_ignored,
+        "partial_failures": failed,
+    }
+    if retry:
+        result["retry"] = retry
+        result["retry_after"] = response.get("RetryAfterSeconds", 0)
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps(result),
+    }
+
+
+def _iter_lines(body):
+    """Yield (line number, line) without splitting the whole body up front."""
+    position, number = 0, 0
+    while position < len(body):
+        end = body.find("\n", position)
+        if end < 0:
+            end = len(body)
+        yield number, body[position:end]
+        position, number = end + 1, number + 1
+
+
+def _ingest_ndjson(body, context, start):
+    """
+    Ingest a newline-delimited body, one event per line.
+
+    Lines are parsed one at a time and every NDJSON_CHUNK_RECORDS valid records
+    of a push lane are handed to its thread, so put_records calls overlap with
+    parsing the rest of the body. Each partition key stays on one lane, whose
+    chunks are pushed one after another, so per-key order is kept. Malformed
+    lines are reported by line number instead of failing the request; "retry"
+    holds line numbers too.
+    """
+    deadline = aws_utils.push_deadline(_time_budget(context))
+    events_received = 0
+    events_ignored = 0
+    line_errors = []
+    malformed = 0
+    pushes = []
+    chunks = [([], []) for _ in push_lanes]
+
+    for number, line in _iter_lines(body):
+        if not line.strip():
+            continue
+        events_received += 1
+
+        try:
+            ev = json.loads(line)
+            if not isinstance(ev, dict):
+                raise ValueError("Line is not a JSON object")
+        except ValueError as e:
+            malformed += 1
+            if len(line_errors) < MAX_LINE_ERRORS:
+                line_errors.append({"line": number, "error": str(e)[:LINE_ERROR_CHARS]})
+            continue
+
+        entity_id = _entity_id(ev)
+        if not entity_id:
+            events_ignored += 1
+            continue
+
+        record = _to_record(ev, entity_id)
+        lane = _push_lane(record)
+        chunk, chunk_lines = chunks[lane]
+        chunk.append(record)
+        chunk_lines.append(number)
+        if len(chunk) >= NDJSON_CHUNK_RECORDS:
+            pushes.append((push_lanes[lane].submit(aws_utils.push_to_kinesis, chunk, deadline=deadline), chunk_lines))
+            chunks[lane] = ([], [])
+
+    for lane, (chunk, chunk_lines) in enumerate(chunks):
+        if chunk:
+            pushes.append((push_lanes[lane].submit(aws_utils.push_to_kinesis, chunk, deadline=deadline), chunk_lines))
+
+    failed = 0
+    retry = []
+    retry_after = 0.0
+    for future, lines in pushes:
+        response = future.result()
+        failed += response.get("FailedRecordCount", 0)
+        retry.extend(lines[index] for index in response.get("RetryIndices", []))
+        retry_after = max(retry_after, response.get("RetryAfterSeconds", 0))
+
+    records = sum(len(lines) for _, lines in pushes)
+    ingested_count = records - failed
+    request_latency = time.time() - start
+
+    aws_utils.emit_metrics(
+        events_received=events_received,
+        events_ingested=ingested_count,
+        events_ignored=events_ignored,
+        events_malformed=malformed,
+        events_retry=len(retry),
+        request_latency=request_latency,
+    )
+
+    result = {
+        "events_ingested": ingested_count,
+        "events_ignored": events_ignored,
+        "partial_failures": failed,
+    }
+    if malformed:
+        result["malformed_lines"] = malformed
+        result["line_errors"] = line_errors
+    if retry:
+        result["retry"] = sorted(retry)
+        result["retry_after"] = retry_after
+
     return {
         "statusCode": 200,
-        "body": json.dumps(
-            {
-                "events_ingested": len(valid_records),
-                "events_ignored": events_ignored,
-                "partial_failures": failed,
-            }
-        ),
+        "body": json.dumps(result),
     }
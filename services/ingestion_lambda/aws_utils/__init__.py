@@ -1,9 +1,10 @@
 from .cloudwatch_ import emit_metrics
-from .kinesis_ import push_to_kinesis
+from .kinesis_ import push_deadline, push_to_kinesis
 from .logging_ import configure_logging
 
 __all__ = [
     "emit_metrics",
+    "push_deadline",
     "push_to_kinesis",
     "configure_logging",
 ]
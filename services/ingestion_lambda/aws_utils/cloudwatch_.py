@@ -15,6 +15,9 @@ def emit_metrics(
     kinesis_failed: int = None,
     request_latency: float = None,
     kinesis_write_latency: float = None,
+    kinesis_throttled: int = None,
+    events_retry: int = None,
+    events_malformed: int = None,
     auth_failed: bool = False,
     service: str = "ingestion_lambda",
 ):
@@ -37,6 +40,12 @@ def emit_metrics(
         Full Lambda request duration (seconds).
     kinesis_write_latency : float
         Duration of Kinesis put_records call (0 when no valid records).
+    kinesis_throttled : int
+        Records Kinesis rejected with ProvisionedThroughputExceeded.
+    events_retry : int
+        Events handed back to the agent to resend.
+    events_malformed : int
+        NDJSON lines that were not a JSON object.
     auth_failed : bool
         Whether auth failed for this request.
     service : str
@@ -54,6 +63,9 @@ def emit_metrics(
             "value": kinesis_write_latency,
             "Unit": "Seconds",
         },
+        "kinesis_throttled_records": {"value": kinesis_throttled, "Unit": "Count"},
+        "events_retry": {"value": events_retry, "Unit": "Count"},
+        "events_malformed": {"value": events_malformed, "Unit": "Count"},
         "auth_failures": {"value": 1 if auth_failed else 0, "Unit": "Count"},
     }
     active_metrics = {
@@ -1,8 +1,12 @@
 import boto3
+import bisect
+import hashlib
 import logging
+import threading
 import time
 import os
 
+from collections import deque
 from typing import Dict
 
 from .cloudwatch_ import emit_metrics
@@ -12,55 +16,289 @@ logger = logging.getLogger(__name__)
 kinesis = boto3.client("kinesis")
 STREAM_NAME = os.environ["KINESIS_STREAM"]
 
+BATCH_SIZE = 500
+BATCH_BYTES = 5 * 1024 * 1024
 
-def push_to_kinesis(all_records) -> Dict[str, int]:
-    BATCH_SIZE = 500
-    MAX_RETRIES = 3
-    output = {"FailedRecordCount": 0}
+# Write limits Kinesis enforces per shard
+SHARD_RECORDS_PER_SECOND = 1000
+SHARD_BYTES_PER_SECOND = 1024 * 1024
 
-    for i in range(0, len(all_records), BATCH_SIZE):
-        batch = all_records[i : i + BATCH_SIZE]
+# Longest a request spends pushing, kept under the agent's 5 s upload timeout;
+# whatever is left over is handed back to the agent to resend
+PUSH_BUDGET_SECONDS = float(os.environ.get("KINESIS_PUSH_BUDGET_SECONDS", "3"))
 
-        current_batch = batch
-        retries = 0
+# Minimum gap between paced calls, so each carries a useful batch
+MIN_CALL_INTERVAL_SECONDS = 0.05
 
-        while True:
-            try:
-                kinesis_start = time.time()
-                response = kinesis.put_records(
-                    StreamName=STREAM_NAME, Records=current_batch
-                )
-                kinesis_end = time.time()
+# Consecutive put_records exceptions before giving up on the request
+MAX_CALL_FAILURES = 3
 
-                failed_count = response.get("FailedRecordCount", 0)
+SHARD_MAP_TTL_SECONDS = 300
 
-                emit_metrics(
-                    kinesis_write_latency=kinesis_end - kinesis_start,
-                    kinesis_failed=failed_count,
-                )
 
-                if failed_count == 0:
-                    break
+def hash_key(record):
+    """The 128-bit hash key Kinesis uses to route a put_records entry."""
+    if record.get("ExplicitHashKey") is not None:
+        return int(record["ExplicitHashKey"])
+    return int(hashlib.md5(record["PartitionKey"].encode()).hexdigest(), 16)
 
-                if retries >= MAX_RETRIES:
-                    logger.warning(
-                        f"Failed to ingest {failed_count} records after {MAX_RETRIES} retries"
-                    )
-                    output["FailedRecordCount"] += failed_count
-                    break
 
-                next_batch = []
-                for idx, res in enumerate(response["Records"]):
-                    if "ErrorCode" in res:
-                        next_batch.append(current_batch[idx])
+def record_cost(record):
+    """Share of one shard-second a record uses: the larger of its record and byte cost."""
+    size = len(record["Data"]) + len(record["PartitionKey"])
+    return max(1 / SHARD_RECORDS_PER_SECOND, size / SHARD_BYTES_PER_SECOND)
 
-                current_batch = next_batch
-                retries += 1
-                time.sleep(0.1 * (2 ** (retries - 1)))
 
-            except Exception as e:
-                logger.error(f"Kinesis Batch Exception: {e}")
-                output["FailedRecordCount"] += len(current_batch)
+class ShardBucket:
+    """
+    Token bucket for one shard, measured in shard-seconds.
+
+    Refills at `share`, the fraction of the shard this container has learned it
+    can use alongside the other writers: halved when Kinesis throttles the shard
+    (at most once per second, the window Kinesis enforces limits over) and
+    raised by `increase` per second, up to `max_share`, while calls go through
+    without throttling. Bursts are capped at `burst` seconds of refill so a
+    full bucket cannot push a clock second past the shard limit. A record may
+    overdraw the bucket so records larger than the burst still go out; later
+    records wait for the debt to refill.
+    """
+
+    def __init__(self, share=0.9, min_share=0.02, max_share=0.9, increase=0.05, burst=0.1, clock=time.monotonic):
+        self.share = share
+        self._min_share = min_share
+        self._max_share = max_share
+        self._increase = increase
+        self._burst = burst
+        self._clock = clock
+        self._tokens = share * burst
+        self._updated = clock()
+        self._last_decrease = None
+        self._last_increase = self._updated
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.share * self._burst, self._tokens + (now - self._updated) * self.share)
+        self._updated = now
+        return now
+
+    def try_take(self, cost):
+        self._refill()
+        if self._tokens <= 0:
+            return False
+        self._tokens -= cost
+        return True
+
+    def wait_time(self):
+        """Seconds until the bucket can release a record."""
+        self._refill()
+        if self._tokens > 0:
+            return 0.0
+        return -self._tokens / self.share + 0.001
+
+    def on_throttle(self):
+        now = self._refill()
+        if self._last_decrease is not None and now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.share = max(self._min_share, self.share / 2)
+        self._tokens = min(self._tokens, 0.0)
+        self._last_increase = now
+
+    def on_success(self):
+        now = self._refill()
+        self.share = min(self._max_share, self.share + self._increase * min(now - self._last_increase, 1.0))
+        self._last_increase = now
+
+
+class ShardMap:
+    """Routes records to open shards by hash key range."""
+
+    def __init__(self, shards):
+        shards = sorted(shards, key=lambda shard: int(shard["HashKeyRange"]["StartingHashKey"]))
+        self._starts = [int(shard["HashKeyRange"]["StartingHashKey"]) for shard in shards]
+        self.shard_ids = [shard["ShardId"] for shard in shards]
+        self.loaded_at = time.monotonic()
+
+    def shard_for(self, record):
+        return self.shard_ids[max(bisect.bisect_right(self._starts, hash_key(record)) - 1, 0)]
+
+
+# Pseudo-shard pacing the whole stream while its layout is unknown
+WHOLE_STREAM = "stream"
+
+# Kept across invocations so learned shard shares survive in a warm container.
+# Guarded by _lock: concurrent pushes of one request share the buckets.
+_shard_map = None
+_buckets = {}
+_lock = threading.Lock()
+
+
+def _list_open_shards():
+    shards, kwargs = [], {"StreamName": STREAM_NAME}
+    while True:
+        response = kinesis.list_shards(**kwargs)
+        shards.extend(response["Shards"])
+        if not response.get("NextToken"):
+            break
+        kwargs = {"NextToken": response["NextToken"]}
+    # Closed parents stay listed after a reshard until their retention expires
+    return [shard for shard in shards if "EndingSequenceNumber" not in shard.get("SequenceNumberRange", {})]
+
+
+def _get_shard_map():
+    global _shard_map
+    if _shard_map is None or time.monotonic() - _shard_map.loaded_at > SHARD_MAP_TTL_SECONDS:
+        try:
+            _shard_map = ShardMap(_list_open_shards())
+        except Exception as e:
+            logger.warning(f"Could not list shards, pacing the stream as a whole: {e}")
+            _shard_map = ShardMap([{"ShardId": WHOLE_STREAM, "HashKeyRange": {"StartingHashKey": "0"}}])
+        for shard_id in list(_buckets):
+            if shard_id not in _shard_map.shard_ids:
+                del _buckets[shard_id]
+    return _shard_map
+
+
+def _bucket(shard_id):
+    bucket = _buckets.get(shard_id)
+    if bucket is None:
+        bucket = _buckets[shard_id] = ShardBucket()
+    return bucket
+
+
+def _take_batch(all_records, pending):
+    """Take up to one put_records call worth of records, round-robin over shards with tokens."""
+    batch, batch_bytes = [], 0
+    ready = [shard_id for shard_id in pending if pending[shard_id]]
+    while ready and len(batch) < BATCH_SIZE:
+        still_ready = []
+        for shard_id in ready:
+            queue = pending[shard_id]
+            record = all_records[queue[0]]
+            size = len(record["Data"]) + len(record["PartitionKey"])
+            if batch_bytes + size > BATCH_BYTES and batch:
+                return batch
+            if not _bucket(shard_id).try_take(record_cost(record)):
+                continue
+            batch.append((queue.popleft(), shard_id))
+            batch_bytes += size
+            if queue:
+                still_ready.append(shard_id)
+            if len(batch) >= BATCH_SIZE:
+                break
+        ready = still_ready
+    return batch
+
+
+def _requeue(pending, batch):
+    """Put records back at the front of their shard queues, keeping their order."""
+    for index, shard_id in reversed(batch):
+        pending[shard_id].appendleft(index)
+
+
+def push_deadline(time_budget=None):
+    """time.monotonic() value a push started now must finish by."""
+    budget = PUSH_BUDGET_SECONDS if time_budget is None else min(time_budget, PUSH_BUDGET_SECONDS)
+    return time.monotonic() + max(budget, 0.0)
+
+
+def push_to_kinesis(all_records, time_budget=None, deadline=None) -> Dict:
+    """
+    Write records to Kinesis, pacing each shard by its learned share.
+
+    Records are spread over at most `time_budget` seconds (capped at
+    PUSH_BUDGET_SECONDS), or until `deadline` (see push_deadline) when
+    several pushes share one budget. Throttled and failed records are retried
+    until then; the rest are reported rather than dropped.
+
+    Returns {"FailedRecordCount", "RetryIndices" (positions in all_records
+    that were not written, in order), "RetryAfterSeconds" (when the slowest
+    pending shard frees up, at least the one second Kinesis limits reset
+    over), "ThrottledCount"}.
+    """
+    start = time.monotonic()
+    if deadline is None:
+        deadline = push_deadline(time_budget)
+
+    with _lock:
+        shard_map = _get_shard_map()
+    pending = {}
+    for index, record in enumerate(all_records):
+        pending.setdefault(shard_map.shard_for(record), deque()).append(index)
+
+    throttled_total = 0
+    call_failures = 0
+
+    while any(pending.values()):
+        with _lock:
+            batch = _take_batch(all_records, pending)
+            if not batch:
+                wait = min(_bucket(shard_id).wait_time() for shard_id, queue in pending.items() if queue)
+        if not batch:
+            wait = max(wait, MIN_CALL_INTERVAL_SECONDS)
+            if time.monotonic() + wait >= deadline:
+                break
+            time.sleep(wait)
+            continue
+
+        if time.monotonic() >= deadline:
+            _requeue(pending, batch)
+            break
+
+        try:
+            kinesis_start = time.time()
+            response = kinesis.put_records(
+                StreamName=STREAM_NAME, Records=[all_records[index] for index, _ in batch]
+            )
+            kinesis_end = time.time()
+        except Exception as e:
+            logger.error(f"Kinesis Batch Exception: {e}")
+            _requeue(pending, batch)
+            call_failures += 1
+            if call_failures >= MAX_CALL_FAILURES:
                 break
+            time.sleep(min(0.1 * (2 ** (call_failures - 1)), max(deadline - time.monotonic(), 0.0)))
+            continue
+        call_failures = 0
+
+        failed, throttled_shards, accepted_shards = [], set(), set()
+        for (index, shard_id), result in zip(batch, response["Records"]):
+            if "ErrorCode" not in result:
+                accepted_shards.add(shard_id)
+                if result.get("ShardId") not in (None, shard_id) and shard_id != WHOLE_STREAM:
+                    # Stream was resharded: reload the map on the next request
+                    shard_map.loaded_at = float("-inf")
+                continue
+            failed.append((index, shard_id))
+            if result["ErrorCode"] == "ProvisionedThroughputExceededException":
+                throttled_shards.add(shard_id)
+
+        throttled = sum(1 for _, shard_id in failed if shard_id in throttled_shards)
+        throttled_total += throttled
+        emit_metrics(
+            kinesis_write_latency=kinesis_end - kinesis_start,
+            kinesis_failed=len(failed),
+            kinesis_throttled=throttled,
+        )
+
+        with _lock:
+            for shard_id in throttled_shards:
+                _bucket(shard_id).on_throttle()
+            for shard_id in accepted_shards - throttled_shards:
+                _bucket(shard_id).on_success()
+        _requeue(pending, failed)
+
+    retry = sorted(index for queue in pending.values() for index in queue)
+    retry_after = 0.0
+    if retry:
+        with _lock:
+            waits = [_bucket(shard_id).wait_time() for shard_id, queue in pending.items() if queue]
+        retry_after = max([1.0] + waits)
+        logger.warning(f"Handing {len(retry)} records back for retry after {time.monotonic() - start:.2f}s")
 
-    return output
+    return {
+        "FailedRecordCount": len(retry),
+        "RetryIndices": retry,
+        "RetryAfterSeconds": round(retry_after, 3),
+        "ThrottledCount": throttled_total,
+    }
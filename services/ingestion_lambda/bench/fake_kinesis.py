@@ -0,0 +1,115 @@
+"""
+In-memory Kinesis stand-in for benchmarks and tests.
+
+Implements the put_records / list_shards subset the ingestion Lambda uses, with
+shards splitting the 128-bit hash key space evenly and per-shard write limits
+(records and bytes per second) enforced per clock second, returning
+ProvisionedThroughputExceededException partial failures like the real service.
+The clock is injectable so simulators can run in simulated time.
+"""
+
+import time
+import random
+import hashlib
+import threading
+from collections import defaultdict
+
+HASH_SPACE = 2**128
+
+
+def hash_key(record):
+    """The 128-bit hash key Kinesis derives for a put_records entry."""
+    if record.get("ExplicitHashKey") is not None:
+        return int(record["ExplicitHashKey"])
+    return int(hashlib.md5(record["PartitionKey"].encode()).hexdigest(), 16)
+
+
+class FakeKinesis:
+    def __init__(
+        self,
+        shard_count=2,
+        records_per_second=1000,
+        bytes_per_second=1024 * 1024,
+        clock=time.time,
+        latency=0.0,
+        failure_rate=0.0,
+        keep_records=False,
+        seed=0,
+    ):
+        self.shard_count = shard_count
+        self.records_per_second = records_per_second
+        self.bytes_per_second = bytes_per_second
+        self.clock = clock
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.keep_records = keep_records
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = {}
+        self._sequence = 0
+        self.accepted = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.failed = 0
+        self.calls = 0
+        self.records = defaultdict(list)
+
+        step = HASH_SPACE // shard_count
+        self.shards = []
+        for i in range(shard_count):
+            end = HASH_SPACE - 1 if i == shard_count - 1 else (i + 1) * step - 1
+            self.shards.append(
+                {
+                    "ShardId": f"shardId-{i:012d}",
+                    "HashKeyRange": {"StartingHashKey": str(i * step), "EndingHashKey": str(end)},
+                }
+            )
+
+    def shard_for(self, record):
+        return min(hash_key(record) * self.shard_count // HASH_SPACE, self.shard_count - 1)
+
+    def list_shards(self, StreamName=None, NextToken=None, **kwargs):
+        return {"Shards": [dict(shard) for shard in self.shards]}
+
+    def put_records(self, StreamName=None, Records=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            second = int(self.clock())
+            results = []
+            failed = 0
+            for record in Records:
+                index = self.shard_for(record)
+                shard_id = self.shards[index]["ShardId"]
+                size = len(record["Data"]) + len(record["PartitionKey"])
+                used_records, used_bytes = self._window.get((index, second), (0, 0))
+
+                if used_records + 1 > self.records_per_second or used_bytes + size > self.bytes_per_second:
+                    self.throttled[shard_id] += 1
+                    failed += 1
+                    results.append(
+                        {
+                            "ErrorCode": "ProvisionedThroughputExceededException",
+                            "ErrorMessage": f"Rate exceeded for shard {shard_id}",
+                        }
+                    )
+                    continue
+
+                if self.failure_rate and self._rng.random() < self.failure_rate:
+                    self.failed += 1
+                    failed += 1
+                    results.append({"ErrorCode": "InternalFailure", "ErrorMessage": "Internal service failure"})
+                    continue
+
+                self._window[(index, second)] = (used_records + 1, used_bytes + size)
+                self._sequence += 1
+                self.accepted[shard_id] += 1
+                if self.keep_records:
+                    self.records[shard_id].append(record)
+                results.append({"SequenceNumber": str(self._sequence), "ShardId": shard_id})
+
+            # Drop windows that can no longer be written to
+            for key in [key for key in self._window if key[1] < second - 1]:
+                del self._window[key]
+
+        return {"FailedRecordCount": failed, "Records": results}
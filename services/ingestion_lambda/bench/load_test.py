@@ -0,0 +1,248 @@
+"""
+Local ingestion load test.
+
+Invokes lambda_handler in-process with API Gateway v2 (HTTP API) events carrying
+batches of Home Assistant state_changed events, with Secrets Manager and Kinesis
+replaced by in-memory fakes that add latency, per-shard throttling and random
+partial failures. Reports requests/s, p50/p99 handler latency, CPU time per
+event and EMF metric lines per request, and can write them to a JSON file
+tagged with the current git commit for comparing revisions.
+
+Usage:
+    python bench/load_test.py --requests 200 --batch 500
+    python bench/load_test.py --wire ndjson --envelope msgpack-zlib --kinesis-latency 0.02 --json results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+# The shared Lambda layer (api_keys)
+SHARED_LAYER = os.path.join(HERE, "..", "..", "..", "infrastructure", "cloudformation", "lambdas", "shared", "python")
+sys.path.insert(0, SHARED_LAYER)
+
+from fake_kinesis import FakeKinesis  # noqa: E402
+
+API_KEY = "bench-key"
+LAMBDA_TIMEOUT_SECONDS = 10
+
+DOMAINS = (
+    ("sensor", "temperature", "°C", 21.0, 2.0),
+    ("sensor", "humidity", "%", 45.0, 5.0),
+    ("sensor", "power", "W", 200.0, 80.0),
+    ("sensor", "energy", "kWh", 1200.0, 10.0),
+    ("input_number", "drift", None, 50.0, 20.0),
+)
+
+
+class FakeSecretsManager:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def get_secret_value(self, SecretId=None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return {"SecretString": API_KEY}
+
+
+class FakeContext:
+    def __init__(self, timeout=LAMBDA_TIMEOUT_SECONDS):
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+class CountingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def make_event(seq, rng, now):
+    domain, kind, unit, base, spread = DOMAINS[seq % len(DOMAINS)]
+    entity = f"{domain}.{kind}_{seq // len(DOMAINS) % 60 + 1:03d}"
+    fired = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)) + f".{int(now % 1 * 1e6):06d}+00:00"
+    attributes = {"friendly_name": entity.replace("_", " ").title(), "state_class": "measurement"}
+    if unit:
+        attributes["unit_of_measurement"] = unit
+        attributes["device_class"] = kind
+    context = {"id": f"{seq:026d}", "parent_id": None, "user_id": None}
+
+    def state(value):
+        return {
+            "entity_id": entity,
+            "state": f"{value:.1f}",
+            "attributes": attributes,
+            "last_changed": fired,
+            "last_reported": fired,
+            "last_updated": fired,
+            "context": context,
+        }
+
+    return {
+        "event_type": "state_changed",
+        "data": {
+            "entity_id": entity,
+            "old_state": state(base + rng.uniform(-spread, spread)),
+            "new_state": state(base + rng.uniform(-spread, spread)),
+        },
+        "origin": "LOCAL",
+        "time_fired": fired,
+        "context": context,
+        "received_at": now,
+    }
+
+
+def make_request(events, wire):
+    if wire == "ndjson":
+        body = "".join(json.dumps(event) + "\n" for event in events)
+        content_type = "application/x-ndjson"
+    else:
+        body = json.dumps({"events": events})
+        content_type = "application/json"
+    return {
+        "version": "2.0",
+        "routeKey": "POST /events",
+        "rawPath": "/events",
+        "headers": {"authorization": f"Bearer {API_KEY}", "content-type": content_type},
+        "requestContext": {"http": {"method": "POST", "path": "/events"}, "stage": "$default"},
+        "body": body,
+        "isBase64Encoded": False,
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", ".."], cwd=HERE, capture_output=True, text=True)
+        return commit + ("-dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=500, help="events per request")
+    parser.add_argument("--wire", choices=("json", "ndjson"), default="json")
+    parser.add_argument("--envelope", default="json", help="ENVELOPE_FORMAT for the Lambda")
+    parser.add_argument("--partition", default="auto", help="PARTITION_STRATEGY for the Lambda")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--shard-limit", type=int, default=1000, help="records/s per shard")
+    parser.add_argument("--kinesis-latency", type=float, default=0.0, help="seconds per put_records call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of records failing with InternalFailure")
+    parser.add_argument("--secrets-latency", type=float, default=0.0, help="seconds per get_secret_value call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    os.environ.update(
+        KINESIS_STREAM="bench",
+        API_KEY_SECRET_ARN="bench",
+        ENVELOPE_FORMAT=args.envelope,
+        PARTITION_STRATEGY=args.partition,
+    )
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    import app
+    from api_keys import ApiKeyValidator
+    from aws_utils import kinesis_
+
+    secrets = FakeSecretsManager(latency=args.secrets_latency)
+    stream = FakeKinesis(
+        shard_count=args.shards,
+        records_per_second=args.shard_limit,
+        latency=args.kinesis_latency,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    app.api_keys = ApiKeyValidator("bench", client=secrets)
+    kinesis_.kinesis = stream
+
+    emf = CountingHandler()
+    metrics_logger = logging.getLogger("ingestion-metrics")
+    metrics_logger.handlers = [emf]
+    metrics_logger.propagate = False
+    logging.getLogger().setLevel(logging.ERROR)
+
+    rng = random.Random(args.seed)
+    start_time = time.time()
+    requests = []
+    for r in range(args.requests):
+        events = [make_event(r * args.batch + i, rng, start_time + r + i * 0.001) for i in range(args.batch)]
+        requests.append(make_request(events, args.wire))
+
+    latencies = []
+    statuses = {}
+    ingested = retried = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for request in requests:
+        started = time.perf_counter()
+        response = app.lambda_handler(request, FakeContext())
+        latencies.append(time.perf_counter() - started)
+        statuses[response["statusCode"]] = statuses.get(response["statusCode"], 0) + 1
+        if response["statusCode"] == 200:
+            body = json.loads(response["body"])
+            ingested += body.get("events_ingested", 0)
+            retried += len(body.get("retry", []))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    events = args.requests * args.batch
+    results = {
+        "commit": git_commit(),
+        "config": vars(args),
+        "requests_per_second": args.requests / wall,
+        "events_per_second": events / wall,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "cpu_us_per_event": cpu / events * 1e6,
+        "emf_lines_per_request": emf.count / args.requests,
+        "status_codes": statuses,
+        "events_ingested": ingested,
+        "events_retried": retried,
+        "kinesis_calls": stream.calls,
+        "kinesis_throttled": sum(stream.throttled.values()),
+        "kinesis_failed": stream.failed,
+        "secrets_calls": secrets.calls,
+    }
+
+    print(f"commit              {results['commit']}")
+    print(f"requests/s          {results['requests_per_second']:.1f} ({results['events_per_second']:.0f} events/s)")
+    print(f"latency p50 / p99   {results['latency_p50_ms']:.1f} / {results['latency_p99_ms']:.1f} ms")
+    print(f"CPU per event       {results['cpu_us_per_event']:.1f} us")
+    print(f"EMF lines/request   {results['emf_lines_per_request']:.1f}")
+    print(f"events              {ingested} ingested, {retried} handed back of {events}")
+    print(
+        f"kinesis             {stream.calls} calls, {results['kinesis_throttled']} throttled, "
+        f"{stream.failed} failed; {secrets.calls} secret reads"
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
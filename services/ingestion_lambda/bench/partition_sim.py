@@ -0,0 +1,132 @@
+"""
+Partitioning strategy simulator.
+
+Replays a synthetic Home Assistant workload (many quiet sensors, a few power
+meters and chatty drift automations, spread over a couple of instances) in
+simulated time against FakeKinesis with per-shard write limits, once per
+partitioning strategy, and reports per-shard load and throttled records.
+
+Usage:
+    python bench/partition_sim.py --shards 2 --seconds 60
+    python bench/partition_sim.py --drift-rate 600 --json results.json
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_kinesis import HASH_SPACE, FakeKinesis  # noqa: E402
+from partitioning import Partitioner  # noqa: E402
+
+TICK = 0.1
+BATCH_SIZE = 500
+
+
+def make_workload(args):
+    """[(entity_id, instance, events/s)]"""
+    workload = []
+    for i in range(args.sensors):
+        workload.append((f"sensor.temp_{i:03d}", f"home_{i % 2}", args.sensor_rate))
+    for i in range(args.meters):
+        workload.append((f"sensor.power_meter_{i}", f"home_{i % 2}", args.meter_rate))
+    for i in range(args.drifters):
+        workload.append((f"input_number.drift_{i}", "home_0", args.drift_rate))
+    return workload
+
+
+def explicit_keys(workload, shards):
+    """Pin the busiest entities round-robin to shard midpoints."""
+    busiest = sorted(workload, key=lambda item: -item[2])[: shards * 2]
+    step = HASH_SPACE // shards
+    return {entity: str(i % shards * step + step // 2) for i, (entity, _, _) in enumerate(busiest)}
+
+
+def simulate(strategy, workload, args):
+    clock = [0.0]
+    stream = FakeKinesis(shard_count=args.shards, clock=lambda: clock[0], keep_records=True)
+    partitioner = Partitioner(
+        strategy=strategy,
+        hot_rate=args.hot_rate,
+        salt_buckets=args.salt_buckets,
+        explicit_hash_keys=explicit_keys(workload, args.shards) if strategy == "explicit" else None,
+    )
+    rng = random.Random(args.seed)
+    carry = {entity: rng.random() for entity, _, _ in workload}
+    offered = 0
+
+    steps = int(args.seconds / TICK)
+    for step in range(steps):
+        clock[0] = step * TICK
+        batch = []
+        for entity, instance, rate in workload:
+            carry[entity] += rate * TICK
+            while carry[entity] >= 1:
+                carry[entity] -= 1
+                fields, tag = partitioner.assign({"instance": instance}, entity, now=clock[0])
+                data = json.dumps({"entity_id": entity, "partition": tag})
+                batch.append({"Data": data, **fields})
+        offered += len(batch)
+        for i in range(0, len(batch), BATCH_SIZE):
+            stream.put_records(StreamName="sim", Records=batch[i : i + BATCH_SIZE])
+
+    shards_per_entity = {}
+    for shard_id, records in stream.records.items():
+        for record in records:
+            entity = json.loads(record["Data"])["entity_id"]
+            shards_per_entity.setdefault(entity, set()).add(shard_id)
+
+    per_shard = [stream.accepted[shard["ShardId"]] / args.seconds for shard in stream.shards]
+    throttled = sum(stream.throttled.values())
+    return {
+        "strategy": strategy,
+        "offered_per_second": offered / args.seconds,
+        "accepted_per_shard_per_second": [round(rate, 1) for rate in per_shard],
+        "max_shard_utilization": max(per_shard) / stream.records_per_second,
+        "throttled_records": throttled,
+        "throttled_ratio": throttled / offered if offered else 0.0,
+        "entities_split_across_shards": sum(1 for shards in shards_per_entity.values() if len(shards) > 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategies", default="entity,instance,explicit,salted,auto")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--sensors", type=int, default=300)
+    parser.add_argument("--sensor-rate", type=float, default=0.5)
+    parser.add_argument("--meters", type=int, default=6)
+    parser.add_argument("--meter-rate", type=float, default=40.0)
+    parser.add_argument("--drifters", type=int, default=3)
+    parser.add_argument("--drift-rate", type=float, default=450.0)
+    parser.add_argument("--hot-rate", type=float, default=100.0)
+    parser.add_argument("--salt-buckets", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write raw results to this file")
+    args = parser.parse_args()
+
+    workload = make_workload(args)
+    results = [simulate(strategy, workload, args) for strategy in args.strategies.split(",")]
+
+    print(
+        f"{'strategy':<10} {'offered/s':>10} {'per-shard accepted/s':>24} "
+        f"{'max util':>9} {'throttled':>10} {'split':>6}"
+    )
+    for r in results:
+        shards = ", ".join(f"{rate:.0f}" for rate in r["accepted_per_shard_per_second"])
+        print(
+            f"{r['strategy']:<10} {r['offered_per_second']:>10.0f} {shards:>24} "
+            f"{r['max_shard_utilization']:>9.0%} {r['throttled_ratio']:>10.1%} {r['entities_split_across_shards']:>6}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
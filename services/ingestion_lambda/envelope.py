@@ -0,0 +1,188 @@
+import os
+import json
+import struct
+import zlib
+
+# Wire formats for the Kinesis payload. Binary payloads start with a header
+# byte; JSON envelopes always start with "{", so both can share a stream.
+FORMATS = ("json", "msgpack", "msgpack-zlib")
+HEADER_MSGPACK = b"\x01"
+HEADER_MSGPACK_ZLIB_V1 = b"\x02"
+
+# Preset deflate dictionary, version 1: msgpack-encoded strings that recur in
+# Home Assistant state_changed envelopes. Deflate matches against the end of
+# the dictionary most cheaply, so the most frequent strings come last. The
+# consumer carries the same list; changing it needs a new header version.
+ZDICT_V1_STRINGS = (
+    "sensor.",
+    "binary_sensor.",
+    "light.",
+    "switch.",
+    "input_number.",
+    "automation.",
+    "min",
+    "max",
+    "step",
+    "mode",
+    "icon",
+    "mdi:",
+    "device_class",
+    "temperature",
+    "humidity",
+    "power",
+    "energy",
+    "°C",
+    "W",
+    "kWh",
+    "%",
+    "state_class",
+    "measurement",
+    "total_increasing",
+    "unit_of_measurement",
+    "friendly_name",
+    "on",
+    "off",
+    "unavailable",
+    "unknown",
+    "LOCAL",
+    "origin",
+    "user_id",
+    "parent_id",
+    "id",
+    "context",
+    "last_reported",
+    "last_updated",
+    "last_changed",
+    "attributes",
+    "state",
+    "entity_id",
+    "old_state",
+    "new_state",
+    "+00:00",
+    "time_fired",
+    "state_changed",
+    "event_type",
+    "data",
+    "partition",
+    "homeassistant",
+    "source",
+    "received_at",
+    "event",
+)
+
+
+def _fixstr(value):
+    encoded = value.encode()
+    return bytes([0xA0 | len(encoded)]) + encoded
+
+
+ZDICT_V1 = b"".join(_fixstr(value) for value in ZDICT_V1_STRINGS)
+
+try:
+    import msgpack
+
+    def packb(obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+except ImportError:
+    # The Lambda runtime ships no msgpack; this covers the JSON data model
+
+    def _pack(obj, out):
+        if obj is None:
+            out.append(b"\xc0")
+        elif obj is True:
+            out.append(b"\xc3")
+        elif obj is False:
+            out.append(b"\xc2")
+        elif isinstance(obj, int):
+            if 0 <= obj < 0x80:
+                out.append(bytes([obj]))
+            elif -32 <= obj < 0:
+                out.append(struct.pack(">b", obj))
+            elif 0 < obj <= 0xFF:
+                out.append(b"\xcc" + struct.pack(">B", obj))
+            elif 0 < obj <= 0xFFFF:
+                out.append(b"\xcd" + struct.pack(">H", obj))
+            elif 0 < obj <= 0xFFFFFFFF:
+                out.append(b"\xce" + struct.pack(">I", obj))
+            elif 0 < obj < 2**64:
+                out.append(b"\xcf" + struct.pack(">Q", obj))
+            elif -0x80 <= obj < 0:
+                out.append(b"\xd0" + struct.pack(">b", obj))
+            elif -0x8000 <= obj < 0:
+                out.append(b"\xd1" + struct.pack(">h", obj))
+            elif -0x80000000 <= obj < 0:
+                out.append(b"\xd2" + struct.pack(">i", obj))
+            elif -(2**63) <= obj < 0:
+                out.append(b"\xd3" + struct.pack(">q", obj))
+            else:
+                raise OverflowError(f"Integer {obj} does not fit in msgpack")
+        elif isinstance(obj, float):
+            out.append(b"\xcb" + struct.pack(">d", obj))
+        elif isinstance(obj, str):
+            encoded = obj.encode()
+            size = len(encoded)
+            if size < 32:
+                out.append(bytes([0xA0 | size]))
+            elif size <= 0xFF:
+                out.append(b"\xd9" + struct.pack(">B", size))
+            elif size <= 0xFFFF:
+                out.append(b"\xda" + struct.pack(">H", size))
+            else:
+                out.append(b"\xdb" + struct.pack(">I", size))
+            out.append(encoded)
+        elif isinstance(obj, (list, tuple)):
+            size = len(obj)
+            if size < 16:
+                out.append(bytes([0x90 | size]))
+            elif size <= 0xFFFF:
+                out.append(b"\xdc" + struct.pack(">H", size))
+            else:
+                out.append(b"\xdd" + struct.pack(">I", size))
+            for item in obj:
+                _pack(item, out)
+        elif isinstance(obj, dict):
+            size = len(obj)
+            if size < 16:
+                out.append(bytes([0x80 | size]))
+            elif size <= 0xFFFF:
+                out.append(b"\xde" + struct.pack(">H", size))
+            else:
+                out.append(b"\xdf" + struct.pack(">I", size))
+            for key, value in obj.items():
+                _pack(key, out)
+                _pack(value, out)
+        else:
+            raise TypeError(f"Cannot msgpack {type(obj).__name__}")
+
+    def packb(obj):
+        out = []
+        _pack(obj, out)
+        return b"".join(out)
+
+
+def encode_envelope(envelope, fmt="json"):
+    """
+    Serialize an envelope for Kinesis in the given wire format.
+
+    Envelopes msgpack cannot represent (integers beyond 64 bits) fall back to
+    JSON, which the consumer reads alongside binary payloads.
+    """
+    if fmt == "json":
+        return json.dumps(envelope)
+    try:
+        packed = packb(envelope)
+    except (OverflowError, TypeError):
+        return json.dumps(envelope)
+    if fmt == "msgpack":
+        return HEADER_MSGPACK + packed
+    compressor = zlib.compressobj(level=6, wbits=-15, zdict=ZDICT_V1)
+    return HEADER_MSGPACK_ZLIB_V1 + compressor.compress(packed) + compressor.flush()
+
+
+def envelope_format_from_env():
+    """The wire format selected by ENVELOPE_FORMAT (default json)."""
+    fmt = os.environ.get("ENVELOPE_FORMAT", "json")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown envelope format {fmt!r}, expected one of {FORMATS}")
+    return fmt
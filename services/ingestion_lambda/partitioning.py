@@ -0,0 +1,135 @@
+import os
+import json
+import math
+import time
+import uuid
+import itertools
+
+STRATEGIES = ("entity", "instance", "explicit", "salted", "auto")
+
+# Identifies this container in ordering tags; sequence numbers are per container
+PRODUCER_ID = uuid.uuid4().hex[:12]
+
+
+class KeyRateEstimator:
+    """
+    Exponentially decayed event rate per key.
+
+    Keeps a decayed event count per key, so the rate reacts within a few
+    half-lives and needs no per-event history. At most `max_keys` keys are
+    tracked; past that the slowest half is forgotten.
+    """
+
+    def __init__(self, half_life=10.0, max_keys=10000):
+        self._half_life = half_life
+        self._max_keys = max_keys
+        self._keys = {}
+
+    def observe(self, key, count=1, now=None):
+        """Add `count` events for key at `now` and return its updated rate (events/s)."""
+        now = now if now is not None else time.time()
+        decayed, last = self._keys.get(key, (0.0, now))
+        decayed = decayed * 0.5 ** ((now - last) / self._half_life) + count
+        self._keys[key] = (decayed, now)
+        if len(self._keys) > self._max_keys:
+            self._forget(now)
+        return decayed * math.log(2) / self._half_life
+
+    def rate(self, key, now=None):
+        now = now if now is not None else time.time()
+        decayed, last = self._keys.get(key, (0.0, now))
+        return decayed * 0.5 ** ((now - last) / self._half_life) * math.log(2) / self._half_life
+
+    def _forget(self, now):
+        by_rate = sorted(self._keys, key=lambda key: self.rate(key, now))
+        for key in by_rate[: len(by_rate) // 2]:
+            del self._keys[key]
+
+
+class Partitioner:
+    """
+    Chooses Kinesis partition fields for each event.
+
+    Strategies:
+      entity    PartitionKey = entity_id (per-entity order, hot entities pin a shard)
+      instance  PartitionKey = the event's Home Assistant instance (per-home order)
+      explicit  ExplicitHashKey from `explicit_hash_keys` {entity_id: hash key}
+                for the entities listed there, entity keys otherwise
+      salted    every entity spread over `salt_buckets` sub-keys
+      auto      explicit keys first; entities whose estimated rate exceeds
+                `hot_rate` events/s are salted over up to `salt_buckets`
+                sub-keys; everything else keyed by entity
+
+    Salted events carry an ordering tag (entity key, salt, per-container
+    sequence number and producer id) in the envelope's `partition` field so a
+    reader can restore per-entity order across shards. The consumer does not
+    reorder by it, so salting is opt-in and the default is `entity`. Sequence numbers are
+    kept for at most `max_keys` entities; past that the least recently salted
+    half is forgotten and starts again at 0.
+    """
+
+    def __init__(
+        self,
+        strategy="entity",
+        hot_rate=100.0,
+        salt_buckets=4,
+        explicit_hash_keys=None,
+        estimator=None,
+        max_keys=10000,
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown partition strategy {strategy!r}, expected one of {STRATEGIES}")
+        self.strategy = strategy
+        self._hot_rate = hot_rate
+        self._salt_buckets = salt_buckets
+        self._explicit = explicit_hash_keys or {}
+        self._estimator = estimator or KeyRateEstimator()
+        self._max_keys = max_keys
+        # Least recently salted first
+        self._sequence = {}
+
+    def assign(self, ev, entity_id, now=None):
+        """Return (record fields, ordering tag or None) for one event."""
+        strategy = self.strategy
+        if strategy == "instance":
+            return {"PartitionKey": ev.get("instance") or "default"}, None
+
+        if strategy in ("explicit", "auto") and entity_id in self._explicit:
+            return {"PartitionKey": entity_id, "ExplicitHashKey": self._explicit[entity_id]}, None
+
+        if strategy == "salted":
+            return self._salted(entity_id, self._salt_buckets)
+
+        if strategy == "auto":
+            rate = self._estimator.observe(entity_id, now=now)
+            if rate > self._hot_rate:
+                return self._salted(entity_id, min(self._salt_buckets, math.ceil(rate / self._hot_rate)))
+
+        return {"PartitionKey": entity_id}, None
+
+    def _salted(self, entity_id, buckets):
+        sequence = self._sequence.pop(entity_id, 0)
+        self._sequence[entity_id] = sequence + 1
+        if len(self._sequence) > self._max_keys:
+            self._forget()
+        salt = sequence % buckets
+        tag = {"key": entity_id, "salt": salt, "seq": sequence, "producer": PRODUCER_ID}
+        return {"PartitionKey": f"{entity_id}#{salt}"}, tag
+
+    def _forget(self):
+        for entity_id in list(itertools.islice(self._sequence, len(self._sequence) // 2)):
+            del self._sequence[entity_id]
+
+
+def partitioner_from_env():
+    """
+    Build the Partitioner configured by PARTITION_STRATEGY (default entity),
+    HOT_KEY_EVENTS_PER_SECOND, HOT_KEY_SALT_BUCKETS and PARTITION_HASH_KEYS
+    (JSON object of entity_id to explicit hash key).
+    """
+    return Partitioner(
+        strategy=os.environ.get("PARTITION_STRATEGY", "entity"),
+        hot_rate=float(os.environ.get("HOT_KEY_EVENTS_PER_SECOND", "100")),
+        salt_buckets=int(os.environ.get("HOT_KEY_SALT_BUCKETS", "4")),
+        explicit_hash_keys=json.loads(os.environ.get("PARTITION_HASH_KEYS", "{}")),
+    )
@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, os.path.join(HERE, "..", "bench"))
+os.environ.setdefault("KINESIS_STREAM", "stream")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from fake_kinesis import FakeKinesis  # noqa: E402
+from aws_utils import kinesis_  # noqa: E402
+
+
+class SimClock:
+    """Simulated time for both the limiter and the fake stream; sleeping advances it."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0.0)
+
+
+class ContendedKinesis(FakeKinesis):
+    """FakeKinesis with another writer putting `competitor_rate` records/s on shard 0."""
+
+    def __init__(self, competitor_rate, **kwargs):
+        super().__init__(**kwargs)
+        self.competitor_key = next(
+            f"competitor-{i}" for i in range(1000) if self.shard_for({"PartitionKey": f"competitor-{i}"}) == 0
+        )
+        self._competitor_rate = competitor_rate
+        self._contended = set()
+
+    def put_records(self, StreamName=None, Records=None, **kwargs):
+        second = int(self.clock())
+        if second not in self._contended:
+            self._contended.add(second)
+            competing = [{"Data": "x" * 100, "PartitionKey": self.competitor_key}] * self._competitor_rate
+            super().put_records(StreamName=StreamName, Records=competing)
+        return super().put_records(StreamName=StreamName, Records=Records, **kwargs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimClock()
+    monkeypatch.setattr(kinesis_, "time", clock)
+    monkeypatch.setattr(kinesis_, "emit_metrics", lambda **kwargs: None)
+    return clock
+
+
+def use_stream(monkeypatch, clock, stream):
+    monkeypatch.setattr(kinesis_, "kinesis", stream)
+    monkeypatch.setattr(kinesis_, "_shard_map", None)
+    buckets = {shard["ShardId"]: kinesis_.ShardBucket(clock=clock.monotonic) for shard in stream.shards}
+    monkeypatch.setattr(kinesis_, "_buckets", buckets)
+    return buckets
+
+
+def requests(count, size):
+    for request in range(count):
+        yield [
+            {"Data": json.dumps({"request": request, "n": n}), "PartitionKey": f"sensor.{n % 400}"}
+            for n in range(size)
+        ]
+
+
+def test_every_record_is_written_once_or_handed_back(monkeypatch, clock):
+    stream = ContendedKinesis(competitor_rate=500, shard_count=2, clock=clock.time, keep_records=True)
+    buckets = use_stream(monkeypatch, clock, stream)
+
+    reported, handed_back, throttled = set(), set(), 0
+    for records in requests(count=4, size=3000):
+        start = clock.now
+        result = kinesis_.push_to_kinesis(records, time_budget=3.0)
+        assert clock.now - start <= 3.0
+        assert result["FailedRecordCount"] == len(result["RetryIndices"])
+        assert result["RetryIndices"] == sorted(result["RetryIndices"])
+        retry = set(result["RetryIndices"])
+        for index, record in enumerate(records):
+            event = json.loads(record["Data"])
+            (handed_back if index in retry else reported).add((event["request"], event["n"]))
+        throttled += result["ThrottledCount"]
+
+    seen = [
+        json.loads(record["Data"])
+        for shard_records in stream.records.values()
+        for record in shard_records
+        if record["PartitionKey"] != stream.competitor_key
+    ]
+    written = {(event["request"], event["n"]) for event in seen}
+    assert len(seen) == len(written)
+    assert written == reported
+    assert not written & handed_back
+    assert len(written | handed_back) == 4 * 3000
+
+    # The contended shard was throttled and backed off below the other one
+    assert throttled > 0 and handed_back
+    assert buckets["shardId-000000000000"].share < buckets["shardId-000000000001"].share
+
+
+def test_uncontended_stream_writes_everything_within_the_budget(monkeypatch, clock):
+    stream = FakeKinesis(shard_count=4, clock=clock.time, keep_records=True)
+    use_stream(monkeypatch, clock, stream)
+
+    [records] = requests(count=1, size=2000)
+    start = clock.now
+    result = kinesis_.push_to_kinesis(records, time_budget=3.0)
+    assert result["RetryIndices"] == [] and result["ThrottledCount"] == 0
+    assert sum(len(shard_records) for shard_records in stream.records.values()) == 2000
+    assert clock.now - start <= 3.0
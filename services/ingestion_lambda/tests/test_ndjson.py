@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import time
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+# The shared Lambda layer (api_keys)
+SHARED_LAYER = os.path.join(HERE, "..", "..", "..", "infrastructure", "cloudformation", "lambdas", "shared", "python")
+sys.path.insert(0, SHARED_LAYER)
+os.environ.setdefault("API_KEY_SECRET_ARN", "arn:aws:secretsmanager:us-east-1:123456789012:secret:key")
+os.environ.setdefault("KINESIS_STREAM", "stream")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("PARTITION_STRATEGY", "entity")
+
+import app  # noqa: E402
+
+ENTITIES = [f"sensor.{i}" for i in range(8)]
+
+
+def test_chunks_keep_per_key_order(monkeypatch):
+    monkeypatch.setattr(app, "NDJSON_CHUNK_RECORDS", 10)
+    monkeypatch.setattr(app.aws_utils, "emit_metrics", lambda **kwargs: None)
+    written = []
+    lock = threading.Lock()
+    calls = []
+
+    def push(records, deadline=None):
+        with lock:
+            calls.append(len(records))
+            first = len(calls) == 1
+        # The first chunk is the slowest, so any chunk pushed alongside it lands first
+        time.sleep(0.1 if first else 0.0)
+        with lock:
+            written.extend(records)
+        return {"FailedRecordCount": 0, "RetryIndices": [], "RetryAfterSeconds": 0}
+
+    monkeypatch.setattr(app.aws_utils, "push_to_kinesis", push)
+
+    lines = [
+        json.dumps({"data": {"entity_id": ENTITIES[i % len(ENTITIES)]}, "seq": i})
+        for i in range(400)
+    ]
+    response = app._ingest_ndjson("\n".join(lines), None, time.time())
+    assert json.loads(response["body"])["events_ingested"] == 400
+    assert len(calls) > len(app.push_lanes)
+
+    by_key = {}
+    for record in written:
+        event = json.loads(record["Data"])["event"]
+        by_key.setdefault(record["PartitionKey"], []).append(event["seq"])
+    assert set(by_key) == set(ENTITIES)
+    for key, seqs in by_key.items():
+        assert seqs == sorted(seqs), key
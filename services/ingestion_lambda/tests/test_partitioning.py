@@ -0,0 +1,85 @@
+import os
+import sys
+import math
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from partitioning import KeyRateEstimator, Partitioner  # noqa: E402
+
+
+def test_rate_converges_to_a_steady_event_rate():
+    estimator = KeyRateEstimator(half_life=10.0)
+    # 50 events/s for two minutes, starting at t=0
+    for step in range(120 * 50):
+        rate = estimator.observe("sensor.a", now=step / 50)
+    assert rate == pytest.approx(50, rel=0.05)
+
+
+def test_rate_decays_by_half_per_half_life():
+    estimator = KeyRateEstimator(half_life=10.0)
+    estimator.observe("sensor.a", count=100, now=0.0)
+    assert estimator.rate("sensor.a", now=10.0) == pytest.approx(estimator.rate("sensor.a", now=0.0) / 2)
+    assert estimator.rate("sensor.b", now=0.0) == 0
+
+
+def test_time_zero_is_not_wall_clock():
+    estimator = KeyRateEstimator(half_life=10.0)
+    estimator.observe("sensor.a", count=100, now=0.0)
+    assert estimator.observe("sensor.a", count=0, now=0.0) == pytest.approx(100 * math.log(2) / 10.0)
+
+
+def test_estimator_forgets_the_slowest_half():
+    estimator = KeyRateEstimator(max_keys=4)
+    for i, key in enumerate("abcd"):
+        estimator.observe(key, count=i + 1, now=0.0)
+    estimator.observe("e", count=10, now=0.0)
+    assert [key for key in "abcde" if estimator.rate(key, now=0.0)] == ["c", "d", "e"]
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        Partitioner(strategy="random")
+
+
+def test_entity_instance_and_explicit_keys():
+    assert Partitioner("entity").assign({}, "sensor.a") == ({"PartitionKey": "sensor.a"}, None)
+    assert Partitioner("instance").assign({"instance": "home"}, "sensor.a") == ({"PartitionKey": "home"}, None)
+    assert Partitioner("instance").assign({}, "sensor.a") == ({"PartitionKey": "default"}, None)
+
+    explicit = Partitioner("explicit", explicit_hash_keys={"sensor.a": "170141183460469231731687303715884105728"})
+    fields, tag = explicit.assign({}, "sensor.a")
+    assert fields == {"PartitionKey": "sensor.a", "ExplicitHashKey": "170141183460469231731687303715884105728"}
+    assert tag is None
+    assert explicit.assign({}, "sensor.b") == ({"PartitionKey": "sensor.b"}, None)
+
+
+def test_salted_keys_rotate_with_ordering_tags():
+    partitioner = Partitioner("salted", salt_buckets=3)
+    assigned = [partitioner.assign({}, "sensor.a") for _ in range(6)]
+    assert [fields["PartitionKey"] for fields, _ in assigned] == [f"sensor.a#{i % 3}" for i in range(6)]
+    assert [tag["seq"] for _, tag in assigned] == list(range(6))
+    assert len({tag["producer"] for _, tag in assigned}) == 1
+
+
+def test_auto_salts_only_hot_entities_in_proportion_to_their_rate():
+    partitioner = Partitioner("auto", hot_rate=100.0, salt_buckets=4)
+    cold = {partitioner.assign({}, "sensor.cold", now=step / 10)[0]["PartitionKey"] for step in range(300)}
+    assert cold == {"sensor.cold"}
+
+    # 250 events/s needs three sub-keys at 100 events/s each
+    hot = [partitioner.assign({}, "sensor.hot", now=step / 250)[0]["PartitionKey"] for step in range(250 * 60)]
+    assert set(hot[-100:]) == {"sensor.hot#0", "sensor.hot#1", "sensor.hot#2"}
+
+
+def test_sequences_are_bounded():
+    partitioner = Partitioner("salted", max_keys=10)
+    partitioner.assign({}, "sensor.keep")
+    for i in range(100):
+        partitioner.assign({}, f"sensor.{i}")
+        partitioner.assign({}, "sensor.keep")
+        assert len(partitioner._sequence) <= 10
+    # Used throughout, so never forgotten
+    assert partitioner.assign({}, "sensor.keep")[1]["seq"] == 101